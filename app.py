@@ -1,11 +1,200 @@
-from flask import Flask, render_template, request, jsonify
-from backend.amazon_scraper import AmazonTVScraper
+from flask import Flask, Response, render_template, request, jsonify, send_file, stream_with_context
+from backend.driver_pool import DriverPool, PoolExhaustedError
+from backend.tab_pool import TabPool
+from backend.result_cache import ResultCache, canonicalize_url
+from backend.snapshot_store import SnapshotStore, parse_time
+from backend.image_pipeline import ImagePipeline
+from backend.catalog import Catalog
+from backend.export import EXPORT_FORMATS, export_products
+from backend.batch import batch_worker_count, max_batch_browsers, read_urls, scrape_batch, validate_url
+from backend.crawler import crawl
+from backend.jobs import JobManager
+from backend.admission import AdmissionController, AdmissionRejected
+from backend.metrics import REGISTRY
+from backend.offer_parser import cache_stats as offer_cache_stats
+from backend.rate_control import get_rate_controller
+from backend.work_queue import open_work_queue, queue_batch, task_job
 from flask_cors import CORS
+import argparse
+import atexit
 import json
+import os
+import threading
+import time
 
 app = Flask(__name__)
 CORS(app)
 
+# Seconds /scrape waits for a queued scrape before answering 202 with the job to poll
+QUEUE_WAIT = float(os.getenv('SCRAPER_QUEUE_WAIT', '60'))
+
+def _stats_gauge(stats_fn):
+    return lambda: {(('stat', key),): value for key, value in stats_fn().items() if isinstance(value, (int, float))}
+
+# Batch and image workers are spawned processes, which import this script again as __mp_main__. They need
+# none of the app's services (browsers, stores, queues), so those are only built in the serving process.
+if __name__ != '__mp_main__':
+    # Every fresh scrape is appended to SCRAPER_SNAPSHOT_DB for price history
+    snapshot_store = SnapshotStore()
+    atexit.register(snapshot_store.close)
+
+    # Browsers are shared across requests; size and recycling are configured via SCRAPER_POOL_* env vars.
+    # With SCRAPER_TABS_PER_BROWSER above 1, concurrent scrapes run as tabs of a few shared browsers instead.
+    # Pooled scrapers keep their section fingerprints in the app's snapshot store
+    if int(os.getenv('SCRAPER_TABS_PER_BROWSER', '1')) > 1:
+        driver_pool = TabPool(section_store=snapshot_store)
+    else:
+        driver_pool = DriverPool(section_store=snapshot_store)
+    atexit.register(driver_pool.close)
+
+    # Results are keyed by ASIN; TTLs, size and the optional disk tier are configured via SCRAPER_CACHE_* env vars
+    result_cache = ResultCache()
+
+    # Typed, columnar view of the latest snapshot of every product, for /catalog/query
+    catalog = Catalog(snapshot_store)
+
+    # Product and manufacturer images are downloaded once and served as cached WebP thumbnails;
+    # SCRAPER_IMAGE_PIPELINE=0 leaves the frontend hotlinking Amazon's full-size images
+    image_pipeline = ImagePipeline() if os.getenv('SCRAPER_IMAGE_PIPELINE', '1') != '0' else None
+    if image_pipeline:
+        atexit.register(image_pipeline.close)
+
+    # Scrapes admitted at once (SCRAPER_MAX_CONCURRENT_SCRAPES defaults to the browser pool size); the rest wait
+    # in a bounded, per-client fair queue and are turned away with 429/503 and Retry-After once it is full
+    admission = AdmissionController(limit=int(os.getenv('SCRAPER_MAX_CONCURRENT_SCRAPES', driver_pool.size)))
+
+    # Batch and crawl workers run their own Chrome outside the pool; together they never run more than
+    # SCRAPER_BATCH_MAX_BROWSERS, and requests beyond that wait or are turned away like single scrapes
+    batch_admission = AdmissionController(limit=max_batch_browsers())
+
+    # Background scrapes for the job API; SCRAPER_JOB_WORKERS defaults to the browser pool size
+    job_manager = JobManager(max_workers=int(os.getenv('SCRAPER_JOB_WORKERS', driver_pool.size)))
+    atexit.register(job_manager.shutdown)
+
+    # With SCRAPER_WORK_QUEUE set, scrapes are run by `worker` nodes pulling from that shared queue; this process
+    # only enqueues URLs and reads results back (workers record the snapshots)
+    work_queue = open_work_queue()
+    if work_queue:
+        atexit.register(work_queue.close)
+
+    REGISTRY.gauge('scraper_driver_pool', 'Browser pool state and lifetime counts', _stats_gauge(driver_pool.stats))
+    REGISTRY.gauge('scraper_result_cache', 'Result cache state and lifetime counts', _stats_gauge(result_cache.stats))
+    REGISTRY.gauge('scraper_jobs', 'Scrape jobs by status', _stats_gauge(job_manager.stats))
+    REGISTRY.gauge('scraper_admission', 'Admission control state and lifetime counts', _stats_gauge(admission.stats))
+    REGISTRY.gauge('scraper_batch_admission', 'Batch browser admission state and lifetime counts', _stats_gauge(batch_admission.stats))
+    REGISTRY.gauge('scraper_offer_parser', 'Bank offer parse memo state and lifetime counts', _stats_gauge(offer_cache_stats))
+    REGISTRY.gauge('scraper_rate_control', 'Per-host fetch concurrency limit, block pages and sustained products per hour',
+                   lambda: {(('host', host), ('stat', key)): value
+                            for host, stats in get_rate_controller().stats().items() for key, value in stats.items()})
+    if work_queue:
+        REGISTRY.gauge('scraper_work_queue', 'Shared work queue tasks by status', _stats_gauge(work_queue.stats))
+    if image_pipeline:
+        REGISTRY.gauge('scraper_image_cache', 'Image pipeline state and lifetime counts', _stats_gauge(image_pipeline.stats))
+
+def add_image_thumbnails(product_data, timings=None):
+    # Adds image_thumbnails: {image url: {'key', 'thumbnails': {size: path}}}. The paths are returned at once;
+    # the variants are generated in the background, or on their first request if that comes sooner
+    if not image_pipeline:
+        return
+    start = time.perf_counter()
+    urls = (product_data.get('product_images') or []) + (product_data.get('manufacturer_images') or [])
+    try:
+        product_data['image_thumbnails'] = image_pipeline.thumbnail_paths(urls)
+    except Exception as e:
+        print(f"Error processing product images: {e}")
+    seconds = time.perf_counter() - start
+    REGISTRY.observe('scraper_stage_duration_seconds', seconds, stage='images')
+    if timings is not None:
+        timings['images'] = round(seconds, 4)
+
+def client_id():
+    # Clients can identify themselves (e.g. behind a shared proxy); otherwise they are told apart by address
+    return request.headers.get('X-Client-Id') or request.remote_addr or 'unknown'
+
+def rejection_response(error, status, retry_after):
+    response = jsonify({'error': error, 'retry_after': retry_after})
+    response.status_code = status
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+def scrape_product(url, progress=None, timings=None, client=None, bounded=True, changes=None):
+    # timings, when given, is filled with the per-stage durations of this scrape, and changes with the
+    # fields that moved since the product's previous scrape
+    checkout_start = time.perf_counter()
+    with admission.admit(client, bounded=bounded), driver_pool.scraper() as scraper:
+        checkout_seconds = time.perf_counter() - checkout_start
+        print("Scraping product details...")
+        product_data = scraper.extract_product_details(url, progress=progress)
+        if timings is not None:
+            timings.update(scraper.timings.as_dict())
+            timings['driver_checkout'] = round(checkout_seconds, 4)
+        if changes is not None and scraper.changes is not None:
+            changes.update(scraper.changes)
+
+    if product_data:
+        add_image_thumbnails(product_data, timings)
+        if progress:
+            progress('images_done', count=len(product_data.get('image_thumbnails') or {}))
+        snapshot_store.append(product_data, url=url)
+    return product_data
+
+def refresh_product(url, cached, timings=None, client=None, bounded=True):
+    # Price, offers and summary of a cached product whose images and specs are still fresh, from the static
+    # page; None sends the caller back to a full scrape
+    with admission.admit(client, bounded=bounded), driver_pool.scraper() as scraper:
+        fields = scraper.refresh_volatile_fields(url, cached)
+        if timings is not None:
+            timings.update(scraper.timings.as_dict())
+    if fields:
+        snapshot_store.append(dict(cached, **fields), url=url)
+    return fields
+
+def run_scrape_job(url, report, client=None):
+    # Jobs already wait in the job queue, so they wait for a browser without a deadline (still in fair order)
+    product_data, source = result_cache.get_or_scrape(
+        url, lambda target: scrape_product(target, report, client=client, bounded=False),
+        refresh=lambda target, cached: refresh_product(target, cached, client=client, bounded=False))
+    if source == 'refresh':
+        report('refreshed')
+    elif source != 'scrape':
+        report('cache_hit', source=source)
+    return product_data
+
+def queued_scrape(url):
+    # /scrape in queue mode: answered from the cache, or enqueued for the workers and waited on for a while
+    asin, _ = canonicalize_url(url)
+    product_data = result_cache.get(asin) if asin else None
+    if product_data:
+        response = jsonify(product_data)
+        response.headers['X-Cache'] = 'HIT'
+        return response
+
+    task = work_queue.wait(work_queue.enqueue(url)['id'], QUEUE_WAIT)
+    if task['status'] == 'done':
+        product_data = task['result']
+        add_image_thumbnails(product_data)
+        cache_task_result(task)
+        response = jsonify(product_data)
+        response.headers['X-Cache'] = 'MISS'
+        return response
+    if task['status'] == 'dead':
+        return jsonify({'error': task['error'] or 'Failed to extract product details', 'job_id': task['id']}), 500
+    return job_accepted(task['id'], task_job(task)['status'])
+
+def cache_task_result(task):
+    # Results read back from the queue are cached like local scrapes, so repeat requests don't enqueue again
+    asin, _ = canonicalize_url(task['url'])
+    if asin and task['status'] == 'done':
+        result_cache.put(asin, task['result'])
+
+def job_accepted(job_id, status):
+    return jsonify({
+        'job_id': job_id,
+        'status': status,
+        'status_url': f'/jobs/{job_id}',
+        'events_url': f'/jobs/{job_id}/events',
+    }), 202
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -20,24 +209,291 @@ def scrape():
         if not url.startswith('https://www.amazon.in/') and not url.startswith('http://www.amazon.in/'):
             return jsonify({'error': 'Only Amazon India URLs are supported'}), 400
 
-        scraper = AmazonTVScraper()
+        if work_queue:
+            return queued_scrape(url)
+
+        # ?timings=1 (or "include_timings": true) adds per-stage durations to the response
+        include_timings = request.args.get('timings') == '1' or bool(request.json.get('include_timings'))
+        # ?changes=1 (or "include_changes": true) adds the fields that changed since the last scrape of this product
+        include_changes = request.args.get('changes') == '1' or bool(request.json.get('include_changes'))
+        timings = {}
+        changes = {}
+        client = client_id()
+
         try:
-            print("Scraping product details...")
-            product_data = scraper.extract_product_details(url)
+            product_data, source = result_cache.get_or_scrape(
+                url, lambda target: scrape_product(target, timings=timings, client=client, changes=changes),
+                refresh=lambda target, cached: refresh_product(target, cached, timings=timings, client=client))
             
             if product_data:
-                return jsonify(product_data)
+                if include_timings:
+                    product_data['timings'] = timings
+                if include_changes and source == 'scrape':
+                    product_data['changes'] = changes
+                response = jsonify(product_data)
+                # REFRESH: cached specs and images with price and offers fetched again
+                response.headers['X-Cache'] = {'scrape': 'MISS', 'refresh': 'REFRESH'}.get(source, 'HIT')
+                return response
             else:
                 return jsonify({'error': 'Failed to extract product details'}), 500
         
+        except AdmissionRejected as e:
+            return rejection_response(str(e), e.status, e.retry_after)
+
+        except PoolExhaustedError as e:
+            return rejection_response(str(e), 503, admission.retry_after())
+
         except Exception as e:
             return jsonify({'error': f'Scraping error: {str(e)}'}), 500
-        
-        finally:
-            scraper.close()
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/scrape/batch', methods=['POST'])
+def scrape_batch_route():
+    # Accepts {"urls": [...]} as JSON or a plain-text body with one URL per line
+    if request.is_json:
+        urls = (request.json or {}).get('urls') or []
+    else:
+        urls = list(read_urls(request.get_data(as_text=True).splitlines()))
+    if not urls:
+        return jsonify({'error': 'At least one URL is required'}), 400
+
+    if work_queue:
+        return stream_batch_items(queue_batch(work_queue, urls, lookup=lookup_cached))
+    workers = batch_workers()
+    return stream_batch_items(scrape_batch(urls, workers=workers, lookup=lookup_cached), workers)
+
+@app.route('/crawl', methods=['POST'])
+def crawl_route():
+    # {"urls": [...]} (or "url") of search/category pages; discovered products stream back as NDJSON
+    body = request.json if request.is_json else {}
+    urls = (body or {}).get('urls') or ([body['url']] if (body or {}).get('url') else [])
+    if not urls:
+        return jsonify({'error': 'At least one URL is required'}), 400
+    for url in urls:
+        error = validate_url(url)
+        if error:
+            return jsonify({'error': error, 'url': url}), 400
+
+    max_pages = body.get('max_pages') or request.args.get('max_pages', type=int)
+    if work_queue:
+        return stream_batch_items(crawl(urls, max_pages=max_pages, lookup=lookup_cached,
+                                        batch=lambda found, lookup: queue_batch(work_queue, found, lookup=lookup)))
+    workers = batch_workers()
+    return stream_batch_items(crawl(urls, max_pages=max_pages, workers=workers, lookup=lookup_cached), workers)
+
+def batch_workers():
+    # Each batch worker runs its own browser, so a batch never gets more workers than the batch browser cap
+    return max(1, batch_worker_count(request.args.get('workers', type=int)))
+
+def lookup_cached(url):
+    asin, _ = canonicalize_url(url)
+    return result_cache.get(asin) if asin else None
+
+def stream_batch_items(items, workers=None):
+    # The batch holds one batch browser per worker until the stream is closed; queued batches (no workers
+    # here) scrape on the worker nodes and hold none
+    weight = 0
+    if workers:
+        try:
+            weight = batch_admission.acquire(client_id(), weight=workers)
+        except AdmissionRejected as e:
+            return rejection_response(str(e), e.status, e.retry_after)
+
+    # Fresh results go into the cache and snapshot store as they stream out (queue workers record their own)
+    def generate():
+        for item in items:
+            if item['ok'] and not item.get('cached'):
+                if workers:
+                    snapshot_store.append(item['data'], url=item['url'], asin=item['asin'])
+                if item['asin']:
+                    result_cache.put(item['asin'], item['data'])
+            yield json.dumps(item, ensure_ascii=False) + '\n'
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    if weight:
+        response.call_on_close(lambda: batch_admission.release(weight))
+    return response
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    url = (request.json or {}).get('url') if request.is_json else None
+    error = validate_url(url)
+    if error:
+        return jsonify({'error': error}), 400
+
+    # Queued jobs are the shared queue's tasks; the queue is durable, so it takes whatever backlog there is
+    if work_queue:
+        task = work_queue.enqueue(url)
+        return job_accepted(task['id'], task_job(task)['status'])
+
+    # Jobs queue behind the scrape slots too, so refuse new ones once the backlog is as long as the admission queue
+    backlog = job_manager.stats()
+    if backlog['queued'] + backlog['running'] >= admission.limit + admission.queue_size:
+        return rejection_response('Too many scrape jobs queued, try again later', 503, admission.retry_after())
+
+    client = client_id()
+    job = job_manager.submit(url, lambda target, report: run_scrape_job(target, report, client))
+    return job_accepted(job.id, job.status)
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    if work_queue:
+        task = work_queue.get(job_id)
+        if task is None:
+            return jsonify({'error': 'Job not found'}), 404
+        cache_task_result(task)
+        return jsonify(task_job(task))
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    if work_queue:
+        return queued_job_events(job_id)
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def generate():
+        cursor = 0
+        while True:
+            events, finished = job.wait_for_events(cursor, timeout=15)
+            for event in events:
+                yield f"event: {event['stage']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+            cursor += len(events)
+            if finished and not events:
+                # Final event carries the whole job, including the product data
+                yield f"event: result\ndata: {json.dumps(job.to_dict(), ensure_ascii=False)}\n\n"
+                return
+            if not events:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+
+    return event_stream(generate())
+
+def queued_job_events(task_id):
+    # Tasks run on other nodes, so their progress is polled: one event per status change, then the result
+    task = work_queue.get(task_id)
+    if task is None:
+        return jsonify({'error': 'Job not found'}), 404
+    poll_interval = float(os.getenv('SCRAPER_QUEUE_POLL_INTERVAL', '1'))
+
+    def generate():
+        sent = None
+        idle_since = time.monotonic()
+        current = task
+        while True:
+            job = task_job(current, include_result=False)
+            event = job['events'][-1]
+            if (job['status'], job['attempts']) != sent:
+                sent = (job['status'], job['attempts'])
+                idle_since = time.monotonic()
+                yield f"event: {event['stage']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+            if current['status'] in ('done', 'dead'):
+                cache_task_result(current)
+                yield f"event: result\ndata: {json.dumps(task_job(current), ensure_ascii=False)}\n\n"
+                return
+            if time.monotonic() - idle_since >= 15:
+                idle_since = time.monotonic()
+                yield ": keep-alive\n\n"
+            time.sleep(poll_interval)
+            current = work_queue.get(task_id)
+            if current is None:
+                return
+
+    return event_stream(generate())
+
+def event_stream(events):
+    response = Response(stream_with_context(events), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/history/<asin>', methods=['GET'])
+def history(asin):
+    # Price, MRP and discount time series; since/until take epoch seconds or ISO 8601 times
+    try:
+        since = parse_time(request.args.get('since'))
+        until = parse_time(request.args.get('until'))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid time: {e}'}), 400
+    limit = request.args.get('limit', type=int)
+
+    points = snapshot_store.history(asin, since=since, until=until, limit=limit)
+    if not points:
+        return jsonify({'error': 'No snapshots for this ASIN'}), 404
+    return jsonify({'asin': asin.upper(), 'count': len(points), 'points': points})
+
+@app.route('/catalog/query', methods=['GET'])
+def catalog_query():
+    # filter=selling_price<40000,resolution_height>=2160 (repeatable), q=<name text>, sort=-rating,price_per_inch,
+    # columns=asin,selling_price, limit and offset
+    filters = [expression for value in request.args.getlist('filter') for expression in value.split(',') if expression.strip()]
+    sort = [key for key in request.args.get('sort', '').split(',') if key]
+    columns = [column for column in request.args.get('columns', '').split(',') if column]
+    try:
+        result = catalog.query(filters=filters, text=request.args.get('q'), sort=sort, columns=columns,
+                               limit=request.args.get('limit', 50, type=int), offset=request.args.get('offset', 0, type=int))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result)
+
+@app.route('/export', methods=['GET'])
+def export():
+    # format=csv|jsonl|parquet, all=1 for every snapshot instead of each product's latest, asin, since and until.
+    # The file is streamed as it is produced, a chunk of products at a time
+    fmt = request.args.get('format', 'jsonl')
+    try:
+        chunks = export_products(snapshot_store, fmt, latest=request.args.get('all') != '1', asin=request.args.get('asin'),
+                                 since=parse_time(request.args.get('since')), until=parse_time(request.args.get('until')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    # Closing the response (finished or abandoned by the client) closes the stream and its database connection
+    response = Response(stream_with_context(chunks), content_type=EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="products.{fmt}"'
+    return response
+
+@app.route('/images/<key>/<int:size>.webp', methods=['GET'])
+def image_variant(key, size):
+    path = image_pipeline.path_for(key, size) if image_pipeline else None
+    if path is None:
+        return jsonify({'error': 'Image not found'}), 404
+    # Keyed by Amazon's image URL (whose content never changes) or by content hash, so it can be cached for good
+    return send_file(path, mimetype='image/webp', max_age=31536000)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+def serve_production(host, port):
+    # Request threads: every admitted or waiting scrape holds one, plus headroom for cheap requests
+    threads = int(os.getenv('SCRAPER_SERVER_THREADS', admission.limit + admission.queue_size
+                            + batch_admission.limit + batch_admission.queue_size + 8))
+    threading.Thread(target=driver_pool.warm, daemon=True).start()
+    try:
+        from waitress import serve
+    except ImportError:
+        print("waitress is not installed, falling back to the threaded development server")
+        app.run(host=host, port=port, threaded=True, debug=False, use_reloader=False)
+        return
+    serve(app, host=host, port=port, threads=threads, connection_limit=threads * 4, channel_timeout=300)
+
 if __name__ == '__main__':
-    app.run(debug=True) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Amazon TV scraper web application")
+    parser.add_argument('--production', action='store_true', default=os.getenv('SCRAPER_SERVE_MODE') == 'production',
+                        help="Serve with waitress, without the debugger and reloader (or set SCRAPER_SERVE_MODE=production)")
+    parser.add_argument('--host', default=os.getenv('SCRAPER_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('SCRAPER_PORT', '5000')))
+    args = parser.parse_args()
+
+    if args.production:
+        serve_production(args.host, args.port)
+    else:
+        # Only warm the pool in the reloader child, not in the watcher process
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            threading.Thread(target=driver_pool.warm, daemon=True).start()
+        app.run(host=args.host, port=args.port, debug=True) 
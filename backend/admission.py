@@ -0,0 +1,171 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+
+class AdmissionRejected(Exception):
+    # status is 429 when one client is over its share of the queue, 503 when the service is saturated
+    def __init__(self, message, status, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    def __init__(self, client, weight):
+        self.client = client
+        self.weight = weight
+        self.granted = False
+
+
+class AdmissionController:
+    def __init__(self, limit=None, queue_size=None, max_wait=None, per_client=None, background_limit=None):
+        # Scrapes allowed to run at once; app.py ties this to the browser pool size
+        self.limit = limit or int(os.getenv('SCRAPER_MAX_CONCURRENT_SCRAPES', '2'))
+        # Requests allowed to wait for a slot, and for how long, before they are turned away
+        self.queue_size = queue_size if queue_size is not None else int(os.getenv('SCRAPER_ADMISSION_QUEUE', str(self.limit * 4)))
+        self.max_wait = max_wait if max_wait is not None else float(os.getenv('SCRAPER_ADMISSION_TIMEOUT', '30'))
+        # Waiting requests per client, so one noisy client can't fill the whole queue
+        self.per_client = per_client or int(os.getenv('SCRAPER_ADMISSION_PER_CLIENT', '2'))
+        # Slots background work (bounded=False, e.g. jobs) may hold at once, so a large submission can't keep
+        # interactive requests waiting; the rest are left for them
+        background_limit = background_limit or int(os.getenv('SCRAPER_ADMISSION_BACKGROUND_LIMIT', str(max(1, self.limit // 2))))
+        self.background_limit = min(self.limit, background_limit)
+
+        self._condition = threading.Condition()
+        self._running = 0
+        self._queues = OrderedDict()  # client -> deque of tickets, rotated for round-robin service
+        self._queued = 0
+        # Background tickets wait in their own FIFO, outside the bounded queue and the round-robin
+        self._background = deque()
+        self._background_running = 0
+        # Moving average of how long an admitted scrape holds its slot, used for Retry-After
+        self._service_seconds = 10.0
+        self._stats = {'admitted': 0, 'queued': 0, 'background_queued': 0, 'rejected_client': 0, 'rejected_full': 0,
+                       'timed_out': 0}
+
+    def retry_after(self):
+        # Seconds until the current backlog has likely drained through the available slots
+        with self._condition:
+            return self._retry_after()
+
+    def _retry_after(self):
+        backlog = self._queued + self._running
+        return max(1, math.ceil(self._service_seconds * backlog / self.limit))
+
+    def _grant_next(self):
+        # Round-robin across clients: serve the head of the first client's queue, then move that client to the back.
+        # Background tickets are served in order within their own limit.
+        while self._queues:
+            client, tickets = next(iter(self._queues.items()))
+            ticket = tickets[0]
+            if self._running + ticket.weight > self.limit:
+                break
+            tickets.popleft()
+            self._queued -= 1
+            if tickets:
+                self._queues.move_to_end(client)
+            else:
+                del self._queues[client]
+            ticket.granted = True
+            self._running += ticket.weight
+            self._condition.notify_all()
+        while self._background and self._fits_background(self._background[0].weight):
+            ticket = self._background.popleft()
+            ticket.granted = True
+            self._running += ticket.weight
+            self._background_running += ticket.weight
+            self._condition.notify_all()
+
+    def _fits_background(self, weight):
+        return (self._running + weight <= self.limit
+                and self._background_running + weight <= self.background_limit)
+
+    def _remove(self, ticket):
+        tickets = self._queues.get(ticket.client)
+        if tickets and ticket in tickets:
+            tickets.remove(ticket)
+            self._queued -= 1
+            if not tickets:
+                del self._queues[ticket.client]
+
+    def acquire(self, client, weight=1, max_wait=None, bounded=True):
+        # Blocks until the request may run; raises AdmissionRejected instead of queueing without limit.
+        # bounded=False waits as long as it takes (background jobs), within background_limit.
+        if not bounded:
+            return self._acquire_background(client, weight)
+        weight = min(max(1, weight), self.limit)
+        max_wait = self.max_wait if max_wait is None else max_wait
+        with self._condition:
+            if not self._queues and self._running + weight <= self.limit:
+                self._running += weight
+                self._stats['admitted'] += 1
+                return weight
+
+            if self._queued >= self.queue_size:
+                self._stats['rejected_full'] += 1
+                raise AdmissionRejected("Too many scrapes in progress, try again later", 503, self._retry_after())
+            if len(self._queues.get(client, ())) >= self.per_client:
+                self._stats['rejected_client'] += 1
+                raise AdmissionRejected("Too many requests from this client, try again later", 429, self._retry_after())
+
+            ticket = _Ticket(client, weight)
+            self._queues.setdefault(client, deque()).append(ticket)
+            self._queued += 1
+            self._stats['queued'] += 1
+            deadline = time.monotonic() + max_wait
+            while not ticket.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._remove(ticket)
+                    self._stats['timed_out'] += 1
+                    # The head of the queue may have been waiting on this ticket's place
+                    self._grant_next()
+                    raise AdmissionRejected("Timed out waiting for a free browser, try again later", 503, self._retry_after())
+                self._condition.wait(remaining)
+            self._stats['admitted'] += 1
+            return weight
+
+    def _acquire_background(self, client, weight):
+        weight = min(max(1, weight), self.background_limit)
+        with self._condition:
+            if not self._background and self._fits_background(weight):
+                self._running += weight
+                self._background_running += weight
+            else:
+                ticket = _Ticket(client, weight)
+                self._background.append(ticket)
+                self._stats['background_queued'] += 1
+                while not ticket.granted:
+                    self._condition.wait()
+            self._stats['admitted'] += 1
+            return weight
+
+    def release(self, weight=1, held_seconds=None, background=False):
+        with self._condition:
+            self._running -= weight
+            if background:
+                self._background_running -= weight
+            if held_seconds is not None:
+                self._service_seconds = 0.8 * self._service_seconds + 0.2 * held_seconds
+            self._grant_next()
+
+    @contextmanager
+    def admit(self, client, weight=1, max_wait=None, bounded=True):
+        weight = self.acquire(client, weight=weight, max_wait=max_wait, bounded=bounded)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(weight, time.monotonic() - start, background=not bounded)
+
+    def stats(self):
+        with self._condition:
+            stats = dict(self._stats)
+            stats.update(running=self._running, waiting=self._queued, clients_waiting=len(self._queues),
+                         background_running=self._background_running, background_waiting=len(self._background),
+                         limit=self.limit, queue_size=self.queue_size, background_limit=self.background_limit)
+        return stats
@@ -1,28 +1,139 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.common.exceptions import WebDriverException
-from bs4 import BeautifulSoup
-import requests
+# Selenium and requests are imported inside the methods that use them: together they dominate
+# cold start time, and an HTTP-only scrape or a cached response never needs a browser
+import hashlib
 import json
 import os
 import time
 from datetime import datetime
-import pandas as pd
-from urllib.parse import urljoin
-import re
 import sys
 import platform
 import subprocess
 import traceback
+import threading
+import argparse
+from backend.page_readiness import PageReadiness, PRODUCT_SECTIONS, BANK_OFFER_SECTIONS
+from backend.metrics import REGISTRY, StageTimings
+from backend.offer_parser import parse_main_page_offers, parse_offers
+from backend.extraction import SECTION_IDS, ProductPage, fragment_section, section_html, side_sheet_offer_texts
+from backend.page_archive import PageArchive
+from backend.rate_control import FAILED, OK, PAGE_STATE_JS, RateLimited, classify_block, get_rate_controller
+from backend.result_cache import extract_asin
+from backend.snapshot_store import SnapshotStore
+
+FETCH_MODES = ('browser', 'http', 'auto')
+
+# Page sections in extraction order: (section, timing stage, fields its extractor produces).
+# Each is fingerprinted so a re-scrape can reuse the stored fields of sections whose markup hasn't changed
+SECTIONS = (
+    ('title', 'extract_product_name', ('product_name',)),
+    ('rating', 'extract_rating_info', ('rating', 'number_of_ratings')),
+    ('price', 'extract_price_info', ('selling_price', 'mrp', 'discount_percentage')),
+    ('offers', 'extract_bank_offers', ('bank_offers',)),
+    ('feature_bullets', 'extract_about_this_item', ('about_this_item',)),
+    ('tech_specs', 'extract_product_information', ('product_information',)),
+    ('images', 'extract_product_images', ('product_images',)),
+    ('aplus', 'extract_manufacturer_images', ('manufacturer_images',)),
+    ('summary', 'summary', ('ai_review_summary',)),
+)
+# The summary is written from these sections' fields, so it is only rewritten when one of them changes
+SUMMARY_INPUTS = ('price', 'feature_bullets', 'tech_specs')
+
+HTTP_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-IN,en;q=0.9',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+}
+
+# Extractors only read image URLs from attributes, so lean browsers never download the files
+# themselves, nor fonts, media or third-party ad and analytics scripts
+LEAN_BLOCKED_URL_PATTERNS = [
+    '*.jpg*', '*.jpeg*', '*.png*', '*.gif*', '*.webp*', '*.svg*', '*.ico*',
+    '*.woff*', '*.ttf*', '*.otf*', '*.eot*',
+    '*.mp4*', '*.webm*', '*.m3u8*', '*.mp3*',
+    '*amazon-adsystem.com*', '*doubleclick.net*', '*googlesyndication.com*',
+    '*google-analytics.com*', '*googletagmanager.com*', '*facebook.net*',
+    '*scorecardresearch.com*', '*fls-eu.amazon.*', '*fls-na.amazon.*', '*unagi.amazon.*',
+]
+
+LEAN_CHROME_ARGUMENTS = [
+    "--blink-settings=imagesEnabled=false",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-notifications",
+    "--mute-audio",
+    "--no-first-run",
+    "--disable-features=Translate,MediaRouter,OptimizationHints,AutofillServerCommunication",
+]
+
+# Returns the outerHTML of each requested element id (or null) in a single WebDriver round trip
+GET_FRAGMENTS_JS = """
+return arguments[0].map(function (id) {
+    var element = document.getElementById(id);
+    return element ? element.outerHTML : null;
+});
+"""
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_http_session():
+    # One keep-alive session per process so product fetches reuse pooled connections
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            pool_size = int(os.getenv('SCRAPER_HTTP_POOL_SIZE', '10'))
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=1)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update(HTTP_HEADERS)
+            proxy = os.getenv('SCRAPER_PROXY')
+            if proxy:
+                session.proxies.update({'http': proxy, 'https': proxy})
+            _http_session = session
+        return _http_session
 
 class AmazonTVScraper:
-    def __init__(self):
-        self.setup_driver()
+    def __init__(self, fetch_mode=None, lean=None, archive=None, incremental=None, rate_control=None, section_store=None):
+        # 'browser' renders everything in Chrome, 'http' never starts Chrome, and 'auto'
+        # fetches the static page over HTTP and only uses Chrome for the bank offer side sheet
+        self.fetch_mode = fetch_mode or os.getenv('SCRAPER_FETCH_MODE', 'browser')
+        if self.fetch_mode not in FETCH_MODES:
+            raise ValueError(f"Unknown fetch mode: {self.fetch_mode}")
+        # Lean browsers skip images, fonts, media and trackers; set SCRAPER_LEAN_MODE=0 to load everything
+        self.lean = lean if lean is not None else os.getenv('SCRAPER_LEAN_MODE', '1') != '0'
+        self.driver = None
+        self.owns_driver = True
+        self.readiness = None
+        # Durations of each stage of the most recent scrape
+        self.timings = StageTimings()
+        # Chrome is launched on first use (or by start()), so constructing a scraper is cheap
+        # Raw pages are archived for offline re-extraction when SCRAPER_ARCHIVE_DIR is set; archive=False disables it
+        self.archive = PageArchive.from_env() if archive is None else (archive or None)
+        # Section fingerprints and values of the last scrape of each product are kept in the snapshot database,
+        # so re-scrapes skip unchanged sections; SCRAPER_INCREMENTAL=0 or incremental=False always extracts everything.
+        # Callers holding a SnapshotStore pass it as section_store so fingerprints sit next to their snapshots;
+        # otherwise the scraper opens one at the default path and closes it in close()
+        if incremental is None:
+            incremental = os.getenv('SCRAPER_INCREMENTAL', '1') != '0'
+        self.owns_section_store = bool(incremental) and section_store is None
+        self.section_store = (section_store or SnapshotStore()) if incremental else None
+        # Fields that changed since the previous scrape of the same product, {field: {'old', 'new'}};
+        # None when there was nothing to compare against
+        self.changes = None
+        # Fetches wait their turn with the process-wide per-host rate controller and are retried after a
+        # backoff when Amazon serves a block page; rate_control=False leaves that to the caller (batch workers)
+        self.rate_control = get_rate_controller() if rate_control is None else (rate_control or None)
+        # Why the last fetch was refused ('captcha', 'robot_check', 'throttled'), or None
+        self.block_reason = None
         
     def _get_chrome_version(self):
         try:
@@ -60,18 +171,45 @@ class AmazonTVScraper:
             print(f"Error getting Chrome version: {e}")
             return None
 
-    def setup_driver(self):
+    def setup_driver(self, page_load_strategy=None, arguments=()):
+        # page_load_strategy and arguments override the defaults, e.g. for a browser shared by several tabs
         try:
+            from selenium import webdriver
+            from selenium.webdriver.chrome.service import Service
+            from selenium.webdriver.chrome.options import Options
+
             chrome_options = Options()
             chrome_options.add_argument("--headless=new")
             chrome_options.add_argument("--disable-gpu")
             chrome_options.add_argument("--no-sandbox")
             chrome_options.add_argument("--disable-dev-shm-usage")
             chrome_options.add_argument("--window-size=1920,1080")
+            # Route the browser through a proxy, e.g. the local stand-in server used by the benchmarks
+            proxy = os.getenv('SCRAPER_PROXY')
+            if proxy:
+                chrome_options.add_argument(f"--proxy-server={proxy}")
+            for argument in arguments:
+                chrome_options.add_argument(argument)
+            if self.lean:
+                # Return from driver.get at DOMContentLoaded; the readiness waits cover the rest
+                chrome_options.page_load_strategy = 'eager'
+                for argument in LEAN_CHROME_ARGUMENTS:
+                    chrome_options.add_argument(argument)
+                chrome_options.add_experimental_option("prefs", {
+                    "profile.managed_default_content_settings.images": 2,
+                    "profile.managed_default_content_settings.media_stream": 2,
+                    "profile.default_content_setting_values.notifications": 2,
+                })
+            if page_load_strategy:
+                chrome_options.page_load_strategy = page_load_strategy
             
             # Simplified driver setup
-            service = Service()
-            self.driver = webdriver.Chrome(service=service, options=chrome_options)
+            with self.timings.time('driver_startup'):
+                service = Service()
+                self.driver = webdriver.Chrome(service=service, options=chrome_options)
+                if self.lean:
+                    self._block_requests()
+            self.readiness = PageReadiness(self.driver)
                 
         except Exception as e:
             print(f"Error setting up Chrome driver: {str(e)}")
@@ -86,280 +224,367 @@ class AmazonTVScraper:
             print("   - Extract chromedriver.exe to your project folder")
             print("4. Then run the script again")
             sys.exit(1)
-        
-    def get_page_content(self, url):
+
+    def _block_requests(self):
+        # Request blocking through the DevTools protocol applies to every navigation of this browser
+        patterns = LEAN_BLOCKED_URL_PATTERNS + [p for p in os.getenv('SCRAPER_BLOCKED_URLS', '').split(',') if p]
+        try:
+            self.driver.execute_cdp_cmd('Network.enable', {})
+            self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+        except Exception as e:
+            print(f"Error enabling request blocking: {e}")
+
+    def attach(self, driver):
+        # Scrape in a browser owned by someone else, e.g. one tab of a shared Chrome. The tab must be the
+        # driver's current window when this is called; close() leaves the browser running.
+        self.driver = driver
+        self.owns_driver = False
+        if self.lean:
+            self._block_requests()
+        # Blocking async scripts would hold up every other tab of the browser, so readiness is polled
+        self.readiness = PageReadiness(driver, blocking=False)
+        return self
+
+    def _ensure_driver(self):
+        if self.driver is None:
+            self.setup_driver()
+        return self.driver
+
+    def start(self):
+        # Launch the browser up front, e.g. when warming a pool
+        if self.fetch_mode != 'http':
+            self._ensure_driver()
+        return self
+
+    def _wait_for(self, locator_type, value, timeout=10, all_elements=False):
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+
+        locator = (getattr(By, locator_type), value)
+        condition = EC.presence_of_all_elements_located(locator) if all_elements else EC.presence_of_element_located(locator)
+        return WebDriverWait(self.driver, timeout).until(condition)
+
+    def _wait_for_product(self, timeout=10):
+        # True once the product title is there. A CAPTCHA or error page returns False as soon as it has
+        # loaded, with block_reason set when it is a block, rather than after the whole timeout
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        state = WebDriverWait(self.driver, timeout).until(lambda driver: driver.execute_script(PAGE_STATE_JS))
+        if state == 'product':
+            return True
+        self.block_reason = 'captcha' if state == 'captcha' else classify_block(self.driver.page_source)
+        print(f"Page has no product title{f' ({self.block_reason} page)' if self.block_reason else ''}")
+        return False
+
+    def get_static_content(self, url):
+        import requests
+
+        try:
+            with self.timings.time('static_fetch'):
+                response = get_http_session().get(url, timeout=10)
+            if response.status_code != 200:
+                print(f"Static fetch returned HTTP {response.status_code}")
+                self.block_reason = classify_block(response.text, response.status_code)
+                return None
+            # requests assumes ISO-8859-1 when no charset is sent, which mangles the ₹ sign
+            if 'charset' not in response.headers.get('Content-Type', '').lower():
+                response.encoding = 'utf-8'
+            # Robot check and error pages come back as 200s without a product title
+            if 'id="productTitle"' not in response.text:
+                self.block_reason = classify_block(response.text)
+                print(f"Static page has no product title{f' ({self.block_reason} page)' if self.block_reason else ''}")
+                return None
+            return response.text
+        except requests.RequestException as e:
+            print(f"Error fetching static page: {e}")
+            return None
+
+    def open_in_browser(self, url):
+        # Load the page just far enough for interactive sections, without scrolling
         try:
-            self.driver.get(url)
-            # Wait for the main product content to load
-            WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.ID, "productTitle"))
-            )
+            self._ensure_driver()
+            with self.timings.time('driver_get'):
+                self.driver.get(url)
+                return self._wait_for_product()
+        except Exception as e:
+            print(f"Error loading page in browser: {e}")
+            return False
+
+    def get_page_content(self, url, open_offers=True):
+        try:
+            self._ensure_driver()
+            with self.timings.time('driver_get'):
+                self.driver.get(url)
+                # Wait for the main product content to load
+                if not self._wait_for_product():
+                    return None
             # Scroll to load all dynamic content
-            self.scroll_page()
-            return self.driver.page_source
+            with self.timings.time('scroll_page'):
+                self.scroll_page()
+            # Open the bank offer side sheet before taking the page source so one parse covers it
+            if open_offers:
+                self.open_bank_offers()
+            with self.timings.time('page_source'):
+                return self.driver.page_source
         except Exception as e:
             print(f"Error loading page: {e}")
             return None
 
     def scroll_page(self):
-        # Scroll slowly to load all dynamic content
-        last_height = self.driver.execute_script("return document.body.scrollHeight")
-        while True:
-            self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(2)
-            new_height = self.driver.execute_script("return document.body.scrollHeight")
-            if new_height == last_height:
-                break
-            last_height = new_height
-
-    def extract_product_details(self, url):
-        page_content = self.get_page_content(url)
+        # Scroll until the sections the extractors need have rendered, instead of sleeping between scrolls
+        self.readiness.wait_for_sections(PRODUCT_SECTIONS)
+
+    @property
+    def wait_timings(self):
+        return dict(self.readiness.timings) if self.readiness else {}
+
+    def open_bank_offers(self):
+        with self.timings.time('bank_offer_click'):
+            return self._open_bank_offers()
+
+    def _open_bank_offers(self):
+        try:
+            # Wait for the bank offers section to be present
+            bank_offer_elements = self._wait_for('CLASS_NAME', "a-carousel-card", all_elements=True)
+
+            # Click on the bank offer card if found
+            for element in bank_offer_elements:
+                try:
+                    if any(text in element.text for text in ['Bank Offer', 'Credit Card', '₹3,000']):
+                        element.click()
+                        # Wait for the offer rows in the side panel rather than a fixed delay
+                        found = self.readiness.wait_for_sections(BANK_OFFER_SECTIONS, scroll=False)
+                        return found.get('bank_offers', False)
+                except Exception:
+                    continue
+        except Exception as e:
+            print(f"Error opening bank offers side panel: {e}")
+        return False
+
+    def get_fragments(self, element_ids):
+        # Pull only the containers we need instead of the whole (often multi-megabyte) page_source
+        element_ids = list(element_ids)
+        try:
+            fragments = self.driver.execute_script(GET_FRAGMENTS_JS, element_ids)
+            return dict(zip(element_ids, fragments or []))
+        except Exception as e:
+            print(f"Error fetching page fragments: {e}")
+            return {}
+
+    def get_bank_offer_sheet(self):
+        element_id = SECTION_IDS['bank_offer_sheet']
+        with self.timings.time('bank_offer_fragment'):
+            fragment = self.get_fragments([element_id]).get(element_id)
+        return fragment_section(fragment, 'bank_offer_sheet') if fragment else None
+
+    def extract_product_details(self, url, progress=None):
+        # progress(stage) is called as the scrape moves through its stages
+        report = progress or (lambda stage, **details: None)
+        if self.readiness:
+            self.readiness.reset()
+        self.timings.reset()
+        self.changes = None
+        self.block_reason = None
+        start = time.perf_counter()
+        product_data = None
+        try:
+            product_data = self._extract_product_details(url, report)
+        finally:
+            for name, wait in self.wait_timings.items():
+                self.timings.record(f'wait_{name}', wait['seconds'])
+            self.timings.record('total', time.perf_counter() - start)
+            REGISTRY.increment('scraper_scrapes_total', outcome='success' if product_data else 'failure')
+        return product_data
+
+    def fetch_page(self, url, fetch_mode=None):
+        # (page_content, fetch_mode) of the product page, or (None, fetch_mode) on failure
+        fetch_mode = fetch_mode or self.fetch_mode
+        page_content = None
+        if fetch_mode in ('http', 'auto'):
+            page_content = self.get_static_content(url)
+            # A block page would only be served again to the browser, so that is left to the backoff
+            if page_content is None and fetch_mode == 'auto' and not self.block_reason:
+                print("Falling back to browser rendering...")
+                fetch_mode = 'browser'
+        if fetch_mode == 'browser':
+            page_content = self.get_page_content(url)
+        return page_content, fetch_mode
+
+    def _fetch_with_rate_control(self, url, fetch_mode=None):
+        # Each attempt takes a slot from the host's limit; block pages shrink the limit and are retried once
+        # the host's backoff (with jitter) has passed
+        fetch_mode = fetch_mode or self.fetch_mode
+        if self.rate_control is None:
+            return self.fetch_page(url, fetch_mode)
+        for attempt in range(self.rate_control.retries + 1):
+            self.block_reason = None
+            try:
+                with self.timings.time('rate_wait'):
+                    ticket = self.rate_control.acquire(url)
+            except RateLimited as e:
+                print(f"Not fetching: {e}")
+                self.block_reason = self.block_reason or 'rate_limited'
+                return None, fetch_mode
+            page_content, fetched_mode = None, fetch_mode
+            try:
+                page_content, fetched_mode = self.fetch_page(url, fetch_mode)
+            finally:
+                self.rate_control.release(ticket, self.block_reason or (OK if page_content else FAILED))
+            if not self.block_reason:
+                return page_content, fetched_mode
+            print(f"Blocked on attempt {attempt + 1} of {self.rate_control.retries + 1}")
+        return None, fetch_mode
+
+    def _extract_product_details(self, url, report):
+        page_content, fetch_mode = self._fetch_with_rate_control(url)
         if not page_content:
             return None
-        
-        soup = BeautifulSoup(page_content, 'lxml')
+        report('page_loaded', fetch_mode=fetch_mode)
+
+        # Parse once; every extractor below reads from the same indexed tree
+        with self.timings.time('parse'):
+            page = ProductPage(page_content)
+
+        # Bank offers (the side sheet needs JavaScript, so escalate to the browser in auto mode)
+        side_panel = page.bank_offer_sheet()
+        side_sheet_html = None
+        if fetch_mode == 'auto' and self.open_in_browser(url) and self.open_bank_offers():
+            side_panel = self.get_bank_offer_sheet()
+            side_sheet_html = section_html(side_panel) if side_panel is not None else None
+
+        if self.archive:
+            with self.timings.time('archive'):
+                self.archive.store(url, page_content, fetch_mode, side_sheet_html)
+
+        asin = extract_asin(url) if self.section_store else None
+        if not asin:
+            return self.extract_sections(page, side_panel, report)
+
+        previous = self.section_store.latest_sections(asin)
+        product_data, updated = self.extract_sections(page, side_panel, report, previous=previous, with_sections=True)
+        with self.timings.time('save_sections'):
+            self.section_store.save_sections(asin, updated)
+        return product_data
+
+    def refresh_volatile_fields(self, url, product_data):
+        # Price, bank offers and the summary of a product whose other fields are still fresh, re-extracted from
+        # the static page over HTTP. The side sheet still needs the browser unless fetch mode is 'http'.
+        # Returns None when the static page can't be fetched, so the caller falls back to a full scrape.
+        self.timings.reset()
+        self.block_reason = None
+        start = time.perf_counter()
+        try:
+            page_content, _ = self._fetch_with_rate_control(url, 'http')
+            if not page_content:
+                return None
+            with self.timings.time('parse'):
+                page = ProductPage(page_content)
+            side_panel = page.bank_offer_sheet()
+            if self.fetch_mode != 'http' and self.open_in_browser(url) and self.open_bank_offers():
+                side_panel = self.get_bank_offer_sheet()
+            with self.timings.time('extract_price_info'):
+                fields = self._get_price_info(page)
+            with self.timings.time('extract_bank_offers'):
+                fields['bank_offers'] = self._get_bank_offers(page, side_panel)
+            with self.timings.time('summary'):
+                fields['ai_review_summary'] = self._generate_ai_review_summary(dict(product_data, **fields))
+            return fields
+        finally:
+            self.timings.record('total', time.perf_counter() - start)
+
+    def extract_from_html(self, page_content, side_sheet_html=None):
+        # Runs the extractors over already fetched HTML, e.g. a page from the archive
+        page = ProductPage(page_content)
+        side_panel = fragment_section(side_sheet_html, 'bank_offer_sheet') if side_sheet_html else page.bank_offer_sheet()
+        return self.extract_sections(page, side_panel)
+
+    def extract_sections(self, page, side_panel=None, report=None, previous=None, with_sections=False):
+        # previous is {section: {'fingerprint', 'value'}} from the last scrape of this product; sections that
+        # fingerprint the same reuse their stored fields instead of being extracted (and summarized) again.
+        # with_sections also returns the sections that were extracted, in the same form, for storing.
+        report = report or (lambda stage, **details: None)
+        with self.timings.time('fingerprint'):
+            fingerprints = page.fingerprints(side_panel)
+            fingerprints['summary'] = hashlib.sha256(
+                ''.join(fingerprints[section] for section in SUMMARY_INPUTS).encode('ascii')).hexdigest()
+
+        extractors = {
+            'title': lambda: {'product_name': self._get_product_name(page)},
+            'rating': lambda: self._get_rating_info(page),
+            'price': lambda: self._get_price_info(page),
+            'offers': lambda: {'bank_offers': self._get_bank_offers(page, side_panel)},
+            'feature_bullets': lambda: {'about_this_item': self._get_about_this_item(page)},
+            'tech_specs': lambda: {'product_information': self._get_product_information(page)},
+            'images': lambda: {'product_images': self._get_product_images(page)},
+            'aplus': lambda: {'manufacturer_images': self._get_manufacturer_images(page)},
+            'summary': lambda: {'ai_review_summary': self._generate_ai_review_summary(product_data)},
+        }
+
+        previous = previous or {}
         product_data = {}
-        
-        # Product Name
-        product_data['product_name'] = self._get_product_name(soup)
-        
-        # Rating and Number of Ratings
-        rating_info = self._get_rating_info(soup)
-        product_data.update(rating_info)
-        
-        # Price Information
-        price_info = self._get_price_info(soup)
-        product_data.update(price_info)
-        
-        # Bank Offers
-        product_data['bank_offers'] = self._get_bank_offers(soup)
-        
-        # About this item
-        product_data['about_this_item'] = self._get_about_this_item(soup)
-        
-        # Product Information
-        product_data['product_information'] = self._get_product_information(soup)
-        
-        # Product Images
-        product_data['product_images'] = self._get_product_images(soup)
-        
-        # Manufacturer Images
-        product_data['manufacturer_images'] = self._get_manufacturer_images(soup)
-        
-        # Generate AI Review Summary based on collected data
-        product_data['ai_review_summary'] = self._generate_ai_review_summary(product_data)
-        
+        updated = {}
+        changes = {}
+        for section, stage, fields in SECTIONS:
+            stored = previous.get(section)
+            if stored is not None and stored['fingerprint'] == fingerprints[section] and set(fields) <= stored['value'].keys():
+                value = {field: stored['value'][field] for field in fields}
+            else:
+                with self.timings.time(stage):
+                    value = extractors[section]()
+                updated[section] = {'fingerprint': fingerprints[section], 'value': value}
+                if stored is not None:
+                    changes.update({field: {'old': stored['value'].get(field), 'new': value.get(field)}
+                                    for field in fields if stored['value'].get(field) != value.get(field)})
+            product_data.update(value)
+
+            if section == 'offers':
+                report('bank_offers_done', count=len(product_data['bank_offers']))
+            elif section == 'aplus':
+                report('sections_extracted', reused=len(SECTIONS) - 1 - len(updated))
+
+        if previous:
+            self.changes = changes
+            report('changes', fields=sorted(changes))
+        if with_sections:
+            return product_data, updated
         return product_data
 
-    def _get_product_name(self, soup):
+    def _get_product_name(self, page):
         try:
-            return soup.find('span', id='productTitle').text.strip()
-        except:
+            return page.product_name()
+        except Exception:
             return None
 
-    def _get_rating_info(self, soup):
+    def _get_rating_info(self, page):
         try:
-            rating_element = soup.find('span', class_='a-icon-alt')
-            ratings_count_element = soup.find('span', id='acrCustomerReviewText')
-            
-            rating = rating_element.text.split(' out of')[0] if rating_element else None
-            ratings_count = ratings_count_element.text.split(' ratings')[0] if ratings_count_element else None
-            
-            return {
-                'rating': rating,
-                'number_of_ratings': ratings_count
-            }
-        except:
+            return page.rating_info()
+        except Exception:
             return {'rating': None, 'number_of_ratings': None}
 
-    def _get_price_info(self, soup):
+    def _get_price_info(self, page):
         try:
-            # Get the selling price
-            price = soup.find('span', class_='a-price-whole')
-            current_price = None
-            if price:
-                try:
-                    price_text = price.text.strip().replace(',', '')
-                    current_price = float(price_text)
-                except:
-                    current_price = None
-
-            # Get the MRP
-            mrp = None
-            # Try different possible price elements
-            price_elements = [
-                soup.find('span', {'class': 'a-price a-text-price'}),
-                soup.find('span', {'class': 'priceBlockStrikePriceString'}),
-                soup.find('span', {'data-a-strike': 'true'})
-            ]
-            
-            for element in price_elements:
-                if element:
-                    try:
-                        # Try to find the price within a child span
-                        price_span = element.find('span')
-                        if price_span:
-                            mrp_text = price_span.text
-                        else:
-                            mrp_text = element.text
-                            
-                        # Clean up the price text
-                        mrp_text = mrp_text.strip()
-                        # Remove currency symbols and non-numeric characters
-                        mrp_text = re.sub(r'[^\d.,]', '', mrp_text)
-                        # Remove commas
-                        mrp_text = mrp_text.replace(',', '')
-                        
-                        # Convert to float
-                        mrp = float(mrp_text)
-                        print(f"Found MRP: {mrp}")  # Debug print
-                        
-                        # If we successfully got a valid MRP, break the loop
-                        if mrp > 0:
-                            break
-                    except Exception as e:
-                        print(f"Error parsing MRP from element: {e}")
-                        continue
-
-            # Calculate discount percentage
-            discount = None
-            if current_price and mrp and current_price < mrp:
-                discount = ((mrp - current_price) / mrp) * 100
-                # Round to 2 decimal places
-                discount = f"{discount:.2f}%"
-                print(f"Calculated discount: {discount}")  # Debug print
-
-            return {
-                'selling_price': current_price,
-                'mrp': mrp,
-                'discount_percentage': discount
-            }
+            return page.price_info()
         except Exception as e:
             print(f"Error in price info extraction: {e}")
             return {'selling_price': None, 'mrp': None, 'discount_percentage': None}
 
-    def _get_bank_offers(self, soup):
-        # Define bank patterns at the method level so it's available throughout the method
-        bank_patterns = {
-            'HDFC': ['hdfc', 'h.d.f.c'],
-            'SBI': ['sbi', 's.b.i'],
-            'ICICI': ['icici', 'i.c.i.c.i'],
-            'Axis': ['axis']
-        }
-        
+    def _get_bank_offers(self, page, side_panel=None):
         try:
             bank_offers = []
             
-            # First try to find and click the bank offers card
-            try:
-                # Wait for the bank offers section to be present
-                bank_offer_elements = WebDriverWait(self.driver, 10).until(
-                    EC.presence_of_all_elements_located((By.CLASS_NAME, "a-carousel-card"))
-                )
-                
-                # Click on the bank offer card if found
-                for element in bank_offer_elements:
-                    try:
-                        if any(text in element.text for text in ['Bank Offer', 'Credit Card', '₹3,000']):
-                            element.click()
-                            time.sleep(2)  # Wait for side panel to load
-                            break
-                    except:
-                        continue
-                
-                # Get the updated page content after clicking
-                page_content = self.driver.page_source
-                soup = BeautifulSoup(page_content, 'lxml')
-                
-                # Look for offers in the side panel
-                side_panel = soup.find('div', {'id': 'InstantBankDiscount-sideSheet'})
-                if side_panel:
-                    # Find all offer items
-                    offer_items = side_panel.find_all(['div', 'li'], class_=['a-section vsx-offers-desktop-lv_item', 'a-section vsx-offers-desktop-lv__item'])
-                    
-                    if not offer_items:
-                        # Try alternative selectors
-                        offer_items = side_panel.find_all(['div', 'li'], class_=['a-section a-spacing-mini'])
-                    
-                    for item in offer_items:
-                        offer = {}
-                        
-                        # Get the full offer text
-                        offer_text = item.get_text(strip=True)
-                        if not offer_text or len(offer_text) < 10:  # Skip empty or very short texts
-                            continue
-                        
-                        # Store the full offer text first
-                        offer['offer_text'] = offer_text
-                        
-                        # Extract bank name
-                        offer_text_lower = offer_text.lower()
-                        for bank, patterns in bank_patterns.items():
-                            if any(pattern in offer_text_lower for pattern in patterns):
-                                offer['bank_name'] = bank
-                                break
-                    
-                        # Extract discount amount (more precise pattern)
-                        discount_match = re.search(r'(?:Flat|Get|Up to)?\s*(?:INR|Rs\.|₹)?\s*(\d+(?:,\d+)?(?:\.\d{2})?)\s*(?:Instant\s+)?(?:Discount|Cashback)', offer_text, re.IGNORECASE)
-                        if discount_match:
-                            try:
-                                offer['discount_amount'] = float(discount_match.group(1).replace(',', ''))
-                            except ValueError:
-                                print(f"Error converting discount amount: {discount_match.group(1)}")
-                        
-                        # Extract minimum purchase value
-                        min_purchase_match = re.search(r'(?:Min(?:imum)?\s*purchase|Min\s*value)\s*(?:of\s*)?(?:INR|Rs\.|₹)?\s*(\d+(?:,\d+)?(?:\.\d{2})?)', offer_text, re.IGNORECASE)
-                        if min_purchase_match:
-                            try:
-                                offer['min_purchase'] = float(min_purchase_match.group(1).replace(',', ''))
-                            except ValueError:
-                                print(f"Error converting minimum purchase: {min_purchase_match.group(1)}")
-                        
-                        # Check for EMI information
-                        if 'EMI' in offer_text:
-                            offer['emi_available'] = True
-                            emi_duration_match = re.search(r'(\d+)\s*month', offer_text)
-                            if emi_duration_match:
-                                offer['emi_duration'] = int(emi_duration_match.group(1))
-                        else:
-                            offer['emi_available'] = False
-                        
-                        if offer:  # Only add if we found some details
-                            bank_offers.append(offer)
-            
-            except Exception as e:
-                print(f"Error processing bank offers in side panel: {e}")
-                traceback.print_exc()
+            # Look for offers in the side panel
+            if side_panel is not None:
+                try:
+                    bank_offers = parse_offers(side_sheet_offer_texts(side_panel))
+                except Exception as e:
+                    print(f"Error processing bank offers in side panel: {e}")
+                    traceback.print_exc()
             
             # If no offers found in side panel, try to get them from the main page
             if not bank_offers:
                 print("Trying to find bank offers in main content...")
-                # Look for bank offer cards in the main content
-                bank_cards = soup.find_all(['div', 'span'], string=re.compile(r'(?:Bank\s+Offer|Credit\s+Card|₹\s*\d+(?:,\d+)?(?:\.\d{2})?\s*(?:discount|cashback))', re.IGNORECASE))
-                
-                for card in bank_cards:
-                    card_text = card.get_text(strip=True)
-                    if card_text and len(card_text) > 10:  # Skip empty or very short texts
-                        offer = {
-                            'offer_text': card_text,
-                            'source': 'main_page'
-                        }
-                        
-                        # Try to extract basic offer details
-                        for bank, patterns in bank_patterns.items():
-                            if any(pattern in card_text.lower() for pattern in patterns):
-                                offer['bank_name'] = bank
-                                break
-                        
-                        # Try to extract amount
-                        amount_match = re.search(r'(?:INR|Rs\.|₹)?\s*(\d+(?:,\d+)?(?:\.\d{2})?)', card_text)
-                        if amount_match:
-                            try:
-                                offer['discount_amount'] = float(amount_match.group(1).replace(',', ''))
-                            except ValueError:
-                                pass
-                        
-                        bank_offers.append(offer)
+                bank_offers = parse_main_page_offers(page.main_page_offer_texts())
             
             if not bank_offers:
                 print("No bank offers found")
@@ -373,111 +598,29 @@ class AmazonTVScraper:
             traceback.print_exc()
             return []
 
-    def _get_about_this_item(self, soup):
+    def _get_about_this_item(self, page):
         try:
-            about_section = soup.find('div', {'id': 'feature-bullets'})
-            if about_section:
-                items = about_section.find_all('span', class_='a-list-item')
-                return [item.text.strip() for item in items]
-            return []
-        except:
+            return page.about_this_item()
+        except Exception:
             return []
 
-    def _get_product_information(self, soup):
+    def _get_product_information(self, page):
         try:
-            info = {}
-            tech_details = soup.find('table', {'id': 'productDetails_techSpec_section_1'})
-            if tech_details:
-                rows = tech_details.find_all('tr')
-                for row in rows:
-                    label = row.find('th')
-                    value = row.find('td')
-                    if label and value:
-                        info[label.text.strip()] = value.text.strip()
-            return info
-        except:
+            return page.product_information()
+        except Exception:
             return {}
 
-    def _get_product_images(self, soup):
+    def _get_product_images(self, page):
         try:
-            images = []
-            
-            # Find all image thumbnails with the specific class structure
-            thumbnails = soup.find_all('li', {'class': 'a-spacing-small item imageThumbnail a-declarative'})
-            
-            # If not found, try alternative class name
-            if not thumbnails:
-                thumbnails = soup.find_all('li', {'class': 'a-spacing-small'})
-            
-            for thumb in thumbnails:
-                try:
-                    # Find the image element within the thumbnail
-                    img = thumb.find('img')
-                    if img:
-                        # Get the data-old-hires attribute or src
-                        if 'data-old-hires' in img.attrs:
-                            image_url = img['data-old-hires']
-                        elif 'src' in img.attrs:
-                            # Convert thumbnail URL to high resolution
-                            image_url = img['src']
-                            # Remove size specifications to get base URL
-                            base_url = image_url.split('._')[0]
-                            # Add high resolution suffix
-                            image_url = f"{base_url}._SL1500_.jpg"
-                        
-                        # Skip video thumbnails and small icons
-                        if not any(x in image_url.lower() for x in ['video', 'play', 'sprite', 'icon', 'gif']):
-                            if image_url not in images:
-                                images.append(image_url)
-                except Exception as e:
-                    print(f"Error processing thumbnail: {e}")
-                    continue
-            
-            # If no images found in thumbnails, try the main product image
-            if not images:
-                main_image = soup.find('div', {'id': 'imgTagWrapperId'})
-                if main_image:
-                    img = main_image.find('img')
-                    if img and 'src' in img.attrs:
-                        image_url = img['src']
-                        base_url = image_url.split('._')[0]
-                        images.append(f"{base_url}._SL1500_.jpg")
-            
-            # Try another way to find images using data attributes
-            if not images:
-                image_elements = soup.find_all('img', {'data-a-dynamic-image': True})
-                for img in image_elements:
-                    try:
-                        # Parse the JSON data from data-a-dynamic-image attribute
-                        image_data = json.loads(img['data-a-dynamic-image'])
-                        # Get the URL with highest resolution
-                        if image_data:
-                            # Get the first URL from the image data
-                            image_url = list(image_data.keys())[0]
-                            base_url = image_url.split('._')[0]
-                            high_res_url = f"{base_url}._SL1500_.jpg"
-                            if high_res_url not in images:
-                                images.append(high_res_url)
-                    except:
-                        continue
-            
-            return images
-            
+            return page.product_images()
         except Exception as e:
             print(f"Error extracting product images: {e}")
             return []
 
-    def _get_manufacturer_images(self, soup):
+    def _get_manufacturer_images(self, page):
         try:
-            images = []
-            manufacturer_section = soup.find('div', {'id': 'aplus'})
-            if manufacturer_section:
-                image_elements = manufacturer_section.find_all('img')
-                for img in image_elements:
-                    if 'src' in img.attrs:
-                        images.append(img['src'])
-            return list(set(images))  # Remove duplicates
-        except:
+            return page.manufacturer_images()
+        except Exception:
             return []
 
     def _generate_ai_review_summary(self, product_data):
@@ -557,10 +700,134 @@ class AmazonTVScraper:
         with open(filename, 'w', encoding='utf-8') as f:
             json.dump(data, f, indent=4, ensure_ascii=False)
 
+    def is_alive(self):
+        # Cheap round trip to check the browser session still responds
+        if self.driver is None:
+            return True
+        try:
+            self.driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def reset(self):
+        # Drop the previous product page so an idle browser doesn't hold on to it
+        if self.driver is None:
+            return True
+        try:
+            self.driver.get("about:blank")
+            return True
+        except Exception as e:
+            print(f"Error resetting Chrome driver: {e}")
+            return False
+
     def close(self):
-        self.driver.quit()
+        if self.driver is not None:
+            if self.owns_driver:
+                self.driver.quit()
+            self.driver = None
+            self.readiness = None
+        if self.section_store is not None and self.owns_section_store:
+            self.section_store.close()
+            self.section_store = None
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Scrape Amazon India Smart TV product details")
+    subparsers = parser.add_subparsers(dest='command')
+
+    batch_parser = subparsers.add_parser('batch', help="Scrape many product URLs in parallel and write NDJSON")
+    batch_parser.add_argument('urls', nargs='*', help="Product URLs to scrape")
+    batch_parser.add_argument('-f', '--file', help="File with one product URL per line")
+    batch_parser.add_argument('-w', '--workers', type=int, help="Number of worker processes (default: SCRAPER_BATCH_WORKERS or 2, at most SCRAPER_BATCH_MAX_BROWSERS)")
+    batch_parser.add_argument('-o', '--output', help="Write NDJSON here instead of stdout")
+    batch_parser.add_argument('--fetch-mode', choices=FETCH_MODES, help="How each worker fetches pages")
+
+    crawl_parser = subparsers.add_parser('crawl', help="Discover products from search/category pages and scrape them as NDJSON")
+    crawl_parser.add_argument('urls', nargs='+', help="Amazon India search or category URLs to start from")
+    crawl_parser.add_argument('--max-pages', type=int, help="Listing pages followed per start URL (default: SCRAPER_CRAWL_MAX_PAGES or 20)")
+    crawl_parser.add_argument('--queue-size', type=int, help="Discovered URLs buffered ahead of the workers (default: SCRAPER_CRAWL_QUEUE_SIZE or 50)")
+    crawl_parser.add_argument('-w', '--workers', type=int, help="Number of worker processes (default: SCRAPER_BATCH_WORKERS or 2, at most SCRAPER_BATCH_MAX_BROWSERS)")
+    crawl_parser.add_argument('-o', '--output', help="Write NDJSON (or URLs with --urls-only) here instead of stdout")
+    crawl_parser.add_argument('--fetch-mode', choices=FETCH_MODES, help="How each worker fetches product pages")
+    crawl_parser.add_argument('--urls-only', action='store_true', help="Only list the discovered product URLs")
+
+    watch_parser = subparsers.add_parser('watch', help="Keep re-scraping products, more often the more their prices change, and report changes as NDJSON")
+    watch_parser.add_argument('urls', nargs='*', help="Product URLs to watch")
+    watch_parser.add_argument('-f', '--file', help="File with one product URL per line")
+    watch_parser.add_argument('--budget', type=float, help="Scrapes per hour across all products (default: SCRAPER_WATCH_BUDGET or 60)")
+    watch_parser.add_argument('--min-interval', type=float, help="Minimum seconds between scrapes of a product (default: SCRAPER_WATCH_MIN_INTERVAL or 900)")
+    watch_parser.add_argument('--max-interval', type=float, help="Maximum seconds between scrapes of a product (default: SCRAPER_WATCH_MAX_INTERVAL or 86400)")
+    watch_parser.add_argument('-o', '--output', help="Append change events here instead of writing them to stdout")
+    watch_parser.add_argument('--webhook', help="Also POST each change event here as JSON (default: SCRAPER_WATCH_WEBHOOK)")
+    watch_parser.add_argument('--fetch-mode', choices=FETCH_MODES, help="How product pages are fetched")
+    watch_parser.add_argument('--db', help="Snapshot database (default: SCRAPER_SNAPSHOT_DB or snapshots.db)")
+
+    reextract_parser = subparsers.add_parser('reextract', help="Re-run the extractors over archived pages and write NDJSON")
+    reextract_parser.add_argument('--archive', help="Archive directory (default: SCRAPER_ARCHIVE_DIR)")
+    reextract_parser.add_argument('-w', '--workers', type=int, help="Number of worker processes (default: CPU count)")
+    reextract_parser.add_argument('-o', '--output', help="Write NDJSON here instead of stdout")
+    reextract_parser.add_argument('--asin', help="Only re-extract this product")
+    reextract_parser.add_argument('--latest', action='store_true', help="Only the most recent archived page of each product")
+
+    products_parser = subparsers.add_parser('export', help="Stream the latest snapshot of every product as CSV, JSON Lines or Parquet")
+    products_parser.add_argument('-o', '--output', help="File to write (default: stdout)")
+    products_parser.add_argument('--format', choices=('csv', 'jsonl', 'parquet'), help="Output format (default: from the --output extension, else jsonl)")
+    products_parser.add_argument('--all', action='store_true', help="Every snapshot instead of the latest of each product")
+    products_parser.add_argument('--asin', help="Only export this product")
+    products_parser.add_argument('--since', help="Only snapshots from this time on (epoch seconds or ISO 8601)")
+    products_parser.add_argument('--until', help="Only snapshots up to this time (epoch seconds or ISO 8601)")
+    products_parser.add_argument('--db', help="Snapshot database (default: SCRAPER_SNAPSHOT_DB or snapshots.db)")
+
+    # Kept for existing scripts: the same exporter as `export --all --format parquet`
+    export_parser = subparsers.add_parser('export-snapshots', help="Export every stored product snapshot to Parquet (same as export --all --format parquet)")
+    export_parser.add_argument('-o', '--output', required=True, help="Parquet file to write")
+    export_parser.add_argument('--asin', help="Only export this product")
+    export_parser.add_argument('--since', help="Only snapshots from this time on (epoch seconds or ISO 8601)")
+    export_parser.add_argument('--until', help="Only snapshots up to this time (epoch seconds or ISO 8601)")
+    export_parser.add_argument('--db', help="Snapshot database (default: SCRAPER_SNAPSHOT_DB or snapshots.db)")
+    export_parser.set_defaults(all=True, format='parquet')
+
+    worker_parser = subparsers.add_parser('worker', help="Scrape product URLs taken from a shared work queue, alongside workers on other nodes")
+    worker_parser.add_argument('--queue', help="Work queue: sqlite:///path, redis://host:port/db or a file path (default: SCRAPER_WORK_QUEUE)")
+    worker_parser.add_argument('-w', '--workers', type=int, help="Scrapers on this node (default: SCRAPER_QUEUE_WORKERS or 2)")
+    worker_parser.add_argument('--visibility-timeout', type=float, help="Seconds before an unrenewed lease goes back to the queue (default: SCRAPER_QUEUE_VISIBILITY_TIMEOUT or 300)")
+    worker_parser.add_argument('--fetch-mode', choices=FETCH_MODES, help="How product pages are fetched")
+    worker_parser.add_argument('--drain', action='store_true', help="Exit once nothing is queued or running instead of waiting for more work")
+    worker_parser.add_argument('--db', help="Snapshot database (default: SCRAPER_SNAPSHOT_DB or snapshots.db)")
+
+    enqueue_parser = subparsers.add_parser('enqueue', help="Add product URLs to a shared work queue for worker nodes")
+    enqueue_parser.add_argument('urls', nargs='*', help="Product URLs to scrape")
+    enqueue_parser.add_argument('-f', '--file', help="File with one product URL per line")
+    enqueue_parser.add_argument('--queue', help="Work queue: sqlite:///path, redis://host:port/db or a file path (default: SCRAPER_WORK_QUEUE)")
+    enqueue_parser.add_argument('--redrive', action='store_true', help="Also give dead-lettered tasks a fresh set of attempts")
+
+    return parser
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if args.command == 'batch':
+        # Imported here because backend.batch itself imports this module
+        from backend.batch import run_batch_cli
+        return run_batch_cli(args)
+    if args.command == 'crawl':
+        from backend.crawler import run_crawl_cli
+        return run_crawl_cli(args)
+    if args.command == 'watch':
+        from backend.price_watch import run_watch_cli
+        return run_watch_cli(args)
+    if args.command == 'reextract':
+        from backend.page_archive import run_reextract_cli
+        return run_reextract_cli(args)
+    if args.command in ('export', 'export-snapshots'):
+        from backend.export import run_export_cli
+        return run_export_cli(args)
+    if args.command == 'worker':
+        from backend.work_queue import run_worker_cli
+        return run_worker_cli(args)
+    if args.command == 'enqueue':
+        from backend.work_queue import run_enqueue_cli
+        return run_enqueue_cli(args)
 
-def main():
     url = input("Please enter the Amazon India Smart TV product URL: ")
     scraper = AmazonTVScraper()
     
@@ -573,6 +840,11 @@ def main():
             filename = f"tv_details_{timestamp}.json"
             scraper.save_to_json(product_data, filename)
             print(f"Data successfully saved to {filename}")
+
+            from backend.snapshot_store import SnapshotStore
+            snapshot_store = SnapshotStore()
+            snapshot_store.append(product_data, url=url)
+            snapshot_store.close()
         else:
             print("Failed to extract product details")
     
@@ -583,4 +855,4 @@ def main():
         scraper.close()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    sys.exit(main()) 
\ No newline at end of file
@@ -0,0 +1,189 @@
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.util import Finalize
+
+from backend.amazon_scraper import AmazonTVScraper
+from backend.rate_control import FAILED, OK, RateController
+from backend.result_cache import extract_asin
+from backend.snapshot_store import SnapshotStore
+
+SUPPORTED_PREFIXES = ('https://www.amazon.in/', 'http://www.amazon.in/')
+
+# Each worker process keeps one scraper (and browser) for every URL it is handed
+_worker_scraper = None
+
+
+def _init_worker(fetch_mode):
+    global _worker_scraper
+    # Debug prints from the scraper must not end up in NDJSON written to stdout
+    sys.stdout = sys.stderr
+    # Rate control happens in the dispatching process, which sees every worker's blocks
+    _worker_scraper = AmazonTVScraper(fetch_mode=fetch_mode, rate_control=False)
+    # Pool workers leave through os._exit, so atexit hooks would never close Chrome
+    Finalize(None, _worker_scraper.close, exitpriority=10)
+
+
+def _scrape_one(url):
+    try:
+        data = _worker_scraper.extract_product_details(url)
+        if data:
+            result = {'ok': True, 'data': data}
+            # Fields that moved since this product's last scrape, when there was one
+            if _worker_scraper.changes is not None:
+                result['changes'] = _worker_scraper.changes
+            return result
+        if _worker_scraper.block_reason:
+            return {'ok': False, 'error': f'Blocked by Amazon ({_worker_scraper.block_reason})', 'blocked': _worker_scraper.block_reason}
+        return {'ok': False, 'error': 'Failed to extract product details'}
+    except Exception as e:
+        return {'ok': False, 'error': f'Scraping error: {str(e)}'}
+
+
+def validate_url(url):
+    if not url:
+        return 'URL is required'
+    if not url.startswith(SUPPORTED_PREFIXES):
+        return 'Only Amazon India URLs are supported'
+    return None
+
+
+def read_urls(lines):
+    # One URL per line; blank lines and # comments are ignored
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+def max_batch_browsers():
+    # Worker processes each start a Chrome outside the web app's browser pool, so batches have a cap of their own
+    return max(1, int(os.getenv('SCRAPER_BATCH_MAX_BROWSERS', '4')))
+
+
+def batch_worker_count(workers=None):
+    return min(workers or int(os.getenv('SCRAPER_BATCH_WORKERS', '2')), max_batch_browsers())
+
+
+def scrape_batch(urls, workers=None, fetch_mode=None, lookup=None, rate_control=None):
+    # Yields one result dict per URL, in completion order. lookup(url) may return cached
+    # product data so those URLs are answered without going to a worker.
+    workers = batch_worker_count(workers)
+    # URLs go out only as fast as their host allows: the controller's limit halves when Amazon serves
+    # block pages, those URLs are retried after its backoff, and it grows back one slot at a time
+    rate_control = rate_control or RateController(max_concurrency=workers)
+    urls = iter(enumerate(urls))
+    ready = deque()  # items waiting for a slot, retries first
+    attempts = {}
+    pending = {}
+    # Spawned workers don't inherit the web server's threads and locks the way forked ones would
+    context = multiprocessing.get_context('spawn')
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(fetch_mode,)) as executor:
+        exhausted = False
+        while True:
+            # Keep a few URLs ready per worker so hundreds of URLs aren't all held at once
+            while not exhausted and len(ready) < workers:
+                try:
+                    index, url = next(urls)
+                except StopIteration:
+                    exhausted = True
+                    break
+                item = {'index': index, 'url': url, 'asin': extract_asin(url)}
+                error = validate_url(url)
+                if error:
+                    yield dict(item, ok=False, error=error)
+                    continue
+                cached = lookup(url) if lookup else None
+                if cached:
+                    yield dict(item, ok=True, data=cached, cached=True)
+                    continue
+                ready.append(item)
+
+            while ready:
+                ticket = rate_control.try_acquire(ready[0]['url'])
+                if ticket is None:
+                    break
+                item = ready.popleft()
+                attempts[item['index']] = attempts.get(item['index'], 0) + 1
+                try:
+                    pending[executor.submit(_scrape_one, item['url'])] = (item, ticket)
+                except BrokenProcessPool as e:
+                    rate_control.release(ticket, FAILED)
+                    yield dict(item, ok=False, error=f'Worker pool failed: {e}')
+
+            # While the host is backing off, wake up when the backoff ends even if nothing completes
+            timeout = rate_control.wait_time(ready[0]['url']) if ready else None
+            if not pending:
+                if not ready:
+                    if exhausted:
+                        return
+                    continue
+                time.sleep(timeout or 0.1)
+                continue
+
+            done, _ = wait(pending, timeout=timeout or None, return_when=FIRST_COMPLETED)
+            for future in done:
+                item, ticket = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # A crashed worker fails its own item, not the whole batch
+                    result = {'ok': False, 'error': f'Worker failed: {e}'}
+                blocked = result.get('blocked')
+                rate_control.release(ticket, blocked or (OK if result['ok'] else FAILED))
+                if blocked and attempts[item['index']] <= rate_control.retries:
+                    ready.appendleft(item)
+                    continue
+                made = attempts.pop(item['index'])
+                if made > 1:
+                    item['attempts'] = made
+                item.update(result)
+                yield item
+
+
+def run_batch_cli(args):
+    urls = list(args.urls)
+    if args.file:
+        with open(args.file, 'r', encoding='utf-8') as f:
+            urls.extend(read_urls(f))
+    if not urls:
+        print("No URLs given", file=sys.stderr)
+        return 1
+
+    workers = batch_worker_count(args.workers)
+    rate_control = RateController(max_concurrency=workers)
+    total, failures = write_batch_results(
+        scrape_batch(urls, workers=workers, fetch_mode=args.fetch_mode, rate_control=rate_control), args.output)
+    print(f"Scraped {total - failures} of {total} products", file=sys.stderr)
+    for host, stats in rate_control.stats().items():
+        print(f"{host}: {stats['rate_per_hour']:g} products/hour sustained, {stats['blocked']} block pages, "
+              f"ended at {stats['limit']} concurrent fetches", file=sys.stderr)
+    return 0 if failures == 0 else 2
+
+
+def write_batch_results(items, output_path=None):
+    # Writes items as NDJSON (to stdout without a path), records snapshots and returns (total, failures)
+    output = open(output_path, 'w', encoding='utf-8') if output_path else sys.stdout
+    snapshot_store = SnapshotStore()
+    total = failures = 0
+    try:
+        for item in items:
+            total += 1
+            if item['ok']:
+                snapshot_store.append(item['data'], url=item['url'], asin=item['asin'])
+            else:
+                failures += 1
+            output.write(json.dumps(item, ensure_ascii=False) + '\n')
+            output.flush()
+    finally:
+        snapshot_store.close()
+        if output is not sys.stdout:
+            output.close()
+    return total, failures
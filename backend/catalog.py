@@ -0,0 +1,131 @@
+import operator
+import os
+import re
+import threading
+import time
+
+from backend.normalize import COLUMNS, normalize_product, normalize_text
+from backend.snapshot_store import format_time
+
+TEXT_COLUMNS = ('asin', 'url', 'product_name', 'brand')
+# Typed columns plus the ones derived from them for ranking
+NUMERIC_COLUMNS = ('scraped_at',) + tuple(COLUMNS) + ('price_per_inch',)
+CATALOG_COLUMNS = TEXT_COLUMNS + NUMERIC_COLUMNS
+# Counts and pixel dimensions are kept as (nullable) integers rather than floats
+INTEGER_COLUMNS = tuple(column for column, unit in COLUMNS.items() if unit in ('count', 'pixels'))
+
+FILTER_RE = re.compile(r'^\s*([a-z_]+)\s*(<=|>=|!=|=|<|>)\s*(.*?)\s*$')
+OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '=': operator.eq,
+    '!=': operator.ne,
+}
+MAX_LIMIT = 1000
+
+
+def parse_filter(expression):
+    # "selling_price<40000" -> ('selling_price', '<', 40000.0); text columns only compare with = and !=
+    match = FILTER_RE.match(expression)
+    if not match:
+        raise ValueError(f"Invalid filter: {expression}")
+    column, op, value = match.groups()
+    if column in NUMERIC_COLUMNS:
+        try:
+            return column, op, float(value)
+        except ValueError:
+            raise ValueError(f"Filter on {column} needs a number: {expression}")
+    if column in TEXT_COLUMNS:
+        if op not in ('=', '!='):
+            raise ValueError(f"Filter on {column} only supports = and !=: {expression}")
+        return column, op, value.lower()
+    raise ValueError(f"Unknown column: {column}")
+
+
+class Catalog:
+    # Latest snapshot of every product as typed columns in one DataFrame, so filters and sorts run as
+    # vectorized column operations instead of loops over JSON dicts
+    def __init__(self, store, refresh_interval=None):
+        self.store = store
+        # New snapshots are folded in at most this often, and only when a query comes in
+        self.refresh_interval = refresh_interval if refresh_interval is not None else float(os.getenv('SCRAPER_CATALOG_REFRESH', '5'))
+        self._frame = None
+        self._last_id = 0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def frame(self):
+        with self._lock:
+            if self._frame is None or time.monotonic() - self._checked_at >= self.refresh_interval:
+                self._refresh()
+                self._checked_at = time.monotonic()
+            return self._frame
+
+    def _refresh(self):
+        # pandas is only loaded once the catalog is first queried
+        import pandas as pd
+
+        rows = self.store.latest_products(after_id=self._last_id)
+        if self._frame is None:
+            self._frame = pd.DataFrame({column: pd.Series(dtype=self._dtype(column)) for column in CATALOG_COLUMNS})
+        if not rows:
+            return
+
+        records = []
+        for row_id, asin, url, scraped_at, data in rows:
+            record = normalize_product(data)
+            record.update(normalize_text(data), asin=asin, url=url, scraped_at=scraped_at)
+            records.append(record)
+            self._last_id = max(self._last_id, row_id)
+        updates = pd.DataFrame.from_records(records)
+        updates['price_per_inch'] = updates['selling_price'] / updates['screen_inches']
+        updates = updates.reindex(columns=CATALOG_COLUMNS)
+        updates = updates.astype({column: self._dtype(column) for column in NUMERIC_COLUMNS})
+
+        # A product scraped again replaces its old row
+        kept = self._frame[~self._frame['asin'].isin(updates['asin'])]
+        self._frame = updates if kept.empty else pd.concat([kept, updates], ignore_index=True)
+
+    @staticmethod
+    def _dtype(column):
+        if column in TEXT_COLUMNS:
+            return object
+        return 'Int64' if column in INTEGER_COLUMNS else 'float64'
+
+    def query(self, filters=(), text=None, sort=(), limit=50, offset=0, columns=None):
+        import numpy as np
+
+        limit = max(0, min(int(limit), MAX_LIMIT))
+        offset = max(0, int(offset))
+        parsed = [parse_filter(expression) for expression in filters]
+        sort_keys = [(key[1:], False) if key.startswith('-') else (key, True) for key in sort]
+        for key, _ in sort_keys:
+            if key not in CATALOG_COLUMNS:
+                raise ValueError(f"Unknown sort column: {key}")
+        columns = list(columns) if columns else list(CATALOG_COLUMNS)
+        unknown = [column for column in columns if column not in CATALOG_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown column: {', '.join(unknown)}")
+
+        frame = self.frame()
+        mask = np.ones(len(frame), dtype=bool)
+        for column, op, value in parsed:
+            values = frame[column].str.lower() if column in TEXT_COLUMNS else frame[column]
+            # Missing values never match, whatever the operator
+            mask &= (OPERATORS[op](values, value) & values.notna()).to_numpy(dtype=bool, na_value=False)
+        if text:
+            mask &= frame['product_name'].str.contains(text, case=False, regex=False, na=False).to_numpy()
+
+        result = frame[mask]
+        if sort_keys:
+            result = result.sort_values([key for key, _ in sort_keys], ascending=[ascending for _, ascending in sort_keys],
+                                        na_position='last', kind='mergesort')
+        page = result.iloc[offset:offset + limit][columns]
+
+        products = page.astype(object).where(page.notna(), None).to_dict('records')
+        for product in products:
+            if product.get('scraped_at') is not None:
+                product['scraped_at'] = format_time(product['scraped_at'])
+        return {'total': int(len(result)), 'count': len(products), 'offset': offset, 'products': products}
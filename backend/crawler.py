@@ -0,0 +1,137 @@
+import os
+import queue
+import re
+import sys
+import threading
+from urllib.parse import urljoin, urlparse
+
+from lxml import etree
+
+from backend.amazon_scraper import get_http_session
+from backend.batch import scrape_batch, validate_url, write_batch_results
+from backend.extraction import parse_page
+
+ASIN_VALUE_RE = re.compile(r'^[A-Z0-9]{10}$')
+
+# Organic results and sponsored slots both carry data-asin; empty values are layout placeholders
+_RESULTS = etree.XPath("//div[@data-asin != '' and (@data-component-type = 's-search-result' or @data-index)]")
+_NEXT_PAGE = etree.XPath(
+    "//a[contains(concat(' ', normalize-space(@class), ' '), ' s-pagination-next ')]/@href"
+    " | //li[contains(concat(' ', normalize-space(@class), ' '), ' a-last ')]/a/@href"
+)
+
+_END_OF_LISTING = object()
+
+
+def parse_listing(page_content, page_url):
+    # Returns ([(asin, product url)], next page url or None) for a search or category page
+    root = parse_page(page_content)
+    parsed = urlparse(page_url)
+    products = []
+    for result in _RESULTS(root):
+        asin = result.get('data-asin').strip().upper()
+        # Result links carry tracking parameters, so products are addressed by their canonical /dp/<ASIN> URL
+        if ASIN_VALUE_RE.match(asin):
+            products.append((asin, f"{parsed.scheme}://{parsed.netloc}/dp/{asin}"))
+
+    next_links = _NEXT_PAGE(root)
+    return products, urljoin(page_url, next_links[0]) if next_links else None
+
+
+def fetch_listing(url):
+    response = get_http_session().get(url, timeout=30)
+    response.raise_for_status()
+    if 'charset' not in response.headers.get('Content-Type', '').lower():
+        response.encoding = 'utf-8'
+    return response.text
+
+
+def discover_products(start_urls, max_pages=None, seen=None):
+    # Walks the pagination of every start URL and yields (asin, url) once per ASIN
+    max_pages = max_pages or int(os.getenv('SCRAPER_CRAWL_MAX_PAGES', '20'))
+    seen = set() if seen is None else seen
+    for start_url in start_urls:
+        page_url = start_url
+        visited = set()
+        while page_url and page_url not in visited and len(visited) < max_pages:
+            visited.add(page_url)
+            try:
+                products, page_url = parse_listing(fetch_listing(page_url), page_url)
+            except Exception as e:
+                print(f"Error crawling listing page {page_url}: {e}", file=sys.stderr)
+                break
+            for asin, url in products:
+                if asin not in seen:
+                    seen.add(asin)
+                    yield asin, url
+
+
+def crawl(start_urls, max_pages=None, queue_size=None, workers=None, fetch_mode=None, lookup=None, batch=None):
+    # Discovery runs in a producer thread and fills a bounded queue that the batch workers drain,
+    # so the first products are being scraped while later listing pages are still being fetched
+    # batch(urls, lookup=...) scrapes them, in a local process pool unless another runner (a work queue) is given
+    queue_size = queue_size or int(os.getenv('SCRAPER_CRAWL_QUEUE_SIZE', '50'))
+    discovered = queue.Queue(maxsize=queue_size)
+    stopped = threading.Event()
+
+    def produce():
+        try:
+            for _, url in discover_products(start_urls, max_pages=max_pages):
+                # A full queue holds discovery back until the workers catch up
+                while not stopped.is_set():
+                    try:
+                        discovered.put(url, timeout=1)
+                        break
+                    except queue.Full:
+                        continue
+                if stopped.is_set():
+                    return
+        finally:
+            while not stopped.is_set():
+                try:
+                    discovered.put(_END_OF_LISTING, timeout=1)
+                    return
+                except queue.Full:
+                    continue
+
+    def consume():
+        while True:
+            url = discovered.get()
+            if url is _END_OF_LISTING:
+                return
+            yield url
+
+    producer = threading.Thread(target=produce, name='listing-crawler', daemon=True)
+    producer.start()
+    try:
+        if batch is None:
+            yield from scrape_batch(consume(), workers=workers, fetch_mode=fetch_mode, lookup=lookup)
+        else:
+            yield from batch(consume(), lookup=lookup)
+    finally:
+        stopped.set()
+
+
+def run_crawl_cli(args):
+    for url in args.urls:
+        error = validate_url(url)
+        if error:
+            print(f"{url}: {error}", file=sys.stderr)
+            return 1
+
+    if args.urls_only:
+        output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+        try:
+            for _, url in discover_products(args.urls, max_pages=args.max_pages):
+                output.write(url + '\n')
+                output.flush()
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        return 0
+
+    items = crawl(args.urls, max_pages=args.max_pages, queue_size=args.queue_size,
+                  workers=args.workers, fetch_mode=args.fetch_mode)
+    total, failures = write_batch_results(items, args.output)
+    print(f"Discovered and scraped {total - failures} of {total} products", file=sys.stderr)
+    return 0 if failures == 0 else 2
@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from selenium.common.exceptions import WebDriverException
+
+from backend.amazon_scraper import AmazonTVScraper
+from backend.metrics import REGISTRY
+
+
+class PoolExhaustedError(Exception):
+    pass
+
+
+class _PooledScraper:
+    def __init__(self, scraper):
+        self.scraper = scraper
+        self.pages = 0
+        self.created_at = time.time()
+
+
+class DriverPool:
+    def __init__(self, size=None, max_pages=None, checkout_timeout=None, section_store=None):
+        # Pool size caps the number of Chrome instances this process will ever run at once
+        self.size = size or int(os.getenv('SCRAPER_POOL_SIZE', '2'))
+        # Browsers leak memory over long sessions, so recycle them after a number of pages
+        self.max_pages = max_pages or int(os.getenv('SCRAPER_POOL_MAX_PAGES', '50'))
+        if checkout_timeout is None:
+            checkout_timeout = float(os.getenv('SCRAPER_POOL_CHECKOUT_TIMEOUT', '60'))
+        self.checkout_timeout = checkout_timeout
+        # Shared by every pooled scraper for section fingerprints instead of each opening its own connection
+        self.section_store = section_store
+
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._idle = []  # LIFO so the most recently used (warmest) browser is reused first
+        self._closed = False
+        self._stats = {'launched': 0, 'recycled': 0, 'discarded': 0, 'checkouts': 0}
+
+    def _launch(self):
+        scraper = AmazonTVScraper(section_store=self.section_store).start()
+        with self._lock:
+            self._stats['launched'] += 1
+        return _PooledScraper(scraper)
+
+    def _discard(self, entry, reason):
+        with self._lock:
+            self._stats[reason] += 1
+        try:
+            entry.scraper.close()
+        except Exception as e:
+            print(f"Error closing pooled Chrome driver: {e}")
+
+    def warm(self, count=None):
+        # Pre-launch browsers so the first requests don't pay Chrome startup
+        count = min(count or self.size, self.size)
+        while True:
+            with self._lock:
+                if self._closed or len(self._idle) >= count:
+                    return
+            if not self._slots.acquire(blocking=False):
+                return
+            try:
+                entry = self._launch()
+                with self._lock:
+                    self._idle.append(entry)
+            finally:
+                self._slots.release()
+
+    def _checkout(self):
+        if self._closed:
+            raise PoolExhaustedError("Driver pool is closed")
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise PoolExhaustedError("No browser available, try again later")
+
+        try:
+            while True:
+                with self._lock:
+                    entry = self._idle.pop() if self._idle else None
+                    self._stats['checkouts'] += 1
+                if entry is None:
+                    return self._launch()
+                if entry.scraper.is_alive():
+                    return entry
+                print("Discarding crashed Chrome driver from pool")
+                self._discard(entry, 'discarded')
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _checkin(self, entry, broken):
+        try:
+            if broken or not entry.scraper.reset():
+                self._discard(entry, 'discarded')
+            elif entry.pages >= self.max_pages:
+                self._discard(entry, 'recycled')
+            else:
+                with self._lock:
+                    if not self._closed:
+                        self._idle.append(entry)
+                        return
+                self._discard(entry, 'recycled')
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def scraper(self):
+        start = time.perf_counter()
+        entry = self._checkout()
+        REGISTRY.observe('scraper_stage_duration_seconds', time.perf_counter() - start, stage='driver_checkout')
+        broken = False
+        try:
+            yield entry.scraper
+        except WebDriverException:
+            broken = True
+            raise
+        finally:
+            entry.pages += 1
+            self._checkin(entry, broken)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+        stats['size'] = self.size
+        stats['max_pages'] = self.max_pages
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for entry in idle:
+            try:
+                entry.scraper.close()
+            except Exception:
+                pass
@@ -0,0 +1,268 @@
+import csv
+import io
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+from backend.normalize import clean_text, parse_number
+from backend.snapshot_store import SnapshotStore, format_time, parse_time
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+# Product fields exported as they are, with the Parquet type of each
+PRODUCT_COLUMNS = {
+    'asin': 'string',
+    'url': 'string',
+    'scraped_at': 'timestamp',
+    'product_name': 'string',
+    'rating': 'string',
+    'number_of_ratings': 'string',
+    'selling_price': 'float',
+    'mrp': 'float',
+    'discount_percentage': 'string',
+    'about_this_item': 'list',
+    'product_images': 'list',
+    'manufacturer_images': 'list',
+    'ai_review_summary': 'string',
+}
+# Every bank offer becomes bank_offers.<n>.<field> columns, numbered from 1
+OFFER_COLUMNS = {
+    'offer_text': 'string',
+    'bank_name': 'string',
+    'discount_amount': 'float',
+    'min_purchase': 'float',
+    'emi_available': 'bool',
+    'emi_duration': 'int',
+    'source': 'string',
+}
+INFO_PREFIX = 'product_information.'
+
+# Rows per CSV/JSON Lines chunk and per Parquet row group
+CHUNK_ROWS = int(os.getenv('SCRAPER_EXPORT_CHUNK_ROWS', '1000'))
+
+
+def export_columns(info_keys, max_offers):
+    # {column: type} in export order. Columns come from the whole export (see SnapshotStore.export_layout),
+    # not from each product, so every row and every file of the same data has the same ones.
+    columns = dict(PRODUCT_COLUMNS)
+    columns['bank_offer_count'] = 'int'
+    for number in range(1, max_offers + 1):
+        for field, kind in OFFER_COLUMNS.items():
+            columns[f'bank_offers.{number}.{field}'] = kind
+    for key in info_keys:
+        columns[INFO_PREFIX + key] = 'string'
+    return columns
+
+
+def _coerce(value, kind):
+    if value is None:
+        return None
+    if kind == 'float':
+        return parse_number(value)
+    if kind == 'int':
+        number = parse_number(value)
+        return int(number) if number is not None else None
+    if kind == 'bool':
+        return bool(value)
+    if kind == 'list':
+        return [str(item) for item in value] if isinstance(value, list) else [str(value)]
+    if kind == 'timestamp':
+        return value
+    return clean_text(value)
+
+
+def flatten_product(asin, url, scraped_at, data, columns):
+    # One flat row for a snapshot, with a value (or None) for exactly the given columns
+    offers = [offer for offer in data.get('bank_offers') or [] if isinstance(offer, dict)]
+    info = data.get('product_information') or {}
+    row = {}
+    for column, kind in columns.items():
+        if column == 'asin':
+            value = asin
+        elif column == 'url':
+            value = url
+        elif column == 'scraped_at':
+            value = scraped_at
+        elif column == 'bank_offer_count':
+            value = len(offers)
+        elif column.startswith('bank_offers.'):
+            _, number, field = column.split('.', 2)
+            index = int(number) - 1
+            value = offers[index].get(field) if index < len(offers) else None
+        elif column.startswith(INFO_PREFIX):
+            value = info.get(column[len(INFO_PREFIX):])
+        else:
+            value = data.get(column)
+        row[column] = _coerce(value, kind)
+    return row
+
+
+def _text_row(row):
+    # CSV and JSON Lines carry times as ISO 8601 strings
+    if row.get('scraped_at') is not None:
+        row['scraped_at'] = format_time(row['scraped_at'])
+    return row
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _csv_stream(rows, columns, chunk_rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for chunk in _chunks(rows, chunk_rows):
+        for row in chunk:
+            _text_row(row)
+            # Lists have no CSV form, so they are written as JSON arrays
+            writer.writerow([json.dumps(row[column], ensure_ascii=False) if columns[column] == 'list' and row[column] is not None
+                             else row[column] for column in columns])
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _jsonl_stream(rows, columns, chunk_rows):
+    for chunk in _chunks(rows, chunk_rows):
+        yield ''.join(json.dumps(_text_row(row), ensure_ascii=False) + '\n' for row in chunk).encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    # Write-only file the Parquet writer writes into; whatever it has written so far is taken out as a chunk
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _parquet_schema(columns):
+    import pyarrow as pa
+
+    types = {
+        'string': pa.string(),
+        'float': pa.float64(),
+        'int': pa.int64(),
+        'bool': pa.bool_(),
+        'list': pa.list_(pa.string()),
+        'timestamp': pa.timestamp('ms', tz='UTC'),
+    }
+    return pa.schema([(column, types[kind]) for column, kind in columns.items()])
+
+
+def _parquet_stream(rows, columns, chunk_rows):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema(columns)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        # Each chunk becomes one row group, flushed out before the next is built
+        for chunk in _chunks(rows, chunk_rows):
+            for row in chunk:
+                if row['scraped_at'] is not None:
+                    row['scraped_at'] = datetime.fromtimestamp(row['scraped_at'], timezone.utc)
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+            data = sink.take()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+STREAMS = {
+    'csv': _csv_stream,
+    'jsonl': _jsonl_stream,
+    'parquet': _parquet_stream,
+}
+
+
+def export_products(store, fmt, latest=True, asin=None, since=None, until=None, chunk_rows=None):
+    # Returns a generator of encoded chunks of the products in store. Snapshots are read and flattened one
+    # batch at a time, so memory stays flat however large the export is. Bad arguments raise ValueError
+    # here, before the first chunk is produced.
+    if fmt not in STREAMS:
+        raise ValueError(f"Unknown export format: {fmt} (expected one of {', '.join(STREAMS)})")
+    if fmt == 'parquet':
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            raise ValueError("Parquet export requires pyarrow")
+    chunk_rows = max(1, chunk_rows or CHUNK_ROWS)
+
+    max_id, info_keys, max_offers = store.export_layout(latest=latest, asin=asin, since=since, until=until)
+    columns = export_columns(info_keys, max_offers)
+    snapshots = store.iter_snapshots(max_id, latest=latest, asin=asin, since=since, until=until, batch_size=chunk_rows)
+    rows = (flatten_product(*snapshot, columns) for snapshot in snapshots)
+    return _closing(STREAMS[fmt](rows, columns, chunk_rows), snapshots)
+
+
+def _closing(chunks, snapshots):
+    # Closes the snapshot reader, and with it its SQLite connection, as soon as the stream ends or is abandoned
+    try:
+        yield from chunks
+    finally:
+        chunks.close()
+        snapshots.close()
+
+
+def export_format_for(path):
+    # The format named by an output file's extension, or None
+    extension = os.path.splitext(path or '')[1].lower().lstrip('.')
+    return {'ndjson': 'jsonl', 'json': 'jsonl'}.get(extension, extension if extension in STREAMS else None)
+
+
+def run_export_cli(args):
+    fmt = args.format or export_format_for(args.output) or 'jsonl'
+    store = SnapshotStore(args.db)
+    written = 0
+    try:
+        chunks = export_products(store, fmt, latest=not args.all, asin=args.asin,
+                                 since=parse_time(args.since), until=parse_time(args.until))
+        output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+            output.flush()
+        finally:
+            if args.output:
+                output.close()
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        store.close()
+    print(f"Exported {written / 1024:.0f} KB of {fmt} to {args.output or 'stdout'}", file=sys.stderr)
+    return 0
@@ -0,0 +1,318 @@
+import hashlib
+import json
+import re
+
+from lxml import etree
+
+# Comments and processing instructions are never read by the extractors, so don't build nodes for them
+HTML_PARSER = etree.HTMLParser(remove_comments=True, remove_pis=True, no_network=True)
+
+# Inline scripts and styles make up most of an Amazon product page; drop them before parsing
+_NOISE_RE = re.compile(r'<(script|style)\b[^>]*>.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+
+# id() lookups go through libxml2's id hash table instead of walking the document
+_BY_ID = etree.XPath('id($element_id)')
+_DESCENDANT_SPANS = etree.XPath('.//span')
+_DESCENDANT_IMGS = etree.XPath('.//img')
+_DESCENDANT_ROWS = etree.XPath('.//tr')
+_FEATURE_BULLETS = etree.XPath(".//span[contains(concat(' ', normalize-space(@class), ' '), ' a-list-item ')]")
+_SIDE_SHEET_ITEMS = etree.XPath('.//div | .//li')
+
+SECTION_IDS = {
+    'product_title': 'productTitle',
+    'ratings_count': 'acrCustomerReviewText',
+    'feature_bullets': 'feature-bullets',
+    'tech_specs': 'productDetails_techSpec_section_1',
+    'main_image': 'imgTagWrapperId',
+    'aplus': 'aplus',
+    'bank_offer_sheet': 'InstantBankDiscount-sideSheet',
+}
+
+THUMBNAIL_CLASS = 'a-spacing-small item imageThumbnail a-declarative'
+OFFER_ITEM_CLASSES = ('a-section vsx-offers-desktop-lv_item', 'a-section vsx-offers-desktop-lv__item')
+OFFER_ITEM_FALLBACK_CLASS = 'a-section a-spacing-mini'
+SKIPPED_IMAGE_MARKERS = ('video', 'play', 'sprite', 'icon', 'gif')
+
+MAIN_PAGE_OFFER_RE = re.compile(r'(?:Bank\s+Offer|Credit\s+Card|₹\s*\d+(?:,\d+)?(?:\.\d{2})?\s*(?:discount|cashback))', re.IGNORECASE)
+_PRICE_CHARS_RE = re.compile(r'[^\d.,]')
+
+# Part of every section fingerprint; bump it when an extractor changes so values stored by the old one are re-extracted
+FINGERPRINT_VERSION = b'2'
+
+
+def parse_page(page_content):
+    page_content = _NOISE_RE.sub('', page_content)
+    try:
+        root = etree.fromstring(page_content, HTML_PARSER)
+    except ValueError:
+        # lxml refuses str input that carries an XML encoding declaration
+        root = etree.fromstring(page_content.encode('utf-8'), HTML_PARSER)
+    if root is None:
+        raise ValueError("Page content could not be parsed")
+    return root
+
+
+def text_of(element):
+    return ''.join(element.itertext())
+
+
+def stripped_text_of(element):
+    # Same as BeautifulSoup's get_text(strip=True)
+    return ''.join(text.strip() for text in element.itertext())
+
+
+def _class_string(element):
+    value = element.get('class')
+    return ' '.join(value.split()) if value else ''
+
+
+def _single_string(element):
+    # Mirrors BeautifulSoup's .string: follow single-child chains down to one text node
+    while True:
+        if len(element) == 0:
+            return element.text
+        if len(element) == 1 and not element.text and not element[0].tail:
+            element = element[0]
+            continue
+        return None
+
+
+def fingerprint(*elements):
+    # Digest of the markup an extractor reads; a missing element hashes differently from an empty one
+    digest = hashlib.sha256(FINGERPRINT_VERSION)
+    for element in elements:
+        if element is None:
+            digest.update(b'\0')
+        else:
+            digest.update(etree.tostring(element, encoding='utf-8', method='html', with_tail=False))
+        digest.update(b'\1')
+    return digest.hexdigest()
+
+
+def to_high_res(image_url):
+    base_url = image_url.split('._')[0]
+    return f"{base_url}._SL1500_.jpg"
+
+
+class ProductPage:
+    def __init__(self, page_content):
+        self.root = parse_page(page_content)
+        self._index_document()
+
+    def _index_document(self):
+        # Walk the document once and remember every element a class- or attribute-based extractor needs;
+        # id-based sections are looked up through the id hash table instead
+        self.rating_element = None
+        self.price_element = None
+        self.mrp_candidates = [None, None, None]
+        self.thumbnails = []
+        self.loose_thumbnails = []
+        self.dynamic_images = []
+        self.offer_cards = []
+
+        for element in self.root.iter('span', 'div', 'li', 'img'):
+            tag = element.tag
+            if tag == 'img':
+                if element.get('data-a-dynamic-image') is not None:
+                    self.dynamic_images.append(element)
+                continue
+
+            class_string = _class_string(element)
+            if tag == 'li':
+                if class_string == THUMBNAIL_CLASS:
+                    self.thumbnails.append(element)
+                if 'a-spacing-small' in class_string.split():
+                    self.loose_thumbnails.append(element)
+                continue
+
+            if tag == 'span':
+                classes = class_string.split()
+                if self.rating_element is None and 'a-icon-alt' in classes:
+                    self.rating_element = element
+                if self.price_element is None and 'a-price-whole' in classes:
+                    self.price_element = element
+                if self.mrp_candidates[0] is None and class_string == 'a-price a-text-price':
+                    self.mrp_candidates[0] = element
+                if self.mrp_candidates[1] is None and 'priceBlockStrikePriceString' in classes:
+                    self.mrp_candidates[1] = element
+                if self.mrp_candidates[2] is None and element.get('data-a-strike') == 'true':
+                    self.mrp_candidates[2] = element
+
+            string = _single_string(element)
+            if string and MAIN_PAGE_OFFER_RE.search(string):
+                self.offer_cards.append(element)
+
+    def fingerprints(self, side_panel=None):
+        # One digest per group of fields, taken over exactly the elements that group's extractor reads
+        return {
+            'title': fingerprint(self.section('product_title')),
+            'rating': fingerprint(self.rating_element, self.section('ratings_count')),
+            'price': fingerprint(self.price_element, *self.mrp_candidates),
+            'offers': fingerprint(side_panel, *self.offer_cards),
+            'feature_bullets': fingerprint(self.section('feature_bullets')),
+            'tech_specs': fingerprint(self.section('tech_specs')),
+            'images': fingerprint(*(self.thumbnails or self.loose_thumbnails), self.section('main_image'), *self.dynamic_images),
+            'aplus': fingerprint(self.section('aplus')),
+        }
+
+    def section(self, name):
+        found = _BY_ID(self.root, element_id=SECTION_IDS[name])
+        return found[0] if found else None
+
+    def product_name(self):
+        title = self.section('product_title')
+        if title is None or title.tag != 'span':
+            return None
+        return text_of(title).strip()
+
+    def rating_info(self):
+        ratings_count_element = self.section('ratings_count')
+        if ratings_count_element is not None and ratings_count_element.tag != 'span':
+            ratings_count_element = None
+
+        rating = text_of(self.rating_element).split(' out of')[0] if self.rating_element is not None else None
+        ratings_count = text_of(ratings_count_element).split(' ratings')[0] if ratings_count_element is not None else None
+
+        return {
+            'rating': rating,
+            'number_of_ratings': ratings_count
+        }
+
+    def price_info(self):
+        # Get the selling price
+        current_price = None
+        if self.price_element is not None:
+            try:
+                current_price = float(text_of(self.price_element).strip().replace(',', ''))
+            except ValueError:
+                current_price = None
+
+        # Get the MRP from the first price element that parses to a positive number
+        mrp = None
+        for element in self.mrp_candidates:
+            if element is None:
+                continue
+            try:
+                # Try to find the price within a child span
+                price_spans = _DESCENDANT_SPANS(element)
+                mrp_text = text_of(price_spans[0]) if price_spans else text_of(element)
+                # Remove currency symbols, non-numeric characters and commas
+                mrp_text = _PRICE_CHARS_RE.sub('', mrp_text.strip()).replace(',', '')
+                mrp = float(mrp_text)
+                print(f"Found MRP: {mrp}")  # Debug print
+
+                if mrp > 0:
+                    break
+            except Exception as e:
+                print(f"Error parsing MRP from element: {e}")
+                continue
+
+        # Calculate discount percentage
+        discount = None
+        if current_price and mrp and current_price < mrp:
+            discount = ((mrp - current_price) / mrp) * 100
+            # Round to 2 decimal places
+            discount = f"{discount:.2f}%"
+            print(f"Calculated discount: {discount}")  # Debug print
+
+        return {
+            'selling_price': current_price,
+            'mrp': mrp,
+            'discount_percentage': discount
+        }
+
+    def about_this_item(self):
+        about_section = self.section('feature_bullets')
+        if about_section is None or about_section.tag != 'div':
+            return []
+        return [text_of(item).strip() for item in _FEATURE_BULLETS(about_section)]
+
+    def product_information(self):
+        info = {}
+        tech_details = self.section('tech_specs')
+        if tech_details is None or tech_details.tag != 'table':
+            return info
+        for row in _DESCENDANT_ROWS(tech_details):
+            label = row.find('.//th')
+            value = row.find('.//td')
+            if label is not None and value is not None:
+                info[text_of(label).strip()] = text_of(value).strip()
+        return info
+
+    def product_images(self):
+        images = []
+
+        # Thumbnails with the exact class structure, otherwise any small-spaced list item
+        for thumb in self.thumbnails or self.loose_thumbnails:
+            img = thumb.find('.//img')
+            if img is None:
+                continue
+            if img.get('data-old-hires') is not None:
+                image_url = img.get('data-old-hires')
+            elif img.get('src') is not None:
+                # Convert thumbnail URL to high resolution
+                image_url = to_high_res(img.get('src'))
+            else:
+                continue
+
+            # Skip video thumbnails and small icons
+            if not any(marker in image_url.lower() for marker in SKIPPED_IMAGE_MARKERS):
+                if image_url not in images:
+                    images.append(image_url)
+
+        # If no images found in thumbnails, try the main product image
+        if not images:
+            main_image = self.section('main_image')
+            if main_image is not None and main_image.tag == 'div':
+                img = main_image.find('.//img')
+                if img is not None and img.get('src') is not None:
+                    images.append(to_high_res(img.get('src')))
+
+        # Try another way to find images using data attributes
+        if not images:
+            for img in self.dynamic_images:
+                try:
+                    image_data = json.loads(img.get('data-a-dynamic-image'))
+                    if image_data:
+                        high_res_url = to_high_res(next(iter(image_data)))
+                        if high_res_url not in images:
+                            images.append(high_res_url)
+                except (ValueError, TypeError, AttributeError):
+                    continue
+
+        return images
+
+    def manufacturer_images(self):
+        manufacturer_section = self.section('aplus')
+        if manufacturer_section is None or manufacturer_section.tag != 'div':
+            return []
+        images = [img.get('src') for img in _DESCENDANT_IMGS(manufacturer_section) if img.get('src') is not None]
+        return list(dict.fromkeys(images))  # Remove duplicates, keep page order
+
+    def bank_offer_sheet(self):
+        side_panel = self.section('bank_offer_sheet')
+        if side_panel is None or side_panel.tag != 'div':
+            return None
+        return side_panel
+
+    def main_page_offer_texts(self):
+        return [stripped_text_of(card) for card in self.offer_cards]
+
+
+def fragment_section(fragment_html, name):
+    # Parses an outerHTML fragment pulled from the live page and returns the named section in it
+    found = _BY_ID(parse_page(fragment_html), element_id=SECTION_IDS[name])
+    return found[0] if found else None
+
+
+def section_html(element):
+    return etree.tostring(element, encoding='unicode', method='html')
+
+
+def side_sheet_offer_texts(side_panel):
+    items = _SIDE_SHEET_ITEMS(side_panel)
+    offer_items = [item for item in items if _class_string(item) in OFFER_ITEM_CLASSES]
+    if not offer_items:
+        # Try alternative selectors
+        offer_items = [item for item in items if _class_string(item) == OFFER_ITEM_FALLBACK_CLASS]
+    return [stripped_text_of(item) for item in offer_items]
@@ -0,0 +1,261 @@
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from backend.amazon_scraper import get_http_session
+
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+WEBP_QUALITY = 80
+
+
+def _variant_name(sha, size):
+    return f"{sha}_{size}.webp"
+
+
+def _make_variants(data, sha, sizes, directory):
+    # Runs in a worker process: decoding and resizing 1500px JPEGs is CPU bound
+    from PIL import Image
+
+    written = 0
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+        for size in sizes:
+            variant = image.copy()
+            variant.thumbnail((size, size), Image.LANCZOS)
+            path = os.path.join(directory, _variant_name(sha, size))
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            variant.save(tmp_path, 'WEBP', quality=WEBP_QUALITY, method=4)
+            os.replace(tmp_path, path)
+            written += os.path.getsize(path)
+    return written
+
+
+class ImagePipeline:
+    def __init__(self, cache_dir=None, max_bytes=None, sizes=None, download_workers=None, process_workers=None):
+        self.cache_dir = cache_dir or os.getenv('SCRAPER_IMAGE_DIR', 'image_cache')
+        self.max_bytes = max_bytes or int(float(os.getenv('SCRAPER_IMAGE_CACHE_MB', '500')) * 1024 * 1024)
+        self.sizes = tuple(sorted(sizes or (int(size) for size in os.getenv('SCRAPER_IMAGE_SIZES', '300,800').split(','))))
+        self.download_workers = download_workers or int(os.getenv('SCRAPER_IMAGE_DOWNLOAD_WORKERS', '8'))
+        self.process_workers = process_workers or int(os.getenv('SCRAPER_IMAGE_PROCESSES', '2'))
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # URL -> content hash, so a URL seen before is not downloaded again while its variants are cached
+        self._index = sqlite3.connect(os.path.join(self.cache_dir, 'index.db'), check_same_thread=False, timeout=30)
+        self._index.execute('CREATE TABLE IF NOT EXISTS image_urls (url TEXT PRIMARY KEY, sha256 TEXT NOT NULL)')
+        # Thumbnail paths are keyed by the SHA-256 of the image URL, so they are known before the image is fetched
+        self._index.execute('CREATE TABLE IF NOT EXISTS image_keys (key TEXT PRIMARY KEY, url TEXT NOT NULL)')
+        self._downloads = None
+        self._processes = None
+        self._warming = None
+        self._inflight = {}  # url -> Future of the process() call generating its variants
+        self._bytes = self._disk_usage()
+        self._stats = {'downloads': 0, 'url_hits': 0, 'content_hits': 0, 'generated': 0, 'failed': 0, 'evicted': 0}
+
+    def _executors(self):
+        with self._lock:
+            if self._downloads is None:
+                self._downloads = ThreadPoolExecutor(max_workers=self.download_workers, thread_name_prefix='image-fetch')
+                # Spawned like the batch workers so they don't inherit the web server's threads
+                self._processes = ProcessPoolExecutor(max_workers=self.process_workers,
+                                                      mp_context=multiprocessing.get_context('spawn'))
+                # Runs process() for products whose thumbnail paths were handed out before the variants existed
+                self._warming = ThreadPoolExecutor(max_workers=1, thread_name_prefix='image-warm')
+            return self._downloads, self._processes
+
+    def _variant_path(self, sha, size):
+        return os.path.join(self.cache_dir, _variant_name(sha, size))
+
+    def _has_variants(self, sha):
+        return all(os.path.exists(self._variant_path(sha, size)) for size in self.sizes)
+
+    def _variant_files(self):
+        return [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith('.webp')]
+
+    def _disk_usage(self):
+        try:
+            return sum(entry.stat().st_size for entry in self._variant_files())
+        except OSError:
+            return 0
+
+    def _prune(self):
+        # Least recently served variants go first; serving an image refreshes its mtime
+        try:
+            files = sorted(((entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in self._variant_files()))
+            total = sum(size for _, size, _ in files)
+            evicted = 0
+            for _, size, path in files:
+                if total <= self.max_bytes:
+                    break
+                os.remove(path)
+                total -= size
+                evicted += 1
+        except OSError as e:
+            print(f"Error pruning image cache: {e}")
+            return
+        with self._lock:
+            self._bytes = total
+            self._stats['evicted'] += evicted
+
+    def thumbnails(self, key):
+        return {str(size): f"/images/{key}/{size}.webp" for size in self.sizes}
+
+    @staticmethod
+    def image_key(url):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def thumbnail_paths(self, urls):
+        # Returns {url: {'key': ..., 'thumbnails': {size: path}}} straight away and generates the variants in
+        # the background; a variant requested before it is ready is generated on that request instead
+        urls = list(dict.fromkeys(url for url in urls if url))
+        if not urls:
+            return {}
+        keys = {url: self.image_key(url) for url in urls}
+        with self._lock, self._index:
+            self._index.executemany("INSERT OR IGNORE INTO image_keys (key, url) VALUES (?, ?)",
+                                    [(key, url) for url, key in keys.items()])
+        self._executors()
+        with self._lock:
+            warming = self._warming
+        if warming is not None:
+            warming.submit(self._generate, urls)
+        return {url: {'key': key, 'thumbnails': self.thumbnails(key)} for url, key in keys.items()}
+
+    def _generate(self, urls):
+        # process() for the urls nobody is generating yet, then waits for the ones that are
+        future = Future()
+        with self._lock:
+            mine = [url for url in urls if url not in self._inflight]
+            waiting = {self._inflight[url] for url in urls if url not in mine}
+            for url in mine:
+                self._inflight[url] = future
+        try:
+            if mine:
+                self.process(mine)
+        except Exception as e:
+            print(f"Error generating thumbnails: {e}")
+        finally:
+            with self._lock:
+                for url in mine:
+                    self._inflight.pop(url, None)
+            future.set_result(None)
+        for other in waiting:
+            other.result()
+
+    def _content_hash(self, key):
+        # (image url, content hash or None) for a thumbnail key, or (None, None) for an unknown key
+        with self._lock:
+            row = self._index.execute("SELECT k.url, u.sha256 FROM image_keys k LEFT JOIN image_urls u ON u.url = k.url "
+                                      "WHERE k.key = ?", (key,)).fetchone()
+        return row if row else (None, None)
+
+    def _cached_hashes(self, urls):
+        placeholders = ','.join('?' * len(urls))
+        with self._lock:
+            rows = self._index.execute(f"SELECT url, sha256 FROM image_urls WHERE url IN ({placeholders})", urls).fetchall()
+        return {url: sha for url, sha in rows if self._has_variants(sha)}
+
+    def _download(self, url):
+        response = get_http_session().get(url, timeout=20)
+        response.raise_for_status()
+        data = response.content
+        return data, hashlib.sha256(data).hexdigest()
+
+    def process(self, urls):
+        # Returns {url: {'sha256': ..., 'thumbnails': {size: path}}} for every image that could be fetched
+        urls = list(dict.fromkeys(url for url in urls if url))
+        if not urls:
+            return {}
+        hashes = self._cached_hashes(urls)
+        with self._lock:
+            self._stats['url_hits'] += len(hashes)
+
+        missing = [url for url in urls if url not in hashes]
+        if missing:
+            downloads, processes = self._executors()
+            generating = {}  # sha -> future, so identical images in one call are only resized once
+            fetched = {}
+            for url, future in [(url, downloads.submit(self._download, url)) for url in missing]:
+                try:
+                    data, sha = future.result()
+                except Exception as e:
+                    print(f"Error downloading image {url}: {e}")
+                    with self._lock:
+                        self._stats['failed'] += 1
+                    continue
+                with self._lock:
+                    self._stats['downloads'] += 1
+                fetched[url] = sha
+                if sha in generating or self._has_variants(sha):
+                    with self._lock:
+                        self._stats['content_hits'] += 1
+                    continue
+                generating[sha] = processes.submit(_make_variants, data, sha, self.sizes, self.cache_dir)
+
+            written = 0
+            for sha, future in generating.items():
+                try:
+                    written += future.result()
+                    with self._lock:
+                        self._stats['generated'] += 1
+                except Exception as e:
+                    print(f"Error generating thumbnails for {sha}: {e}")
+                    fetched = {url: value for url, value in fetched.items() if value != sha}
+
+            if fetched:
+                with self._lock, self._index:
+                    self._index.executemany("INSERT OR REPLACE INTO image_urls (url, sha256) VALUES (?, ?)", fetched.items())
+            hashes.update(fetched)
+            with self._lock:
+                self._bytes += written
+                over_budget = self._bytes > self.max_bytes
+            if over_budget:
+                self._prune()
+
+        return {url: {'sha256': hashes[url], 'thumbnails': self.thumbnails(hashes[url])} for url in urls if url in hashes}
+
+    def path_for(self, key, size):
+        # Path of a variant, generated now if the background pass hasn't got to it (or it was evicted), or None.
+        # key comes straight from the request URL so it is validated.
+        if not SHA256_RE.match(key) or size not in self.sizes:
+            return None
+        url, sha = self._content_hash(key)
+        if url is None:
+            # Paths handed out before thumbnails were keyed by URL name the content hash itself
+            sha = key
+        elif sha is None or not self._has_variants(sha):
+            self._generate([url])
+            _, sha = self._content_hash(key)
+            if sha is None:
+                return None
+        path = self._variant_path(sha, size)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['bytes'] = self._bytes
+        stats['max_bytes'] = self.max_bytes
+        return stats
+
+    def close(self):
+        with self._lock:
+            downloads, processes, warming = self._downloads, self._processes, self._warming
+            self._downloads = self._processes = self._warming = None
+        if downloads is not None:
+            warming.shutdown(wait=False, cancel_futures=True)
+            downloads.shutdown(wait=False, cancel_futures=True)
+            processes.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            self._index.close()
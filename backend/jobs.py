@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+FINISHED_STATUSES = ('done', 'failed')
+
+
+class Job:
+    def __init__(self, url):
+        self.id = uuid.uuid4().hex
+        self.url = url
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.events = []
+        self._condition = threading.Condition()
+        self._add_event('queued')
+
+    def _add_event(self, stage, **details):
+        # Callers hold self._condition, except the constructor
+        self.updated_at = time.time()
+        self.events.append(dict(details, stage=stage, at=self.updated_at))
+
+    def report(self, stage, **details):
+        with self._condition:
+            if self.status == 'queued':
+                self.status = 'running'
+            self._add_event(stage, **details)
+            self._condition.notify_all()
+
+    def finish(self, result=None, error=None):
+        with self._condition:
+            self.result = result
+            self.error = error
+            self.status = 'failed' if error else 'done'
+            if error:
+                self._add_event(self.status, error=error)
+            else:
+                self._add_event(self.status)
+            self._condition.notify_all()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATUSES
+
+    def wait_for_events(self, cursor, timeout):
+        # Blocks until there are events past cursor, the job finishes or the timeout passes
+        with self._condition:
+            if len(self.events) <= cursor and not self.finished:
+                self._condition.wait(timeout)
+            return self.events[cursor:], self.finished
+
+    def to_dict(self, include_result=True):
+        with self._condition:
+            data = {
+                'job_id': self.id,
+                'url': self.url,
+                'status': self.status,
+                'stage': self.events[-1]['stage'],
+                'events': list(self.events),
+                'created_at': self.created_at,
+                'updated_at': self.updated_at,
+            }
+            if self.error:
+                data['error'] = self.error
+            if include_result and self.status == 'done':
+                data['result'] = self.result
+            return data
+
+
+class JobManager:
+    def __init__(self, max_workers=None, job_ttl=None):
+        self.max_workers = max_workers or int(os.getenv('SCRAPER_JOB_WORKERS', '2'))
+        # Finished jobs are kept this many seconds for clients that poll late
+        self.job_ttl = job_ttl if job_ttl is not None else float(os.getenv('SCRAPER_JOB_TTL', '3600'))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='scrape-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, url, work):
+        # work(url, report) runs on the executor and returns the product data (or None on failure)
+        job = Job(url)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, work)
+        return job
+
+    def _run(self, job, work):
+        job.report('started')
+        try:
+            result = work(job.url, job.report)
+            if result:
+                job.finish(result=result)
+            else:
+                job.finish(error='Failed to extract product details')
+        except Exception as e:
+            job.finish(error=f'Scraping error: {str(e)}')
+
+    def _prune(self):
+        cutoff = time.time() - self.job_ttl
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished and job.updated_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        stats = {status: 0 for status in ('queued', 'running', 'done', 'failed')}
+        for job in jobs:
+            stats[job.status] += 1
+        stats['workers'] = self.max_workers
+        return stats
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,130 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Stage durations range from sub-millisecond extractors to page loads of tens of seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"')) for key, value in labels)
+    return '{' + pairs + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # name -> (help, buckets, {labels: Histogram})
+        self._counters = {}  # name -> (help, {labels: value})
+        self._gauges = {}  # name -> (help, callback returning {labels: value})
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        with self._lock:
+            self._histograms.setdefault(name, (help_text, buckets, {}))
+
+    def counter(self, name, help_text):
+        with self._lock:
+            self._counters.setdefault(name, (help_text, {}))
+
+    def gauge(self, name, help_text, callback):
+        # callback() returns {label tuple: value}; it is only called when metrics are rendered
+        with self._lock:
+            self._gauges[name] = (help_text, callback)
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            _, buckets, series = self._histograms[name]
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def increment(self, name, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters[name][1]
+            series[key] = series.get(key, 0) + amount
+
+    def render(self):
+        # Prometheus text exposition format
+        lines = []
+        with self._lock:
+            for name, (help_text, buckets, series) in sorted(self._histograms.items()):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in sorted(series.items()):
+                    for bound, count in zip(buckets, histogram.counts):
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+            for name, (help_text, series) in sorted(self._counters.items()):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            gauges = sorted(self._gauges.items())
+
+        for name, (help_text, callback) in gauges:
+            try:
+                series = callback()
+            except Exception as e:
+                print(f"Error collecting metric {name}: {e}")
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in sorted(series.items()):
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+REGISTRY.histogram('scraper_stage_duration_seconds', 'Time spent in each scrape stage')
+REGISTRY.counter('scraper_scrapes_total', 'Product scrapes by outcome')
+
+
+class StageTimings:
+    # Per-scrape stage durations, also fed into the process-wide histograms
+    def __init__(self, registry=REGISTRY):
+        self.registry = registry
+        self.durations = {}
+
+    def reset(self):
+        self.durations = {}
+
+    def record(self, stage, seconds):
+        self.durations[stage] = self.durations.get(stage, 0.0) + seconds
+        self.registry.observe('scraper_stage_duration_seconds', seconds, stage=stage)
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def as_dict(self):
+        return {stage: round(seconds, 4) for stage, seconds in self.durations.items()}
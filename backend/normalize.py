@@ -0,0 +1,127 @@
+import re
+
+# Typed columns produced for every product, in catalog order, with the unit each is in
+COLUMNS = {
+    'rating': 'stars',
+    'number_of_ratings': 'count',
+    'selling_price': 'rupees',
+    'mrp': 'rupees',
+    'discount_percent': 'percent',
+    'screen_inches': 'inches',
+    'resolution_width': 'pixels',
+    'resolution_height': 'pixels',
+    'refresh_hz': 'hertz',
+    'speaker_watts': 'watts',
+    'bank_offer_count': 'count',
+    'max_bank_discount': 'rupees',
+}
+
+# product_information keys the columns are read from; listings word some of them differently
+SCREEN_SIZE_KEYS = ('Standing screen display size', 'Screen Size', 'Display Size')
+RESOLUTION_KEYS = ('Resolution', 'Display Resolution')
+REFRESH_RATE_KEYS = ('Refresh Rate',)
+BRAND_KEYS = ('Brand',)
+SPEAKER_POWER_KEYS = ('Speakers Maximum Output Power', 'Audio Output', 'Speaker Output Power')
+
+# Marketing names Amazon uses instead of pixel counts
+NAMED_RESOLUTIONS = (
+    (re.compile(r'\b(?:8k|4320p)\b', re.IGNORECASE), (7680, 4320)),
+    (re.compile(r'\b(?:4k|uhd|ultra\s*hd|2160p)\b', re.IGNORECASE), (3840, 2160)),
+    (re.compile(r'\b(?:full\s*hd|fhd|1080p)\b', re.IGNORECASE), (1920, 1080)),
+    (re.compile(r'\b(?:hd\s*ready|720p|hd)\b', re.IGNORECASE), (1366, 768)),
+)
+
+NUMBER_RE = re.compile(r'\d+(?:\.\d+)?')
+PIXELS_RE = re.compile(r'(\d{3,5})\s*[x×*]\s*(\d{3,5})', re.IGNORECASE)
+INCHES_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(?:inch(?:es)?|in\b|"|″)', re.IGNORECASE)
+CENTIMETRES_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(?:cm|centimet(?:er|re)s?)\b', re.IGNORECASE)
+# Amazon prefixes every product_information value with a left-to-right mark (U+200E), sometimes a right-to-left one
+DIRECTION_MARKS = '\u200e\u200f'
+
+
+def clean_text(value):
+    # Text without the direction marks and surrounding whitespace, or None when nothing is left
+    if value is None:
+        return None
+    text = str(value)
+    for mark in DIRECTION_MARKS:
+        text = text.replace(mark, '')
+    return text.strip() or None
+
+
+def parse_number(value):
+    # First number in value as a float: "3,062 ratings" -> 3062.0, "12.34%" -> 12.34, "4.7 out of 5" -> 4.7
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = NUMBER_RE.search(str(value).replace(',', ''))
+    return float(match.group()) if match else None
+
+
+def parse_inches(value):
+    # "55 Inches" -> 55.0; "139 Centimetres" -> 54.7; a bare number is taken to be inches
+    if not value:
+        return None
+    text = str(value).replace(',', '')
+    match = INCHES_RE.search(text)
+    if match:
+        return float(match.group(1))
+    match = CENTIMETRES_RE.search(text)
+    if match:
+        return round(float(match.group(1)) / 2.54, 1)
+    return parse_number(text)
+
+
+def parse_resolution(value):
+    # (width, height) in pixels from "3840 x 2160", "4K", "Full HD" and the like
+    if not value:
+        return None, None
+    match = PIXELS_RE.search(str(value))
+    if match:
+        width, height = int(match.group(1)), int(match.group(2))
+        return max(width, height), min(width, height)
+    for pattern, pixels in NAMED_RESOLUTIONS:
+        if pattern.search(str(value)):
+            return pixels
+    return None, None
+
+
+def _spec(info, keys):
+    for key in keys:
+        value = clean_text(info.get(key))
+        if value:
+            return value
+    return None
+
+
+def normalize_text(data):
+    # The text columns of a scraped product, cleaned so they compare equal to what users type
+    info = data.get('product_information') or {}
+    return {
+        'product_name': clean_text(data.get('product_name')),
+        'brand': _spec(info, BRAND_KEYS),
+    }
+
+
+def normalize_product(data):
+    # Typed view of a scraped product, one value per COLUMNS entry (None when the page didn't say)
+    info = data.get('product_information') or {}
+    width, height = parse_resolution(_spec(info, RESOLUTION_KEYS))
+    offers = data.get('bank_offers') or []
+    discounts = [offer['discount_amount'] for offer in offers if isinstance(offer.get('discount_amount'), (int, float))]
+    number_of_ratings = parse_number(data.get('number_of_ratings'))
+    return {
+        'rating': parse_number(data.get('rating')),
+        'number_of_ratings': int(number_of_ratings) if number_of_ratings is not None else None,
+        'selling_price': parse_number(data.get('selling_price')),
+        'mrp': parse_number(data.get('mrp')),
+        'discount_percent': parse_number(data.get('discount_percentage')),
+        'screen_inches': parse_inches(_spec(info, SCREEN_SIZE_KEYS)),
+        'resolution_width': width,
+        'resolution_height': height,
+        'refresh_hz': parse_number(_spec(info, REFRESH_RATE_KEYS)),
+        'speaker_watts': parse_number(_spec(info, SPEAKER_POWER_KEYS)),
+        'bank_offer_count': len(offers),
+        'max_bank_discount': max(discounts) if discounts else None,
+    }
@@ -0,0 +1,126 @@
+import os
+import re
+from functools import lru_cache
+
+# Banks in priority order: when an offer names several, the first one listed here wins. The first four
+# match as plain substrings, as they always have; the others need word boundaries to avoid false hits.
+BANK_PATTERNS = (
+    ('HDFC', r'hdfc|h\.d\.f\.c'),
+    ('SBI', r'sbi|s\.b\.i'),
+    ('ICICI', r'icici|i\.c\.i\.c\.i'),
+    ('Axis', r'axis'),
+    ('Kotak', r'\bkotak\b'),
+    ('IDFC FIRST', r'\bidfc\b'),
+    ('IndusInd', r'\bindusind\b'),
+    ('Yes Bank', r'\byes\s+bank\b'),
+    ('RBL', r'\brbl\b'),
+    ('AU', r'\bau\s+(?:small\s+finance\s+)?bank\b'),
+    ('Federal', r'\bfederal\s+bank\b'),
+    ('Bank of Baroda', r'\bbank\s+of\s+baroda\b|\bbob\s*card\b|\bbob\b'),
+    ('HSBC', r'\bhsbc\b'),
+    ('Standard Chartered', r'\bstandard\s+chartered\b'),
+    ('Citi', r'\bciti(?:bank)?\b'),
+    ('American Express', r'\bamerican\s+express\b|\bamex\b'),
+    ('OneCard', r'\bone\s*card\b'),
+    ('Canara', r'\bcanara\b'),
+    ('PNB', r'\bpnb\b|\bpunjab\s+national\b'),
+    ('Union Bank', r'\bunion\s+bank\b'),
+    ('DBS', r'\bdbs\b'),
+    ('J&K Bank', r'\bj\s*&\s*k\s+bank\b'),
+)
+BANK_NAMES = tuple(bank for bank, _ in BANK_PATTERNS)
+
+# Every bank in one alternation, one named group per bank, so a single scan finds all of them
+_BANKS_RE = re.compile('|'.join(f'(?P<bank{index}>{pattern})' for index, (_, pattern) in enumerate(BANK_PATTERNS)))
+
+_DISCOUNT_RE = re.compile(r'(?:Flat|Get|Up to)?\s*(?:INR|Rs\.|₹)?\s*(\d+(?:,\d+)?(?:\.\d{2})?)\s*(?:Instant\s+)?(?:Discount|Cashback)', re.IGNORECASE)
+_MIN_PURCHASE_RE = re.compile(r'(?:Min(?:imum)?\s*purchase|Min\s*value)\s*(?:of\s*)?(?:INR|Rs\.|₹)?\s*(\d+(?:,\d+)?(?:\.\d{2})?)', re.IGNORECASE)
+_EMI_DURATION_RE = re.compile(r'(\d+)\s*month')
+_AMOUNT_RE = re.compile(r'(?:INR|Rs\.|₹)?\s*(\d+(?:,\d+)?(?:\.\d{2})?)')
+
+# Side sheet rows shorter than this are layout, not offers; main page cards must be longer
+MIN_OFFER_LENGTH = 10
+
+# The same offer texts repeat across thousands of products, so parsed results are memoized by normalized text
+CACHE_SIZE = int(os.getenv('SCRAPER_OFFER_CACHE_SIZE', '4096'))
+
+
+def normalize_offer_text(text):
+    return ' '.join(text.split())
+
+
+def find_bank(text):
+    # The highest priority bank named anywhere in text, or None
+    lowered = text.lower()
+    best = None
+    for match in _BANKS_RE.finditer(lowered):
+        index = int(match.lastgroup[len('bank'):])
+        if best is None or index < best:
+            best = index
+            if best == 0:
+                break
+    return BANK_NAMES[best] if best is not None else None
+
+
+def _amount(match):
+    return float(match.group(1).replace(',', ''))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse_side_sheet_offer(text):
+    # Returns the parsed fields as a tuple of pairs so cached results can't be mutated by callers
+    fields = []
+    bank = find_bank(text)
+    if bank:
+        fields.append(('bank_name', bank))
+    discount_match = _DISCOUNT_RE.search(text)
+    if discount_match:
+        fields.append(('discount_amount', _amount(discount_match)))
+    min_purchase_match = _MIN_PURCHASE_RE.search(text)
+    if min_purchase_match:
+        fields.append(('min_purchase', _amount(min_purchase_match)))
+    if 'EMI' in text:
+        fields.append(('emi_available', True))
+        emi_duration_match = _EMI_DURATION_RE.search(text)
+        if emi_duration_match:
+            fields.append(('emi_duration', int(emi_duration_match.group(1))))
+    else:
+        fields.append(('emi_available', False))
+    return tuple(fields)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse_main_page_offer(text):
+    fields = [('source', 'main_page')]
+    bank = find_bank(text)
+    if bank:
+        fields.append(('bank_name', bank))
+    amount_match = _AMOUNT_RE.search(text)
+    if amount_match:
+        fields.append(('discount_amount', _amount(amount_match)))
+    return tuple(fields)
+
+
+def parse_offer(text):
+    # A side sheet offer row: bank, discount, minimum purchase and EMI details, alongside the original text
+    return dict((('offer_text', text),) + _parse_side_sheet_offer(normalize_offer_text(text)))
+
+
+def parse_offers(texts):
+    # Parses a whole side sheet at once, skipping rows too short to be offers
+    return [parse_offer(text) for text in texts if text and len(text) >= MIN_OFFER_LENGTH]
+
+
+def parse_main_page_offers(texts):
+    # Offer cards on the product page itself carry less detail: just a bank and the first amount
+    return [dict((('offer_text', text),) + _parse_main_page_offer(normalize_offer_text(text)))
+            for text in texts if text and len(text) > MIN_OFFER_LENGTH]
+
+
+def cache_stats():
+    stats = {}
+    for name, parser in (('side_sheet', _parse_side_sheet_offer), ('main_page', _parse_main_page_offer)):
+        info = parser.cache_info()
+        stats.update({f'{name}_hits': info.hits, f'{name}_misses': info.misses, f'{name}_entries': info.currsize})
+    stats['max_entries'] = CACHE_SIZE
+    return stats
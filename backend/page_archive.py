@@ -0,0 +1,216 @@
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from multiprocessing import Pool
+
+from backend.result_cache import extract_asin
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    side_sheet_sha256 TEXT,
+    url TEXT,
+    asin TEXT,
+    fetch_mode TEXT,
+    fetched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_asin_time ON pages (asin, fetched_at);
+CREATE INDEX IF NOT EXISTS pages_sha ON pages (sha256);
+"""
+
+COMPRESSIONS = ('gzip', 'zstd')
+EXTENSIONS = {'gzip': '.html.gz', 'zstd': '.html.zst'}
+
+
+def _zstd():
+    # zstandard is optional; archives fall back to gzip without it
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def _compress(data, compression):
+    if compression == 'zstd':
+        return _zstd().ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _decompress(data, compression):
+    if compression == 'zstd':
+        zstandard = _zstd()
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read .zst archive entries")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class PageArchive:
+    def __init__(self, archive_dir, compression=None):
+        self.archive_dir = archive_dir
+        compression = compression or os.getenv('SCRAPER_ARCHIVE_COMPRESSION') or ('zstd' if _zstd() else 'gzip')
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown archive compression: {compression}")
+        if compression == 'zstd' and _zstd() is None:
+            print("zstandard is not installed, archiving pages with gzip")
+            compression = 'gzip'
+        self.compression = compression
+        os.makedirs(os.path.join(archive_dir, 'pages'), exist_ok=True)
+        self._lock = threading.Lock()
+        # Batch workers in other processes append to the same index, hence WAL and a long busy timeout
+        self._index = sqlite3.connect(os.path.join(archive_dir, 'index.db'), check_same_thread=False, timeout=60)
+        self._index.execute('PRAGMA journal_mode=WAL')
+        self._index.executescript(SCHEMA)
+
+    @classmethod
+    def from_env(cls):
+        # Archiving is off unless SCRAPER_ARCHIVE_DIR is set
+        archive_dir = os.getenv('SCRAPER_ARCHIVE_DIR')
+        return cls(archive_dir) if archive_dir else None
+
+    def _blob_path(self, sha, compression):
+        return os.path.join(self.archive_dir, 'pages', sha[:2], sha + EXTENSIONS[compression])
+
+    def _find_blob(self, sha):
+        for compression in COMPRESSIONS:
+            path = self._blob_path(sha, compression)
+            if os.path.exists(path):
+                return path, compression
+        return None, None
+
+    def put_blob(self, content):
+        # Content addressed: the same page HTML is stored once however often it is fetched
+        data = content.encode('utf-8')
+        sha = hashlib.sha256(data).hexdigest()
+        if self._find_blob(sha)[0] is None:
+            path = self._blob_path(sha, self.compression)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(_compress(data, self.compression))
+            os.replace(tmp_path, path)
+        return sha
+
+    def read_blob(self, sha):
+        path, compression = self._find_blob(sha)
+        if path is None:
+            raise FileNotFoundError(f"Archived page {sha} not found")
+        with open(path, 'rb') as f:
+            return _decompress(f.read(), compression).decode('utf-8')
+
+    def store(self, url, page_content, fetch_mode=None, side_sheet_html=None):
+        try:
+            sha = self.put_blob(page_content)
+            side_sheet_sha = self.put_blob(side_sheet_html) if side_sheet_html else None
+            with self._lock, self._index:
+                self._index.execute(
+                    "INSERT INTO pages (sha256, side_sheet_sha256, url, asin, fetch_mode, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (sha, side_sheet_sha, url, extract_asin(url) if url else None, fetch_mode, time.time()),
+                )
+            return sha
+        except (OSError, sqlite3.Error) as e:
+            print(f"Error archiving page {url}: {e}")
+            return None
+
+    def entries(self, asin=None, latest=False):
+        # Archived fetches oldest first; latest keeps only the most recent fetch of each product
+        # With MAX() SQLite takes the other (bare) columns from the row holding the maximum
+        fetched_at = "MAX(fetched_at)" if latest else "fetched_at"
+        query = f"SELECT sha256, side_sheet_sha256, url, asin, fetch_mode, {fetched_at} AS fetched_at FROM pages"
+        params = []
+        if asin:
+            query += " WHERE asin = ?"
+            params.append(asin.upper())
+        if latest:
+            query += " GROUP BY COALESCE(asin, url)"
+        query += " ORDER BY fetched_at"
+        columns = ('sha256', 'side_sheet_sha256', 'url', 'asin', 'fetch_mode', 'fetched_at')
+        with self._lock:
+            rows = self._index.execute(query, params).fetchall()
+        return [dict(zip(columns, row)) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._index.close()
+
+
+# Each re-extraction worker keeps one HTTP-mode scraper (it never starts a browser) and an archive reader
+_worker_scraper = None
+_worker_archive = None
+
+
+def _init_reextract_worker(archive_dir):
+    global _worker_scraper, _worker_archive
+    from backend.amazon_scraper import AmazonTVScraper
+
+    # Extractor debug prints must not end up in NDJSON written to stdout
+    sys.stdout = sys.stderr
+    _worker_scraper = AmazonTVScraper(fetch_mode='http', archive=False, incremental=False)
+    _worker_archive = PageArchive(archive_dir)
+
+
+def _reextract_one(entry):
+    item = dict(entry)
+    try:
+        page_content = _worker_archive.read_blob(entry['sha256'])
+        side_sheet_html = _worker_archive.read_blob(entry['side_sheet_sha256']) if entry['side_sheet_sha256'] else None
+        data = _worker_scraper.extract_from_html(page_content, side_sheet_html)
+        if data:
+            item.update(ok=True, data=data)
+        else:
+            item.update(ok=False, error='Failed to extract product details')
+    except Exception as e:
+        item.update(ok=False, error=f'Re-extraction error: {str(e)}')
+    return item
+
+
+def reextract(archive_dir, entries, workers=None):
+    # Yields one result per archive entry, in completion order
+    workers = workers or os.cpu_count()
+    with Pool(processes=workers, initializer=_init_reextract_worker, initargs=(archive_dir,)) as pool:
+        yield from pool.imap_unordered(_reextract_one, entries, chunksize=8)
+
+
+def run_reextract_cli(args):
+    archive_dir = args.archive or os.getenv('SCRAPER_ARCHIVE_DIR')
+    if not archive_dir:
+        print("No archive given (use --archive or SCRAPER_ARCHIVE_DIR)", file=sys.stderr)
+        return 1
+    archive = PageArchive(archive_dir)
+    try:
+        entries = archive.entries(asin=args.asin, latest=args.latest)
+    finally:
+        archive.close()
+    if not entries:
+        print("Archive is empty", file=sys.stderr)
+        return 1
+
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    start = time.perf_counter()
+    failures = 0
+    lines = []
+    try:
+        for item in reextract(archive_dir, entries, workers=args.workers):
+            if not item['ok']:
+                failures += 1
+            lines.append(json.dumps(item, ensure_ascii=False))
+            # Written in chunks rather than one small write per page
+            if len(lines) >= 500:
+                output.write('\n'.join(lines) + '\n')
+                lines = []
+        if lines:
+            output.write('\n'.join(lines) + '\n')
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Re-extracted {len(entries) - failures} of {len(entries)} pages in {elapsed:.1f}s", file=sys.stderr)
+    return 0 if failures == 0 else 2
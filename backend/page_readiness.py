@@ -0,0 +1,145 @@
+import time
+
+# Sections the extractors read from a rendered product page, with per-section timeouts in seconds
+PRODUCT_SECTIONS = {
+    'about_this_item': ('#feature-bullets', 5),
+    'product_information': ('#productDetails_techSpec_section_1', 5),
+    'manufacturer_images': ('#aplus', 8),
+}
+
+# Offer rows only show up in the side sheet after the carousel card has been clicked
+BANK_OFFER_SECTIONS = {
+    'bank_offers': (
+        '#InstantBankDiscount-sideSheet .vsx-offers-desktop-lv__item, '
+        '#InstantBankDiscount-sideSheet .vsx-offers-desktop-lv_item, '
+        '#InstantBankDiscount-sideSheet .a-spacing-mini',
+        5,
+    ),
+}
+
+# Resolves as soon as every selector matches or its own timeout runs out. A MutationObserver
+# re-checks on every DOM change and a short interval keeps lazy-loaded sections coming in by
+# scrolling to the (growing) bottom of the page while anything is still missing.
+WAIT_FOR_SECTIONS_JS = """
+var sections = arguments[0];
+var scroll = arguments[1];
+var done = arguments[arguments.length - 1];
+var start = performance.now();
+var results = {};
+var pending = sections.length;
+var finished = false;
+var observer = null;
+var timer = null;
+
+function check() {
+    if (finished) return;
+    var elapsed = performance.now() - start;
+    sections.forEach(function (section) {
+        if (results[section[0]]) return;
+        if (document.querySelector(section[1])) {
+            results[section[0]] = {found: true, ms: elapsed};
+            pending--;
+        } else if (elapsed >= section[2]) {
+            results[section[0]] = {found: false, ms: elapsed};
+            pending--;
+        }
+    });
+    if (pending <= 0) {
+        finished = true;
+        if (observer) observer.disconnect();
+        clearInterval(timer);
+        done(results);
+    } else if (scroll) {
+        window.scrollTo(0, document.body.scrollHeight);
+    }
+}
+
+timer = setInterval(check, 100);
+observer = new MutationObserver(check);
+observer.observe(document.documentElement, {childList: true, subtree: true});
+check();
+"""
+
+
+# Non-blocking variant for browsers shared between tabs: starts the same wait and leaves its
+# results on the window, where check_section_wait picks them up with short polls
+START_SECTION_WAIT_JS = """
+var state = window.__scraperSectionWait = {done: false, results: null};
+(function () {
+%s
+}).apply(null, [arguments[0], arguments[1], function (results) { state.done = true; state.results = results; }]);
+""" % WAIT_FOR_SECTIONS_JS
+
+CHECK_SECTION_WAIT_JS = """
+var state = window.__scraperSectionWait;
+return state && state.done ? state.results : null;
+"""
+
+
+class PageReadiness:
+    def __init__(self, driver, poll_frequency=0.1, blocking=True):
+        self.driver = driver
+        self.poll_frequency = poll_frequency
+        # blocking waits inside one async script call; otherwise the wait runs in the page while this polls it
+        self.blocking = blocking
+        # Seconds spent waiting for each section, plus whether it showed up in time
+        self.timings = {}
+
+    def reset(self):
+        self.timings = {}
+
+    def wait_for_sections(self, sections, scroll=True):
+        if not sections:
+            return {}
+        payload = [[name, selector, timeout * 1000] for name, (selector, timeout) in sections.items()]
+        max_timeout = max(timeout for _, timeout in sections.values())
+        try:
+            if self.blocking:
+                self.driver.set_script_timeout(max_timeout + 5)
+                results = self.driver.execute_async_script(WAIT_FOR_SECTIONS_JS, payload, scroll)
+            else:
+                results = self._poll_section_wait(payload, scroll, max_timeout + 5)
+        except Exception as e:
+            print(f"Error waiting for sections in page, polling instead: {e}")
+            return self._poll_for_sections(sections)
+
+        found = {}
+        for name in sections:
+            result = results.get(name) or {'found': False, 'ms': 0}
+            self._record(name, result['ms'] / 1000, result['found'])
+            found[name] = result['found']
+        return found
+
+    def _poll_section_wait(self, payload, scroll, timeout):
+        self.driver.execute_script(START_SECTION_WAIT_JS, payload, scroll)
+        deadline = time.monotonic() + timeout
+        while True:
+            results = self.driver.execute_script(CHECK_SECTION_WAIT_JS)
+            if results is not None:
+                return results
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Section wait did not finish within {timeout}s")
+            time.sleep(self.poll_frequency)
+
+    def _poll_for_sections(self, sections):
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+
+        found = {}
+        for name, (selector, timeout) in sections.items():
+            start = time.perf_counter()
+            try:
+                WebDriverWait(self.driver, timeout, poll_frequency=self.poll_frequency).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, selector))
+                )
+                found[name] = True
+            except Exception:
+                found[name] = False
+            self._record(name, time.perf_counter() - start, found[name])
+        return found
+
+    def _record(self, name, seconds, found):
+        self.timings[name] = {'seconds': round(seconds, 3), 'found': found}
+        if not found:
+            print(f"Timed out waiting for {name} after {seconds:.2f}s")
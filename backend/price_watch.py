@@ -0,0 +1,228 @@
+import heapq
+import json
+import os
+import signal
+import sys
+import threading
+import time
+
+from backend.amazon_scraper import AmazonTVScraper, get_http_session
+from backend.batch import read_urls, validate_url
+from backend.result_cache import canonicalize_url
+from backend.snapshot_store import SnapshotStore, format_time
+
+PRICE_FIELDS = ('selling_price', 'mrp', 'discount_percentage')
+
+# Snapshots a product's change rate is estimated from
+HISTORY_LIMIT = 50
+# Rates are smoothed with one assumed change per this many hours, so a product with little
+# history is neither hammered nor forgotten
+PRIOR_HOURS = 24.0
+
+
+def offer_texts(snapshot):
+    return sorted(offer.get('offer_text') or '' for offer in snapshot.get('bank_offers') or [])
+
+
+def price_changes(before, after):
+    # {field: {'old', 'new'}} for the price fields and bank offers that differ between two snapshots
+    changes = {}
+    for field in PRICE_FIELDS:
+        if before.get(field) != after.get(field):
+            changes[field] = {'old': before.get(field), 'new': after.get(field)}
+    old_offers, new_offers = offer_texts(before), offer_texts(after)
+    if old_offers != new_offers:
+        changes['bank_offers'] = {'old': old_offers, 'new': new_offers}
+    return changes
+
+
+def change_rate(snapshots):
+    # Observed price/offer changes per hour across consecutive snapshots (oldest first)
+    if len(snapshots) < 2:
+        return 1.0 / PRIOR_HOURS
+    changes = sum(1 for before, after in zip(snapshots, snapshots[1:]) if price_changes(before, after))
+    span_hours = (snapshots[-1]['scraped_at'] - snapshots[0]['scraped_at']) / 3600
+    return (changes + 1) / (span_hours + PRIOR_HOURS)
+
+
+class TokenBucket:
+    # per_hour tokens a hour, of which up to capacity can be saved up while idle
+    def __init__(self, per_hour, capacity):
+        self.rate = per_hour / 3600
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+
+class PriceWatch:
+    def __init__(self, urls, scrape, store, emit=None, budget=None, min_interval=None, max_interval=None, samples_per_change=None):
+        # scrape(url) returns product data or None; emit(event) receives a dict for every price change
+        self.scrape = scrape
+        self.store = store
+        self.emit = emit or (lambda event: None)
+        # Scrapes per hour across the whole watch list; a few minutes' worth can be spent in a burst
+        self.budget = budget or float(os.getenv('SCRAPER_WATCH_BUDGET', '60'))
+        self.bucket = TokenBucket(self.budget, capacity=max(1.0, self.budget / 12))
+        # Seconds between scrapes of one product, before the budget stretches them
+        self.min_interval = min_interval or float(os.getenv('SCRAPER_WATCH_MIN_INTERVAL', '900'))
+        self.max_interval = max_interval or float(os.getenv('SCRAPER_WATCH_MAX_INTERVAL', '86400'))
+        # How often a product is looked at per expected change in its price or offers
+        self.samples_per_change = samples_per_change or float(os.getenv('SCRAPER_WATCH_SAMPLES_PER_CHANGE', '2'))
+
+        self.products = {}
+        self._heap = []
+        # Scrapes per hour the schedule asks for at the products' current rates, kept as a running sum
+        self._demand = 0.0
+        now = time.time()
+        for url in urls:
+            asin, canonical_url = canonicalize_url(url)
+            if asin is None or asin in self.products:
+                continue
+            snapshots = self.store.recent(asin, HISTORY_LIMIT)
+            last_scraped = snapshots[-1]['scraped_at'] if snapshots else None
+            self.products[asin] = {'url': canonical_url, 'rate': 0.0, 'last_scraped': last_scraped, 'failures': 0, 'due': None}
+            self._set_rate(asin, change_rate(snapshots))
+        for asin, product in self.products.items():
+            # Products never scraped before are due straight away; the budget spreads them out
+            due = product['last_scraped'] + self.interval(asin) if product['last_scraped'] else now
+            self._schedule(asin, due)
+
+    def _base_interval(self, rate):
+        return min(self.max_interval, max(self.min_interval, 3600 / (rate * self.samples_per_change)))
+
+    def _set_rate(self, asin, rate):
+        product = self.products[asin]
+        if product['rate']:
+            self._demand -= 3600 / self._base_interval(product['rate'])
+        product['rate'] = rate
+        self._demand += 3600 / self._base_interval(rate)
+
+    def interval(self, asin):
+        # When the watch list asks for more scrapes than the budget allows, every interval is stretched
+        # by the same factor, so volatile products keep their lead over quiet ones
+        stretch = max(1.0, self._demand / self.budget)
+        return self._base_interval(self.products[asin]['rate']) * stretch
+
+    def _schedule(self, asin, due):
+        self.products[asin]['due'] = due
+        heapq.heappush(self._heap, (due, asin))
+
+    def run(self, stop=None):
+        stop = stop or threading.Event()
+        while not stop.is_set() and self._heap:
+            due, asin = self._heap[0]
+            if self.products[asin]['due'] != due:
+                # Superseded by a later reschedule
+                heapq.heappop(self._heap)
+                continue
+            delay = max(due - time.time(), self.bucket.wait_time())
+            if delay > 0:
+                stop.wait(min(delay, 60))
+                continue
+            heapq.heappop(self._heap)
+            self.watch_one(asin)
+
+    def watch_one(self, asin):
+        product = self.products[asin]
+
+        # Scraped meanwhile by someone else sharing the snapshot store (the web app, a batch run):
+        # count that scrape instead of spending budget on another one
+        latest = self.store.recent(asin, 1)
+        if latest and product['last_scraped'] and latest[0]['scraped_at'] > product['last_scraped']:
+            product['last_scraped'] = latest[0]['scraped_at']
+            self._set_rate(asin, change_rate(self.store.recent(asin, HISTORY_LIMIT)))
+            self._schedule(asin, product['last_scraped'] + self.interval(asin))
+            return None
+
+        self.bucket.take()
+        try:
+            data = self.scrape(product['url'])
+        except Exception as e:
+            print(f"{asin}: scrape error: {e}", file=sys.stderr)
+            data = None
+        now = time.time()
+        if not data:
+            # Failures back off from the minimum interval, without giving up on the product
+            product['failures'] += 1
+            retry = min(self.max_interval, self.min_interval * 2 ** (product['failures'] - 1))
+            self._schedule(asin, now + retry)
+            print(f"{asin}: scrape failed, retrying in {retry / 60:.0f} min", file=sys.stderr)
+            return None
+
+        product['failures'] = 0
+        product['last_scraped'] = now
+        self.store.append(data, url=product['url'], asin=asin, scraped_at=now)
+        snapshots = self.store.recent(asin, HISTORY_LIMIT)
+        changes = price_changes(snapshots[-2], snapshots[-1]) if len(snapshots) >= 2 else {}
+        self._set_rate(asin, change_rate(snapshots))
+        interval = self.interval(asin)
+        self._schedule(asin, now + interval)
+        print(f"{asin}: {'changed' if changes else 'unchanged'}, {product['rate']:.3f} changes/hour, "
+              f"next scrape in {interval / 60:.0f} min", file=sys.stderr)
+
+        if not changes:
+            return None
+        event = {'event': 'price_change', 'asin': asin, 'url': product['url'], 'at': format_time(now), 'changes': changes}
+        self.emit(event)
+        return event
+
+
+def run_watch_cli(args):
+    urls = list(args.urls)
+    if args.file:
+        with open(args.file, 'r', encoding='utf-8') as f:
+            urls.extend(read_urls(f))
+    for url in urls:
+        error = validate_url(url)
+        if error or canonicalize_url(url)[0] is None:
+            print(f"{url}: {error or 'No ASIN in product URL'}", file=sys.stderr)
+            return 1
+    if not urls:
+        print("No URLs given", file=sys.stderr)
+        return 1
+
+    # Change events go to stdout (or --output) as NDJSON; the scraper's debug prints must not end up there
+    output = open(args.output, 'a', encoding='utf-8') if args.output else sys.stdout
+    sys.stdout = sys.stderr
+    webhook = args.webhook or os.getenv('SCRAPER_WATCH_WEBHOOK')
+
+    def emit(event):
+        output.write(json.dumps(event, ensure_ascii=False) + '\n')
+        output.flush()
+        if webhook:
+            try:
+                get_http_session().post(webhook, json=event, timeout=10)
+            except Exception as e:
+                print(f"Error posting change event to webhook: {e}", file=sys.stderr)
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    store = SnapshotStore(args.db)
+    scraper = AmazonTVScraper(fetch_mode=args.fetch_mode, section_store=store)
+    try:
+        watch = PriceWatch(urls, scraper.extract_product_details, store, emit=emit, budget=args.budget,
+                           min_interval=args.min_interval, max_interval=args.max_interval)
+        print(f"Watching {len(watch.products)} products, {watch.budget:g} scrapes per hour", file=sys.stderr)
+        watch.run(stop)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scraper.close()
+        store.close()
+        sys.stdout = sys.__stdout__
+        if args.output:
+            output.close()
+    return 0
@@ -0,0 +1,196 @@
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+from backend.metrics import REGISTRY
+
+REGISTRY.counter('scraper_blocked_pages_total', 'Block, CAPTCHA and throttling pages by reason')
+
+# What Amazon serves instead of a product page when it wants a client to slow down. Only pages without
+# a product title are checked, so these never match a real listing.
+BLOCK_MARKERS = (
+    ('captcha', ('/errors/validateCaptcha', 'Type the characters you see in this image')),
+    ('robot_check', ('api-services-support@amazon.com', 'Robot Check')),
+    ('throttled', ('Sorry! Something went wrong', 'Request was throttled')),
+)
+THROTTLE_STATUSES = (429, 503)
+
+# Polled in the browser until the page is a product page ('product'), a CAPTCHA ('captcha') or finished
+# loading without a product title ('loaded'), so block pages are recognised as soon as they render
+PAGE_STATE_JS = """
+if (location.protocol === 'about:') return null;
+if (document.getElementById('productTitle')) return 'product';
+if (document.querySelector('form[action*="validateCaptcha"]')) return 'captcha';
+return document.readyState === 'complete' ? 'loaded' : null;
+"""
+
+# Outcomes of a fetch other than a block reason: 'ok' grows the host's limit, 'failed' (a timeout, a page
+# that isn't a product) leaves it alone
+OK = 'ok'
+FAILED = 'failed'
+
+
+def classify_block(html=None, status=None):
+    # The block reason for a response that isn't a product page, or None when it isn't a block
+    if status == 429:
+        return 'throttled'
+    if html:
+        for reason, markers in BLOCK_MARKERS:
+            if any(marker in html for marker in markers):
+                return reason
+    if status in THROTTLE_STATUSES:
+        return 'throttled'
+    return None
+
+
+def host_of(url):
+    return urlparse(url).netloc.lower()
+
+
+class RateLimited(Exception):
+    def __init__(self, host, retry_after):
+        super().__init__(f"{host} is backing off, retry in {retry_after:.0f}s")
+        self.host = host
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    def __init__(self, host):
+        self.host = host
+        self.started = time.monotonic()
+
+
+class _Host:
+    def __init__(self, limit):
+        self.limit = float(limit)
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        # Blocks of fetches started before the last decrease are the same episode and don't halve the limit again
+        self.decreased_at = 0.0
+        self.consecutive_blocks = 0
+        self.successes = deque()  # monotonic times of recent successful fetches
+        self.stats = {'ok': 0, 'failed': 0, 'blocked': 0, 'decreases': 0}
+
+    def wait_time(self, now):
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        return 0.0 if self.in_flight < int(self.limit) else None
+
+
+class RateController:
+    # AIMD concurrency per host: every successful fetch adds 1/limit to the host's limit (one slot per
+    # round of fetches), every block episode halves it and pauses the host for an exponential backoff with
+    # jitter. The limit settles just below the rate Amazon tolerates instead of hitting it over and over.
+    def __init__(self, max_concurrency=None, initial=None, backoff=None, max_backoff=None, retries=None, max_wait=None, window=None):
+        self.max_concurrency = max_concurrency or int(os.getenv('SCRAPER_RATE_MAX_CONCURRENCY', '16'))
+        # Hosts start at full concurrency, so nothing is held back until a block is seen
+        self.initial = min(initial or self.max_concurrency, self.max_concurrency)
+        self.backoff = backoff or float(os.getenv('SCRAPER_RATE_BACKOFF', '30'))
+        self.max_backoff = max_backoff or float(os.getenv('SCRAPER_RATE_MAX_BACKOFF', '600'))
+        # Times a blocked fetch is tried again, after the backoff, before it is given up
+        self.retries = retries if retries is not None else int(os.getenv('SCRAPER_RATE_RETRIES', '2'))
+        # How long acquire() waits for a slot before raising RateLimited
+        self.max_wait = max_wait if max_wait is not None else float(os.getenv('SCRAPER_RATE_MAX_WAIT', '60'))
+        # Successful fetches over this many seconds give the sustained rate
+        self.window = window or float(os.getenv('SCRAPER_RATE_WINDOW', '300'))
+        self._condition = threading.Condition()
+        self._hosts = {}
+        self._started = time.monotonic()
+
+    def _host(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _Host(self.initial)
+        return state
+
+    def wait_time(self, url):
+        # 0 when a fetch of url could start now, seconds until the host's backoff ends, or None when
+        # every slot is taken and only a release frees one
+        with self._condition:
+            return self._host(host_of(url)).wait_time(time.monotonic())
+
+    def try_acquire(self, url):
+        # A ticket for fetching url, or None when its host has no slot free right now
+        host = host_of(url)
+        with self._condition:
+            state = self._host(host)
+            if state.wait_time(time.monotonic()) != 0:
+                return None
+            state.in_flight += 1
+            return _Ticket(host)
+
+    def acquire(self, url, timeout=None):
+        # Blocks until the host has a slot free and isn't backing off
+        host = host_of(url)
+        deadline = time.monotonic() + (self.max_wait if timeout is None else timeout)
+        with self._condition:
+            state = self._host(host)
+            while True:
+                now = time.monotonic()
+                wait = state.wait_time(now)
+                if wait == 0:
+                    state.in_flight += 1
+                    return _Ticket(host)
+                if now + (wait or 0) > deadline:
+                    raise RateLimited(host, wait if wait is not None else deadline - now)
+                self._condition.wait(min(wait, deadline - now) if wait is not None else deadline - now)
+
+    def release(self, ticket, outcome):
+        # outcome is OK, FAILED or the block reason from classify_block()
+        now = time.monotonic()
+        with self._condition:
+            state = self._host(ticket.host)
+            state.in_flight -= 1
+            if outcome == OK:
+                state.stats['ok'] += 1
+                state.consecutive_blocks = 0
+                state.limit = min(self.max_concurrency, state.limit + 1 / state.limit)
+                state.successes.append(now)
+            elif outcome == FAILED:
+                state.stats['failed'] += 1
+            else:
+                state.stats['blocked'] += 1
+                if ticket.started >= state.decreased_at:
+                    state.limit = max(1.0, state.limit / 2)
+                    state.decreased_at = now
+                    state.consecutive_blocks += 1
+                    state.stats['decreases'] += 1
+                    delay = min(self.max_backoff, self.backoff * 2 ** (state.consecutive_blocks - 1))
+                    # Equal jitter: between half and all of the delay, so workers don't all come back at once
+                    state.blocked_until = now + random.uniform(delay / 2, delay)
+            self._condition.notify_all()
+        if outcome not in (OK, FAILED):
+            REGISTRY.increment('scraper_blocked_pages_total', reason=outcome)
+            print(f"{ticket.host} served a {outcome} page, limit now {int(state.limit)} concurrent fetches", file=sys.stderr)
+
+    def _rate(self, state, now):
+        # Successful fetches per hour over the recent window (or since the controller started, if sooner)
+        while state.successes and state.successes[0] < now - self.window:
+            state.successes.popleft()
+        span = min(self.window, now - self._started)
+        return len(state.successes) * 3600 / span if span > 0 else 0.0
+
+    def stats(self):
+        now = time.monotonic()
+        with self._condition:
+            return {host: dict(state.stats, limit=int(state.limit), in_flight=state.in_flight,
+                               backoff_seconds=round(max(0.0, state.blocked_until - now), 1),
+                               rate_per_hour=round(self._rate(state, now), 1))
+                    for host, state in self._hosts.items()}
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_rate_controller():
+    # Scrapers in one process share a controller, so a block seen by one slows down all of them
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = RateController()
+        return _controller
@@ -0,0 +1,205 @@
+import copy
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from urllib.parse import urlparse
+
+ASIN_RE = re.compile(r'/(?:dp|gp/product|gp/aw/d|product-reviews)/([A-Z0-9]{10})(?:[/?#]|$)', re.IGNORECASE)
+
+# Price and offers move several times a day, everything else on the page rarely changes
+VOLATILE_FIELDS = ('selling_price', 'mrp', 'discount_percentage', 'bank_offers', 'ai_review_summary')
+
+
+def extract_asin(url):
+    match = ASIN_RE.search(urlparse(url).path + '/')
+    return match.group(1).upper() if match else None
+
+
+def canonicalize_url(url):
+    # Tracking parameters and slugs don't change the product, so every URL for an ASIN maps to /dp/<ASIN>
+    asin = extract_asin(url)
+    if not asin:
+        return None, url
+    parsed = urlparse(url)
+    return asin, f"{parsed.scheme}://{parsed.netloc}/dp/{asin}"
+
+
+class ResultCache:
+    def __init__(self, max_entries=None, volatile_ttl=None, static_ttl=None, cache_dir=None, max_disk_entries=None, field_ttls=None):
+        self.max_entries = max_entries or int(os.getenv('SCRAPER_CACHE_SIZE', '500'))
+        volatile_ttl = volatile_ttl if volatile_ttl is not None else float(os.getenv('SCRAPER_CACHE_PRICE_TTL', '900'))
+        self.static_ttl = static_ttl if static_ttl is not None else float(os.getenv('SCRAPER_CACHE_STATIC_TTL', '86400'))
+        self.field_ttls = {field: volatile_ttl for field in VOLATILE_FIELDS}
+        self.field_ttls.update(field_ttls or {})
+        # Optional second tier on disk so results survive restarts and memory eviction
+        self.cache_dir = cache_dir or os.getenv('SCRAPER_CACHE_DIR')
+        self.max_disk_entries = max_disk_entries or int(os.getenv('SCRAPER_CACHE_DISK_SIZE', '10000'))
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'coalesced': 0, 'refreshes': 0, 'evictions': 0}
+
+    def _ttl(self, field):
+        return self.field_ttls.get(field, self.static_ttl)
+
+    def _stale_fields(self, entry, now):
+        return [field for field, fetched_at in entry['fetched_at'].items() if now - fetched_at > self._ttl(field)]
+
+    def _disk_path(self, asin):
+        return os.path.join(self.cache_dir, f"{asin}.json")
+
+    def _read_disk(self, asin):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._disk_path(asin), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, asin, entry):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(asin)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing cache entry for {asin}: {e}")
+
+    def _prune_disk(self):
+        try:
+            files = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith('.json')]
+            if len(files) <= self.max_disk_entries:
+                return
+            files.sort(key=os.path.getmtime)
+            for path in files[:len(files) - self.max_disk_entries]:
+                os.remove(path)
+        except OSError as e:
+            print(f"Error pruning cache directory: {e}")
+
+    def _lookup(self, asin):
+        # Returns the entry for asin from memory, falling back to (and promoting from) the disk tier
+        with self._lock:
+            entry = self._entries.get(asin)
+            if entry is not None:
+                self._entries.move_to_end(asin)
+                return entry, 'memory'
+        entry = self._read_disk(asin)
+        if entry is None:
+            return None, None
+        with self._lock:
+            self._store(asin, entry)
+        return entry, 'disk'
+
+    def _store(self, asin, entry):
+        self._entries[asin] = entry
+        self._entries.move_to_end(asin)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def get(self, asin):
+        # The cached product when every field is still fresh, else None
+        entry, tier = self._lookup(asin)
+        if entry is None or self._stale_fields(entry, time.time()):
+            with self._lock:
+                self._stats['misses'] += 1
+            return None
+        with self._lock:
+            self._stats['disk_hits' if tier == 'disk' else 'hits'] += 1
+        return copy.deepcopy(entry['data'])
+
+    def _refreshable(self, asin):
+        # A copy of the cached product when only fields with their own TTL (price, offers) have gone stale,
+        # so they can be refreshed on their own while the rest is still served from cache
+        entry, _ = self._lookup(asin)
+        if entry is None:
+            return None
+        stale = self._stale_fields(entry, time.time())
+        if not stale or any(field not in self.field_ttls for field in stale):
+            return None
+        return copy.deepcopy(entry['data'])
+
+    def put(self, asin, data, fields=None):
+        # fields limits the update to those fields of data, keeping the others and their fetch times
+        now = time.time()
+        with self._lock:
+            previous = self._entries.get(asin)
+        if fields is None or previous is None:
+            entry = {'data': copy.deepcopy(data), 'fetched_at': {field: now for field in data}}
+        else:
+            entry = {'data': dict(previous['data']), 'fetched_at': dict(previous['fetched_at'])}
+            for field in fields:
+                entry['data'][field] = copy.deepcopy(data.get(field))
+                entry['fetched_at'][field] = now
+        with self._lock:
+            self._store(asin, entry)
+        if self.cache_dir:
+            self._write_disk(asin, entry)
+            self._prune_disk()
+
+    def get_or_scrape(self, url, scrape, timeout=None, refresh=None):
+        # Returns (product_data, source) where source is 'cache', 'coalesced', 'refresh' or 'scrape'.
+        # refresh(url, cached_product), when given, is tried first for a product whose only stale fields are
+        # the volatile ones; it returns just those fields (or None to fall back to a full scrape).
+        asin, canonical_url = canonicalize_url(url)
+        if asin is None:
+            return scrape(url), 'scrape'
+
+        cached = self.get(asin)
+        if cached is not None:
+            return cached, 'cache'
+
+        with self._lock:
+            future = self._inflight.get(asin)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[asin] = future
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            # Someone is already scraping this ASIN; share their result instead of launching another browser
+            data = future.result(timeout=timeout)
+            return copy.deepcopy(data), 'coalesced'
+
+        try:
+            cached = self._refreshable(asin) if refresh else None
+            fields = refresh(canonical_url, cached) if cached is not None else None
+            if fields:
+                self.put(asin, dict(cached, **fields), fields=fields.keys())
+                with self._lock:
+                    self._stats['refreshes'] += 1
+                data, source = dict(cached, **fields), 'refresh'
+            else:
+                data, source = scrape(canonical_url), 'scrape'
+                if data:
+                    self.put(asin, data)
+            future.set_result(data)
+            # Followers copy data as it was set, so the leader's caller gets a copy of its own to add to
+            return copy.deepcopy(data), source
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(asin, None)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['inflight'] = len(self._inflight)
+        stats['max_entries'] = self.max_entries
+        return stats
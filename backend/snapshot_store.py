@@ -0,0 +1,256 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from backend.result_cache import extract_asin
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    asin TEXT,
+    url TEXT,
+    scraped_at REAL NOT NULL,
+    product_name TEXT,
+    selling_price REAL,
+    mrp REAL,
+    discount_percentage REAL,
+    rating REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshots_asin_time ON snapshots (asin, scraped_at);
+CREATE INDEX IF NOT EXISTS snapshots_time ON snapshots (scraped_at);
+CREATE TABLE IF NOT EXISTS sections (
+    asin TEXT NOT NULL,
+    section TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    value TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (asin, section)
+) WITHOUT ROWID;
+"""
+
+INSERT_SQL = """
+INSERT INTO snapshots (asin, url, scraped_at, product_name, selling_price, mrp, discount_percentage, rating, data)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+UPSERT_SECTION_SQL = """
+INSERT INTO sections (asin, section, fingerprint, value, updated_at) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (asin, section) DO UPDATE SET fingerprint = excluded.fingerprint, value = excluded.value, updated_at = excluded.updated_at
+"""
+
+# Columns returned by history queries, in order
+HISTORY_COLUMNS = ('scraped_at', 'selling_price', 'mrp', 'discount_percentage')
+
+NUMBER_RE = re.compile(r'\d+(?:\.\d+)?')
+
+
+def _number(value):
+    # Prices are floats already; discounts ("34.91%") and ratings ("4.7") are scraped as strings
+    if value is None or isinstance(value, (int, float)):
+        return value
+    match = NUMBER_RE.search(str(value).replace(',', ''))
+    return float(match.group()) if match else None
+
+
+def parse_time(value):
+    # Accepts epoch seconds or an ISO 8601 date/time (naive values are taken as UTC)
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    parsed = datetime.fromisoformat(str(value))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def format_time(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+class SnapshotStore:
+    def __init__(self, path=None):
+        # Every scrape is appended here; history and exports read from the same file
+        self.path = path or os.getenv('SCRAPER_SNAPSHOT_DB', 'snapshots.db')
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        # WAL lets history queries run while batch results are being appended
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+
+    def _row(self, data, url=None, asin=None, scraped_at=None):
+        asin = asin or (extract_asin(url) if url else None)
+        return (
+            asin,
+            url,
+            scraped_at if scraped_at is not None else time.time(),
+            data.get('product_name'),
+            _number(data.get('selling_price')),
+            _number(data.get('mrp')),
+            _number(data.get('discount_percentage')),
+            _number(data.get('rating')),
+            json.dumps(data, ensure_ascii=False),
+        )
+
+    def append(self, data, url=None, asin=None, scraped_at=None):
+        self.append_many([(data, url, asin, scraped_at)])
+
+    def append_many(self, snapshots):
+        # snapshots is an iterable of (data, url, asin, scraped_at); written in one transaction
+        rows = [self._row(*snapshot) for snapshot in snapshots]
+        if not rows:
+            return 0
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany(INSERT_SQL, rows)
+        except sqlite3.Error as e:
+            # Losing a history point must not fail the scrape that produced it
+            print(f"Error saving product snapshot: {e}")
+            return 0
+        return len(rows)
+
+    def latest_sections(self, asin):
+        # {section: {'fingerprint', 'value'}} as of the last scrape of asin, for incremental re-scrapes
+        try:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT section, fingerprint, value FROM sections WHERE asin = ?", (asin.upper(),)).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error reading stored sections for {asin}: {e}")
+            return {}
+        return {section: {'fingerprint': fingerprint, 'value': json.loads(value)} for section, fingerprint, value in rows}
+
+    def save_sections(self, asin, sections, updated_at=None):
+        # Only the sections passed in are written; unchanged ones keep their rows untouched
+        updated_at = updated_at if updated_at is not None else time.time()
+        rows = [(asin.upper(), section, state['fingerprint'], json.dumps(state['value'], ensure_ascii=False), updated_at)
+                for section, state in sections.items()]
+        if not rows:
+            return 0
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany(UPSERT_SECTION_SQL, rows)
+        except sqlite3.Error as e:
+            print(f"Error saving sections for {asin}: {e}")
+            return 0
+        return len(rows)
+
+    def history(self, asin, since=None, until=None, limit=None):
+        query = f"SELECT {', '.join(HISTORY_COLUMNS)} FROM snapshots WHERE asin = ?"
+        params = [asin.upper()]
+        if since is not None:
+            query += " AND scraped_at >= ?"
+            params.append(since)
+        if until is not None:
+            query += " AND scraped_at <= ?"
+            params.append(until)
+        if limit:
+            # Most recent points when limited, still returned oldest first
+            query = f"SELECT * FROM ({query} ORDER BY scraped_at DESC LIMIT ?) ORDER BY scraped_at"
+            params.append(int(limit))
+        else:
+            query += " ORDER BY scraped_at"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        points = []
+        for row in rows:
+            point = dict(zip(HISTORY_COLUMNS, row))
+            point['scraped_at'] = format_time(point['scraped_at'])
+            points.append(point)
+        return points
+
+    def recent(self, asin, limit=50):
+        # The latest snapshots of asin, oldest first, with just the fields prices and offers are compared on
+        query = """
+        SELECT * FROM (
+            SELECT scraped_at, selling_price, mrp, discount_percentage, json_extract(data, '$.bank_offers')
+            FROM snapshots WHERE asin = ? ORDER BY scraped_at DESC LIMIT ?
+        ) ORDER BY scraped_at
+        """
+        try:
+            with self._lock:
+                rows = self._conn.execute(query, (asin.upper(), int(limit))).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error reading snapshots for {asin}: {e}")
+            return []
+        return [{'scraped_at': scraped_at, 'selling_price': selling_price, 'mrp': mrp,
+                 'discount_percentage': discount, 'bank_offers': json.loads(offers) if offers else []}
+                for scraped_at, selling_price, mrp, discount, offers in rows]
+
+    def latest_products(self, after_id=0):
+        # (id, asin, url, scraped_at, data) of the newest snapshot of each product among those stored after after_id
+        # With MAX() SQLite takes the other (bare) columns from the row holding the maximum
+        query = """
+        SELECT MAX(id), asin, url, scraped_at, data FROM snapshots
+        WHERE id > ? AND asin IS NOT NULL GROUP BY asin
+        """
+        with self._lock:
+            rows = self._conn.execute(query, (after_id,)).fetchall()
+        return [(row_id, asin, url, scraped_at, json.loads(data)) for row_id, asin, url, scraped_at, data in rows]
+
+    def _export_filter(self, latest, asin, since, until, max_id):
+        # WHERE clause and params selecting the snapshots an export covers, up to max_id so both passes
+        # of an export see the same rows while scrapes keep being appended. Columns are qualified because
+        # the first pass joins json_each, which has an id column of its own.
+        conditions = ["snapshots.asin IS NOT NULL", "snapshots.id <= ?"]
+        params = [max_id]
+        if asin:
+            conditions.append("snapshots.asin = ?")
+            params.append(asin.upper())
+        if since is not None:
+            conditions.append("snapshots.scraped_at >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("snapshots.scraped_at <= ?")
+            params.append(until)
+        where = ' AND '.join(conditions)
+        if latest:
+            # Only the newest of each product's matching snapshots
+            return f"snapshots.id IN (SELECT MAX(snapshots.id) FROM snapshots WHERE {where} GROUP BY snapshots.asin)", params
+        return where, params
+
+    def export_layout(self, latest=True, asin=None, since=None, until=None):
+        # First pass of an export, run inside SQLite: (max_id, sorted product_information keys, most bank
+        # offers on one product) across the snapshots it covers, from which stable columns are derived
+        with self._lock:
+            max_id = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM snapshots").fetchone()[0]
+            where, params = self._export_filter(latest, asin, since, until, max_id)
+            keys = self._conn.execute(
+                f"SELECT DISTINCT info.key FROM snapshots, json_each(snapshots.data, '$.product_information') AS info "
+                f"WHERE {where} ORDER BY info.key", params).fetchall()
+            max_offers = self._conn.execute(
+                f"SELECT COALESCE(MAX(json_array_length(data, '$.bank_offers')), 0) FROM snapshots WHERE {where}",
+                params).fetchone()[0]
+        return max_id, [key for (key,) in keys], max_offers
+
+    def iter_snapshots(self, max_id, latest=True, asin=None, since=None, until=None, batch_size=500):
+        # Second pass: yields (asin, url, scraped_at, data) oldest first, batch_size rows at a time. It reads
+        # through a connection of its own, so a long export never holds up scrapes appending to the store.
+        where, params = self._export_filter(latest, asin, since, until, max_id)
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            cursor = conn.execute(f"SELECT asin, url, scraped_at, data FROM snapshots WHERE {where} ORDER BY id", params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                for row_asin, url, scraped_at, data in rows:
+                    yield row_asin, url, scraped_at, json.loads(data)
+        finally:
+            conn.close()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
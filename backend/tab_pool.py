@@ -0,0 +1,338 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from selenium.common.exceptions import WebDriverException
+
+from backend.amazon_scraper import AmazonTVScraper
+from backend.driver_pool import PoolExhaustedError
+from backend.metrics import REGISTRY
+
+# Shared browsers return from driver.get straight away instead of blocking every tab on one page load;
+# the scraper's readiness waits cover the rest. Background tabs must not be throttled either.
+TAB_PAGE_LOAD_STRATEGY = 'none'
+TAB_CHROME_ARGUMENTS = [
+    "--disable-background-timer-throttling",
+    "--disable-renderer-backgrounding",
+    "--disable-backgrounding-occluded-windows",
+]
+
+# WebDriver command names, as in selenium.webdriver.remote.command.Command; importing that
+# would load all of selenium.webdriver at startup
+SWITCH_TO_WINDOW = 'switchToWindow'
+CLOSE = 'close'
+
+# Walking /proc for a browser's memory isn't free, so it is measured at most this often
+MEMORY_CHECK_INTERVAL = 5.0
+
+
+def process_tree_rss(pid):
+    # Resident memory in bytes of pid and every process below it (chromedriver, Chrome and its
+    # renderers), or None where /proc isn't available
+    if not os.path.isdir('/proc'):
+        return None
+    children = {}
+    rss = {}
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat', 'r') as f:
+                # The parent pid is the second field after the parenthesised command name
+                parent = int(f.read().rsplit(')', 1)[1].split()[1])
+            with open(f'/proc/{name}/statm', 'r') as f:
+                rss[int(name)] = int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(name))
+
+    total = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        total += rss.get(current, 0)
+        stack.extend(children.get(current, ()))
+    return total
+
+
+class _Tab:
+    def __init__(self, browser, handle, scraper):
+        self.browser = browser
+        self.handle = handle
+        self.scraper = scraper
+
+
+class _SharedBrowser:
+    # One Chrome serving several scrapes, each in its own tab. WebDriver commands always address the
+    # session's current window, so every command (element commands included) goes through _execute,
+    # which first switches to the calling thread's tab. Only that switch and the command itself hold
+    # the lock; waiting for pages happens between commands, so tabs load and render in parallel.
+    def __init__(self, section_store=None):
+        # The root scraper only owns the browser; scrapes run in the tabs' scrapers
+        self.root = AmazonTVScraper(incremental=False)
+        self.section_store = section_store
+        self.root.setup_driver(page_load_strategy=TAB_PAGE_LOAD_STRATEGY, arguments=TAB_CHROME_ARGUMENTS)
+        self.driver = self.root.driver
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._raw_execute = self.driver.execute
+        self.driver.execute = self._execute
+        self._current = self.driver.current_window_handle
+        # The window Chrome starts with becomes the first tab
+        self._unused_handles = [self._current]
+
+        self.idle = []  # LIFO, like the driver pool
+        self.busy = 0
+        self.tabs = 0
+        self.pages = 0
+        self.retiring = False
+        self.rss = None
+        self._memory_checked_at = 0.0
+
+    def _execute(self, driver_command, params=None):
+        handle = getattr(self._local, 'handle', None)
+        with self._lock:
+            if handle is not None and handle != self._current:
+                self._raw_execute(SWITCH_TO_WINDOW, {'handle': handle})
+                self._current = handle
+            if driver_command == CLOSE:
+                self._current = None
+            response = self._raw_execute(driver_command, params)
+            if driver_command == SWITCH_TO_WINDOW:
+                self._current = params['handle']
+            return response
+
+    def bind(self, tab):
+        # Commands from this thread go to tab until unbind()
+        self._local.handle = tab.handle
+
+    def unbind(self):
+        self._local.handle = None
+
+    def open_tab(self):
+        scraper = AmazonTVScraper(section_store=self.section_store)
+        with self._lock:
+            if self._unused_handles:
+                self.driver.switch_to.window(self._unused_handles.pop())
+            else:
+                self.driver.switch_to.new_window('tab')
+            # attach() sets up request blocking, which applies to the current window only
+            scraper.attach(self.driver)
+            self.tabs += 1
+            return _Tab(self, self._current, scraper)
+
+    def close_tab(self, tab):
+        try:
+            with self._lock:
+                self.driver.switch_to.window(tab.handle)
+                self.driver.close()
+        except Exception as e:
+            print(f"Error closing browser tab: {e}")
+        finally:
+            self.tabs -= 1
+            tab.scraper.close()
+
+    def memory(self, force=False):
+        now = time.monotonic()
+        if force or now - self._memory_checked_at >= MEMORY_CHECK_INTERVAL:
+            self._memory_checked_at = now
+            try:
+                self.rss = process_tree_rss(self.driver.service.process.pid)
+            except AttributeError:
+                self.rss = None
+        return self.rss
+
+    def is_alive(self):
+        # Listing windows works whichever tab is current, even one that was just closed
+        try:
+            self.driver.window_handles
+            return True
+        except Exception:
+            return False
+
+    def quit(self):
+        for tab in self.idle:
+            tab.scraper.close()
+        self.idle = []
+        try:
+            self.root.close()
+        except Exception as e:
+            print(f"Error closing shared Chrome driver: {e}")
+
+
+class TabPool:
+    # Same interface as DriverPool, but concurrent scrapes share a few browsers as tabs instead of
+    # each getting a Chrome of its own
+    def __init__(self, browsers=None, tabs_per_browser=None, max_pages=None, max_rss_mb=None, checkout_timeout=None,
+                 section_store=None):
+        self.browsers = browsers or int(os.getenv('SCRAPER_POOL_SIZE', '2'))
+        self.tabs_per_browser = tabs_per_browser or int(os.getenv('SCRAPER_TABS_PER_BROWSER', '4'))
+        # Concurrent scrapes, which is what callers size their workers and admission limits by
+        self.size = self.browsers * self.tabs_per_browser
+        # A browser is restarted once its tabs have served max_pages each, or when its process tree
+        # grows past max_rss_mb, whichever comes first
+        self.max_pages = max_pages or int(os.getenv('SCRAPER_POOL_MAX_PAGES', '50'))
+        self.max_rss_mb = max_rss_mb or float(os.getenv('SCRAPER_BROWSER_MAX_RSS_MB', '1500'))
+        if checkout_timeout is None:
+            checkout_timeout = float(os.getenv('SCRAPER_POOL_CHECKOUT_TIMEOUT', '60'))
+        self.checkout_timeout = checkout_timeout
+        # Shared by every tab's scraper for section fingerprints instead of each opening its own connection
+        self.section_store = section_store
+
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        # Browsers are launched one at a time, so two checkouts never both start one for the same free tab
+        self._launch_lock = threading.Lock()
+        self._browsers = []
+        self._closed = False
+        self._stats = {'launched': 0, 'recycled': 0, 'recycled_memory': 0, 'discarded': 0,
+                       'discarded_tabs': 0, 'checkouts': 0}
+
+    def _launch(self):
+        browser = _SharedBrowser(self.section_store)
+        with self._lock:
+            self._stats['launched'] += 1
+        return browser
+
+    def _reserve(self):
+        # Picks the browser for the next scrape and claims a tab in it: a browser with an idle tab first,
+        # then one with room for another, least busy first. None when every browser is full.
+        candidates = [browser for browser in self._browsers
+                      if not browser.retiring and browser.busy < self.tabs_per_browser]
+        if not candidates:
+            return None, None
+        browser = min(candidates, key=lambda browser: (not browser.idle, browser.busy))
+        browser.busy += 1
+        return browser, browser.idle.pop() if browser.idle else None
+
+    def warm(self, count=None):
+        # Launch browsers and open their tabs up front so the first requests don't pay Chrome startup
+        count = min(count or self.browsers, self.browsers)
+        while True:
+            with self._lock:
+                if self._closed or len(self._browsers) >= count:
+                    return
+            with self._launch_lock:
+                browser = self._launch()
+                tabs = [browser.open_tab() for _ in range(self.tabs_per_browser)]
+                with self._lock:
+                    browser.idle.extend(tabs)
+                    self._browsers.append(browser)
+
+    def _checkout(self):
+        if self._closed:
+            raise PoolExhaustedError("Driver pool is closed")
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise PoolExhaustedError("No browser tab available, try again later")
+
+        browser = None
+        try:
+            with self._lock:
+                self._stats['checkouts'] += 1
+                browser, tab = self._reserve()
+            if browser is None:
+                with self._launch_lock:
+                    with self._lock:
+                        browser, tab = self._reserve()
+                    if browser is None:
+                        launched = self._launch()
+                        with self._lock:
+                            launched.busy += 1
+                            self._browsers.append(launched)
+                        browser, tab = launched, None
+            if tab is None:
+                tab = browser.open_tab()
+            browser.bind(tab)
+            return tab
+        except BaseException:
+            if browser is not None:
+                self._finish(browser)
+            self._slots.release()
+            raise
+
+    def _checkin(self, tab, broken):
+        browser = tab.browser
+        try:
+            reusable = not broken and tab.scraper.reset()
+            browser.unbind()
+            browser.pages += 1
+            if not reusable:
+                if browser.is_alive():
+                    browser.close_tab(tab)
+                    with self._lock:
+                        self._stats['discarded_tabs'] += 1
+                else:
+                    print("Discarding crashed shared Chrome driver from pool")
+                    self._retire(browser, 'discarded')
+            elif browser.pages >= self.max_pages * self.tabs_per_browser:
+                self._retire(browser, 'recycled')
+            else:
+                rss = browser.memory()
+                if rss is not None and rss > self.max_rss_mb * 1024 * 1024:
+                    print(f"Restarting shared Chrome at {rss / 1024 / 1024:.0f} MB")
+                    self._retire(browser, 'recycled_memory')
+            if reusable:
+                # Tabs of a retiring browser go back too; they are closed along with it
+                with self._lock:
+                    browser.idle.append(tab)
+        finally:
+            browser.unbind()
+            self._finish(browser)
+            self._slots.release()
+
+    def _retire(self, browser, reason):
+        # No new scrapes go to a retiring browser; it is closed once its last busy tab comes back
+        with self._lock:
+            if not browser.retiring:
+                browser.retiring = True
+                self._stats[reason] += 1
+
+    def _finish(self, browser):
+        with self._lock:
+            browser.busy -= 1
+            done = (browser.retiring or self._closed) and browser.busy == 0 and browser in self._browsers
+            if done:
+                self._browsers.remove(browser)
+        if done:
+            browser.quit()
+
+    @contextmanager
+    def scraper(self):
+        start = time.perf_counter()
+        tab = self._checkout()
+        REGISTRY.observe('scraper_stage_duration_seconds', time.perf_counter() - start, stage='driver_checkout')
+        broken = False
+        try:
+            yield tab.scraper
+        except WebDriverException:
+            broken = True
+            raise
+        finally:
+            self._checkin(tab, broken)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            browsers = list(self._browsers)
+        stats['browsers'] = len(browsers)
+        stats['busy'] = sum(browser.busy for browser in browsers)
+        stats['idle'] = sum(len(browser.idle) for browser in browsers)
+        stats['tabs'] = sum(browser.tabs for browser in browsers)
+        measured = [browser.rss for browser in browsers if browser.rss is not None]
+        stats['rss_mb'] = round(sum(measured) / 1024 / 1024, 1) if measured else None
+        stats['size'] = self.size
+        stats['tabs_per_browser'] = self.tabs_per_browser
+        stats['max_pages'] = self.max_pages
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle = [browser for browser in self._browsers if browser.busy == 0]
+            for browser in idle:
+                self._browsers.remove(browser)
+        # Browsers still serving a scrape are closed when it finishes
+        for browser in idle:
+            browser.quit()
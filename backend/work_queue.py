@@ -0,0 +1,785 @@
+import json
+import os
+import queue
+import random
+import signal
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from backend.amazon_scraper import AmazonTVScraper
+from backend.batch import read_urls, validate_url
+from backend.result_cache import canonicalize_url, extract_asin
+from backend.snapshot_store import SnapshotStore
+
+# queued -> leased -> done, or back to queued with a delay when a scrape fails, until max_attempts
+# failures leave the task dead (the dead-letter state) with its last error
+STATUSES = ('queued', 'leased', 'done', 'dead')
+# What the job API calls each status
+JOB_STATUSES = {'queued': 'queued', 'leased': 'running', 'done': 'done', 'dead': 'failed'}
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_token TEXT,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_available ON tasks (status, available_at);
+CREATE UNIQUE INDEX IF NOT EXISTS tasks_active_key ON tasks (key) WHERE status IN ('queued', 'leased');
+"""
+
+TASK_COLUMNS = ('id', 'url', 'status', 'attempts', 'max_attempts', 'available_at', 'worker', 'created_at', 'updated_at', 'result', 'error')
+
+
+def task_key(url):
+    # Tasks are deduplicated per product, so refreshes of the same ASIN queued together run once
+    asin, canonical_url = canonicalize_url(url)
+    return asin or canonical_url or url
+
+
+class WorkQueue:
+    # Shared by every backend: how many times a task is tried, how long to wait before a retry and how long
+    # finished results are kept. Backends implement enqueue, lease, extend, complete, fail, get_many and stats.
+    def __init__(self, max_attempts=None, retry_delay=None, result_ttl=None):
+        self.max_attempts = max_attempts or int(os.getenv('SCRAPER_QUEUE_MAX_ATTEMPTS', '3'))
+        self.retry_delay = retry_delay if retry_delay is not None else float(os.getenv('SCRAPER_QUEUE_RETRY_DELAY', '30'))
+        # Results of done tasks are dropped after this many seconds; dead tasks stay until they are redriven
+        self.result_ttl = result_ttl if result_ttl is not None else float(os.getenv('SCRAPER_QUEUE_RESULT_TTL', '86400'))
+        self._purged_at = 0.0
+
+    def _retry_at(self, attempts, now):
+        # Exponential backoff with jitter, so a product that failed on several nodes at once isn't retried in lockstep
+        delay = self.retry_delay * 2 ** (attempts - 1)
+        return now + random.uniform(delay / 2, delay)
+
+    def _should_purge(self, now):
+        if now - self._purged_at < 60:
+            return False
+        self._purged_at = now
+        return True
+
+    def get(self, task_id):
+        return self.get_many([task_id]).get(task_id)
+
+    def wait(self, task_id, timeout, poll_interval=0.5):
+        # Polls until the task is done or dead, or the timeout passes; returns the task as last seen
+        deadline = time.monotonic() + timeout
+        while True:
+            task = self.get(task_id)
+            if task is None or task['status'] in ('done', 'dead') or time.monotonic() >= deadline:
+                return task
+            time.sleep(min(poll_interval, max(0.0, deadline - time.monotonic())))
+
+    def close(self):
+        pass
+
+
+def _task_dict(values):
+    task = dict(values)
+    if task.get('result'):
+        task['result'] = json.loads(task['result'])
+    for field in ('attempts', 'max_attempts'):
+        task[field] = int(task[field])
+    for field in ('available_at', 'created_at', 'updated_at'):
+        task[field] = float(task[field])
+    return task
+
+
+class SQLiteWorkQueue(WorkQueue):
+    # The default backend: one SQLite file, shared by workers on the same machine or on a filesystem with
+    # working locks. Every state change is a single short write transaction.
+    def __init__(self, path=None, **options):
+        super().__init__(**options)
+        self.path = path or 'work_queue.db'
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SQLITE_SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so two nodes never lease the same task
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield self._conn
+        except BaseException:
+            self._conn.execute('ROLLBACK')
+            raise
+        self._conn.execute('COMMIT')
+
+    def _select(self, conn, where, params):
+        rows = conn.execute(f"SELECT {', '.join(TASK_COLUMNS)} FROM tasks WHERE {where}", params).fetchall()
+        return [_task_dict(zip(TASK_COLUMNS, row)) for row in rows]
+
+    def enqueue(self, url, max_attempts=None):
+        # Returns the new task, or the task already queued or running for the same product
+        now = time.time()
+        key = task_key(url)
+        with self._lock, self._transaction() as conn:
+            existing = self._select(conn, "key = ? AND status IN ('queued', 'leased')", (key,))
+            if existing:
+                return existing[0]
+            task_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO tasks (id, url, key, status, max_attempts, available_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (task_id, url, key, max_attempts or self.max_attempts, now, now, now))
+            if self._should_purge(now):
+                conn.execute("DELETE FROM tasks WHERE status = 'done' AND updated_at < ?", (now - self.result_ttl,))
+            return self._select(conn, "id = ?", (task_id,))[0]
+
+    def lease(self, worker, visibility_timeout):
+        # Claims the task that has been available longest: a queued one, or a leased one whose worker stopped
+        # renewing it. The lease token must be shown to renew or fail the task.
+        now = time.time()
+        with self._lock, self._transaction() as conn:
+            # Leases that ran out on their last attempt are dead-lettered instead of being handed out again
+            conn.execute(
+                "UPDATE tasks SET status = 'dead', error = 'Lease expired on the last attempt', updated_at = ? "
+                "WHERE status = 'leased' AND available_at <= ? AND attempts >= max_attempts", (now, now))
+            row = conn.execute(
+                "SELECT id FROM tasks WHERE status IN ('queued', 'leased') AND available_at <= ? "
+                "ORDER BY available_at LIMIT 1", (now,)).fetchone()
+            if row is None:
+                return None
+            token = uuid.uuid4().hex
+            conn.execute(
+                "UPDATE tasks SET status = 'leased', attempts = attempts + 1, available_at = ?, lease_token = ?, "
+                "worker = ?, updated_at = ? WHERE id = ?", (now + visibility_timeout, token, worker, now, row[0]))
+            task = self._select(conn, "id = ?", (row[0],))[0]
+        task['lease_token'] = token
+        return task
+
+    def extend(self, task_id, token, visibility_timeout):
+        # False once the lease has been lost to another worker
+        now = time.time()
+        with self._lock, self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET available_at = ?, updated_at = ? WHERE id = ? AND status = 'leased' AND lease_token = ?",
+                (now + visibility_timeout, now, task_id, token))
+            return cursor.rowcount == 1
+
+    def complete(self, task_id, token, result):
+        # The first result written wins, even from a worker whose lease ran out meanwhile; later ones (the
+        # same product scraped twice) are dropped. True when this call wrote the result.
+        now = time.time()
+        with self._lock, self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET status = 'done', result = ?, error = NULL, lease_token = NULL, available_at = ?, "
+                "updated_at = ? WHERE id = ? AND status != 'done'",
+                (json.dumps(result, ensure_ascii=False), now, now, task_id))
+            return cursor.rowcount == 1
+
+    def fail(self, task_id, token, error):
+        # Requeues the task after a backoff, or dead-letters it after its last attempt. Returns the new
+        # status, or None when the caller no longer holds the lease.
+        now = time.time()
+        with self._lock, self._transaction() as conn:
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM tasks WHERE id = ? AND status = 'leased' AND lease_token = ?",
+                (task_id, token)).fetchone()
+            if row is None:
+                return None
+            attempts, max_attempts = row
+            status = 'dead' if attempts >= max_attempts else 'queued'
+            conn.execute(
+                "UPDATE tasks SET status = ?, error = ?, lease_token = NULL, available_at = ?, updated_at = ? WHERE id = ?",
+                (status, error, self._retry_at(attempts, now), now, task_id))
+            return status
+
+    def redrive(self):
+        # Gives every dead task a fresh set of attempts; returns how many were requeued
+        now = time.time()
+        with self._lock, self._transaction() as conn:
+            # A product queued again since it died keeps only the newer task
+            conn.execute(
+                "DELETE FROM tasks WHERE status = 'dead' AND key IN (SELECT key FROM tasks WHERE status IN ('queued', 'leased'))")
+            # A product that died more than once is requeued once, as its newest task
+            conn.execute(
+                "DELETE FROM tasks WHERE status = 'dead' AND EXISTS (SELECT 1 FROM tasks AS newer WHERE newer.status = 'dead' "
+                "AND newer.key = tasks.key AND (newer.created_at, newer.rowid) > (tasks.created_at, tasks.rowid))")
+            cursor = conn.execute(
+                "UPDATE tasks SET status = 'queued', attempts = 0, available_at = ?, updated_at = ? WHERE status = 'dead'",
+                (now, now))
+            return cursor.rowcount
+
+    def get_many(self, task_ids):
+        task_ids = list(task_ids)
+        tasks = {}
+        with self._lock:
+            # SQLite caps the number of bound parameters, so long lists are read in slices
+            for start in range(0, len(task_ids), 500):
+                chunk = task_ids[start:start + 500]
+                for task in self._select(self._conn, f"id IN ({', '.join('?' * len(chunk))})", chunk):
+                    tasks[task['id']] = task
+        return tasks
+
+    def stats(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+        stats = {status: 0 for status in STATUSES}
+        stats.update(rows)
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class MemoryWorkQueue(WorkQueue):
+    # Same semantics in one process's memory, for tests and single-process runs
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._lock = threading.Lock()
+        self._tasks = {}
+
+    def _copy(self, task):
+        copy = {column: task[column] for column in TASK_COLUMNS}
+        copy['result'] = json.loads(task['result']) if task['result'] else None
+        return copy
+
+    def enqueue(self, url, max_attempts=None):
+        now = time.time()
+        key = task_key(url)
+        with self._lock:
+            for task in self._tasks.values():
+                if task['key'] == key and task['status'] in ('queued', 'leased'):
+                    return self._copy(task)
+            if self._should_purge(now):
+                for task_id in [task_id for task_id, task in self._tasks.items()
+                                if task['status'] == 'done' and task['updated_at'] < now - self.result_ttl]:
+                    del self._tasks[task_id]
+            task = {'id': uuid.uuid4().hex, 'url': url, 'key': key, 'status': 'queued', 'attempts': 0,
+                    'max_attempts': max_attempts or self.max_attempts, 'available_at': now, 'lease_token': None,
+                    'worker': None, 'created_at': now, 'updated_at': now, 'result': None, 'error': None}
+            self._tasks[task['id']] = task
+            return self._copy(task)
+
+    def lease(self, worker, visibility_timeout):
+        now = time.time()
+        with self._lock:
+            candidates = []
+            for task in self._tasks.values():
+                if task['status'] not in ('queued', 'leased') or task['available_at'] > now:
+                    continue
+                if task['status'] == 'leased' and task['attempts'] >= task['max_attempts']:
+                    task.update(status='dead', error='Lease expired on the last attempt', updated_at=now)
+                    continue
+                candidates.append(task)
+            if not candidates:
+                return None
+            task = min(candidates, key=lambda task: task['available_at'])
+            token = uuid.uuid4().hex
+            task.update(status='leased', attempts=task['attempts'] + 1, available_at=now + visibility_timeout,
+                        lease_token=token, worker=worker, updated_at=now)
+            leased = self._copy(task)
+        leased['lease_token'] = token
+        return leased
+
+    def extend(self, task_id, token, visibility_timeout):
+        now = time.time()
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None or task['status'] != 'leased' or task['lease_token'] != token:
+                return False
+            task.update(available_at=now + visibility_timeout, updated_at=now)
+            return True
+
+    def complete(self, task_id, token, result):
+        now = time.time()
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None or task['status'] == 'done':
+                return False
+            task.update(status='done', result=json.dumps(result, ensure_ascii=False), error=None, lease_token=None,
+                        available_at=now, updated_at=now)
+            return True
+
+    def fail(self, task_id, token, error):
+        now = time.time()
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None or task['status'] != 'leased' or task['lease_token'] != token:
+                return None
+            status = 'dead' if task['attempts'] >= task['max_attempts'] else 'queued'
+            task.update(status=status, error=error, lease_token=None,
+                        available_at=self._retry_at(task['attempts'], now), updated_at=now)
+            return status
+
+    def redrive(self):
+        now = time.time()
+        with self._lock:
+            active = {task['key'] for task in self._tasks.values() if task['status'] in ('queued', 'leased')}
+            count = 0
+            # Newest first, so a product that died more than once is requeued as its newest task
+            for task_id, task in sorted(self._tasks.items(), key=lambda item: item[1]['created_at'], reverse=True):
+                if task['status'] != 'dead':
+                    continue
+                if task['key'] in active:
+                    del self._tasks[task_id]
+                    continue
+                task.update(status='queued', attempts=0, available_at=now, updated_at=now)
+                active.add(task['key'])
+                count += 1
+            return count
+
+    def get_many(self, task_ids):
+        with self._lock:
+            return {task_id: self._copy(self._tasks[task_id]) for task_id in task_ids if task_id in self._tasks}
+
+    def stats(self):
+        stats = {status: 0 for status in STATUSES}
+        with self._lock:
+            for task in self._tasks.values():
+                stats[task['status']] += 1
+        return stats
+
+
+# Redis keeps each task in a hash and the ids of queued and leased tasks in one sorted set scored by the time
+# they become available (a lease pushes that out to its expiry). Every state change is a Lua script, so it
+# is atomic across however many nodes share the server.
+REDIS_ENQUEUE = """
+local prefix, key, task_id, url, max_attempts, now = KEYS[1], ARGV[1], ARGV[2], ARGV[3], ARGV[4], ARGV[5]
+local existing = redis.call('HGET', prefix .. ':active', key)
+if existing then return existing end
+redis.call('HSET', prefix .. ':task:' .. task_id, 'id', task_id, 'url', url, 'key', key, 'status', 'queued',
+    'attempts', 0, 'max_attempts', max_attempts, 'available_at', now, 'created_at', now, 'updated_at', now)
+redis.call('HSET', prefix .. ':active', key, task_id)
+redis.call('ZADD', prefix .. ':available', now, task_id)
+redis.call('HINCRBY', prefix .. ':counts', 'queued', 1)
+return task_id
+"""
+
+REDIS_LEASE = """
+local prefix, now, expires, token, worker = KEYS[1], tonumber(ARGV[1]), ARGV[2], ARGV[3], ARGV[4]
+while true do
+    local ids = redis.call('ZRANGEBYSCORE', prefix .. ':available', '-inf', now, 'LIMIT', 0, 1)
+    if #ids == 0 then return false end
+    local task_id = ids[1]
+    local task = prefix .. ':task:' .. task_id
+    local status = redis.call('HGET', task, 'status')
+    local attempts = tonumber(redis.call('HGET', task, 'attempts'))
+    if status == 'leased' and attempts >= tonumber(redis.call('HGET', task, 'max_attempts')) then
+        redis.call('ZREM', prefix .. ':available', task_id)
+        redis.call('HDEL', prefix .. ':active', redis.call('HGET', task, 'key'))
+        redis.call('HSET', task, 'status', 'dead', 'error', 'Lease expired on the last attempt', 'updated_at', now)
+        redis.call('HINCRBY', prefix .. ':counts', 'leased', -1)
+        redis.call('HINCRBY', prefix .. ':counts', 'dead', 1)
+    else
+        redis.call('HSET', task, 'status', 'leased', 'attempts', attempts + 1, 'available_at', expires,
+            'lease_token', token, 'worker', worker, 'updated_at', now)
+        redis.call('ZADD', prefix .. ':available', expires, task_id)
+        if status == 'queued' then
+            redis.call('HINCRBY', prefix .. ':counts', 'queued', -1)
+            redis.call('HINCRBY', prefix .. ':counts', 'leased', 1)
+        end
+        return task_id
+    end
+end
+"""
+
+REDIS_EXTEND = """
+local prefix, task_id, token, expires, now = KEYS[1], ARGV[1], ARGV[2], ARGV[3], ARGV[4]
+local task = prefix .. ':task:' .. task_id
+if redis.call('HGET', task, 'status') ~= 'leased' or redis.call('HGET', task, 'lease_token') ~= token then return 0 end
+redis.call('HSET', task, 'available_at', expires, 'updated_at', now)
+redis.call('ZADD', prefix .. ':available', expires, task_id)
+return 1
+"""
+
+REDIS_COMPLETE = """
+local prefix, task_id, result, now, ttl = KEYS[1], ARGV[1], ARGV[2], ARGV[3], tonumber(ARGV[4])
+local task = prefix .. ':task:' .. task_id
+local status = redis.call('HGET', task, 'status')
+if not status or status == 'done' then return 0 end
+if status ~= 'dead' then redis.call('HDEL', prefix .. ':active', redis.call('HGET', task, 'key')) end
+redis.call('ZREM', prefix .. ':available', task_id)
+redis.call('HSET', task, 'status', 'done', 'result', result, 'available_at', now, 'updated_at', now)
+redis.call('HDEL', task, 'error', 'lease_token')
+redis.call('HINCRBY', prefix .. ':counts', status, -1)
+redis.call('HINCRBY', prefix .. ':counts', 'done', 1)
+redis.call('EXPIRE', task, ttl)
+return 1
+"""
+
+REDIS_FAIL = """
+local prefix, task_id, token, error, now, retry_at = KEYS[1], ARGV[1], ARGV[2], ARGV[3], ARGV[4], ARGV[5]
+local task = prefix .. ':task:' .. task_id
+if redis.call('HGET', task, 'status') ~= 'leased' or redis.call('HGET', task, 'lease_token') ~= token then return false end
+local status = 'queued'
+if tonumber(redis.call('HGET', task, 'attempts')) >= tonumber(redis.call('HGET', task, 'max_attempts')) then
+    status = 'dead'
+    redis.call('ZREM', prefix .. ':available', task_id)
+    redis.call('HDEL', prefix .. ':active', redis.call('HGET', task, 'key'))
+else
+    redis.call('ZADD', prefix .. ':available', retry_at, task_id)
+end
+redis.call('HSET', task, 'status', status, 'error', error, 'available_at', retry_at, 'updated_at', now)
+redis.call('HDEL', task, 'lease_token')
+redis.call('HINCRBY', prefix .. ':counts', 'leased', -1)
+redis.call('HINCRBY', prefix .. ':counts', status, 1)
+return status
+"""
+
+
+class RedisWorkQueue(WorkQueue):
+    # For nodes on different machines: any Redis-compatible server (Redis, Valkey, KeyDB, ...) reachable by all
+    def __init__(self, url=None, prefix=None, client=None, **options):
+        super().__init__(**options)
+        if client is None:
+            # The redis package is only needed for this backend
+            import redis
+            client = redis.Redis.from_url(url or 'redis://localhost:6379/0')
+        self.redis = client
+        self.prefix = prefix or os.getenv('SCRAPER_QUEUE_PREFIX', 'scraper:queue')
+        self._enqueue = client.register_script(REDIS_ENQUEUE)
+        self._lease = client.register_script(REDIS_LEASE)
+        self._extend = client.register_script(REDIS_EXTEND)
+        self._complete = client.register_script(REDIS_COMPLETE)
+        self._fail = client.register_script(REDIS_FAIL)
+
+    @staticmethod
+    def _decode(value):
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    def enqueue(self, url, max_attempts=None):
+        task_id = self._decode(self._enqueue(keys=[self.prefix], args=[
+            task_key(url), uuid.uuid4().hex, url, max_attempts or self.max_attempts, time.time()]))
+        return self.get(task_id)
+
+    def lease(self, worker, visibility_timeout):
+        now = time.time()
+        token = uuid.uuid4().hex
+        task_id = self._lease(keys=[self.prefix], args=[now, now + visibility_timeout, token, worker])
+        if not task_id:
+            return None
+        task = self.get(self._decode(task_id))
+        task['lease_token'] = token
+        return task
+
+    def extend(self, task_id, token, visibility_timeout):
+        now = time.time()
+        return bool(self._extend(keys=[self.prefix], args=[task_id, token, now + visibility_timeout, now]))
+
+    def complete(self, task_id, token, result):
+        # Done tasks expire on their own after the result TTL
+        return bool(self._complete(keys=[self.prefix], args=[
+            task_id, json.dumps(result, ensure_ascii=False), time.time(), max(1, int(self.result_ttl))]))
+
+    def fail(self, task_id, token, error):
+        attempts = self.redis.hget(f'{self.prefix}:task:{task_id}', 'attempts')
+        now = time.time()
+        retry_at = self._retry_at(int(attempts or 1), now)
+        status = self._fail(keys=[self.prefix], args=[task_id, token, error, now, retry_at])
+        return self._decode(status) if status else None
+
+    def redrive(self):
+        now = time.time()
+        count = 0
+        dead = []
+        for key in self.redis.scan_iter(f'{self.prefix}:task:*'):
+            task = self.redis.hgetall(key)
+            if self._decode(task.get(b'status')) == 'dead':
+                dead.append((float(task[b'created_at']), key, task))
+        # Newest first, so a product that died more than once is requeued as its newest task
+        dead.sort(key=lambda entry: entry[0], reverse=True)
+        for _, key, task in dead:
+            task_id, product = self._decode(task[b'id']), self._decode(task[b'key'])
+            # A product queued again since it died keeps only the newer task
+            if not self.redis.hsetnx(f'{self.prefix}:active', product, task_id):
+                self.redis.delete(key)
+                self.redis.hincrby(f'{self.prefix}:counts', 'dead', -1)
+                continue
+            pipe = self.redis.pipeline()
+            pipe.hset(key, mapping={'status': 'queued', 'attempts': 0, 'available_at': now, 'updated_at': now})
+            pipe.zadd(f'{self.prefix}:available', {task_id: now})
+            pipe.hincrby(f'{self.prefix}:counts', 'dead', -1)
+            pipe.hincrby(f'{self.prefix}:counts', 'queued', 1)
+            pipe.execute()
+            count += 1
+        return count
+
+    def get_many(self, task_ids):
+        task_ids = list(task_ids)
+        pipe = self.redis.pipeline()
+        for task_id in task_ids:
+            pipe.hgetall(f'{self.prefix}:task:{task_id}')
+        tasks = {}
+        for task_id, values in zip(task_ids, pipe.execute()):
+            if not values:
+                continue
+            values = {self._decode(field): self._decode(value) for field, value in values.items()}
+            tasks[task_id] = _task_dict({column: values.get(column) for column in TASK_COLUMNS})
+        return tasks
+
+    def stats(self):
+        counts = self.redis.hgetall(f'{self.prefix}:counts')
+        stats = {status: 0 for status in STATUSES}
+        for status, count in counts.items():
+            stats[self._decode(status)] = int(count)
+        # Done tasks expire without a script running, so their count is only an upper bound
+        return stats
+
+
+def open_work_queue(location=None):
+    # sqlite:///path/to/queue.db (or a bare path), redis://host:6379/0, or memory:// for a process-local queue.
+    # None when no queue is configured, in which case everything is scraped in-process as before.
+    location = location or os.getenv('SCRAPER_WORK_QUEUE')
+    if not location:
+        return None
+    if location.startswith(('redis://', 'rediss://', 'unix://')):
+        try:
+            return RedisWorkQueue(location)
+        except ImportError:
+            raise ValueError("Redis work queues require the redis package")
+    if location.startswith('memory://'):
+        return MemoryWorkQueue()
+    if location.startswith('sqlite:///'):
+        location = location[len('sqlite:///'):]
+    return SQLiteWorkQueue(location)
+
+
+def task_job(task, include_result=True):
+    # A task in the shape of JobManager's Job.to_dict(), so the job API reads the same either way
+    status = JOB_STATUSES[task['status']]
+    events = [{'stage': 'queued', 'at': task['created_at']}]
+    if status != 'queued':
+        events.append({'stage': status, 'at': task['updated_at'], 'attempt': task['attempts']})
+    if task['error']:
+        events[-1]['error'] = task['error']
+    data = {
+        'job_id': task['id'],
+        'url': task['url'],
+        'status': status,
+        'stage': events[-1]['stage'],
+        'events': events,
+        'attempts': task['attempts'],
+        'created_at': task['created_at'],
+        'updated_at': task['updated_at'],
+    }
+    if task['error']:
+        data['error'] = task['error']
+    if include_result and task['status'] == 'done':
+        data['result'] = task['result']
+    return data
+
+
+def task_item(task, item):
+    # The scrape_batch-style result line for a finished task
+    if task['status'] == 'done':
+        item.update(ok=True, data=task['result'])
+    else:
+        item.update(ok=False, error=task['error'] or 'Failed to extract product details')
+    item['task_id'] = task['id']
+    if task['attempts'] > 1:
+        item['attempts'] = task['attempts']
+    return item
+
+
+def queue_batch(work_queue, urls, lookup=None, poll_interval=None):
+    # Same items as scrape_batch, in completion order, but scraped by worker nodes pulling from work_queue.
+    # URLs are enqueued as they arrive (a crawl produces them gradually) while finished tasks are polled.
+    poll_interval = poll_interval or float(os.getenv('SCRAPER_QUEUE_POLL_INTERVAL', '1'))
+    answered = queue.Queue()  # items settled without a worker, and enqueued (task id, item) pairs
+    enqueued = threading.Event()
+    stopped = threading.Event()
+
+    def enqueue_all():
+        try:
+            for index, url in enumerate(urls):
+                if stopped.is_set():
+                    return
+                item = {'index': index, 'url': url, 'asin': extract_asin(url)}
+                error = validate_url(url)
+                cached = None if error or not lookup else lookup(url)
+                if error:
+                    answered.put((None, dict(item, ok=False, error=error)))
+                elif cached:
+                    answered.put((None, dict(item, ok=True, data=cached, cached=True)))
+                else:
+                    answered.put((work_queue.enqueue(url)['id'], item))
+        except Exception as e:
+            print(f"Error enqueueing batch: {e}", file=sys.stderr)
+        finally:
+            enqueued.set()
+
+    threading.Thread(target=enqueue_all, name='batch-enqueue', daemon=True).start()
+    outstanding = {}
+    try:
+        while True:
+            finished = enqueued.is_set()
+            while True:
+                try:
+                    task_id, item = answered.get_nowait()
+                except queue.Empty:
+                    break
+                if task_id is None:
+                    yield item
+                else:
+                    outstanding.setdefault(task_id, []).append(item)
+            if outstanding:
+                for task_id, task in work_queue.get_many(list(outstanding)).items():
+                    if task['status'] in ('done', 'dead'):
+                        # The same product listed twice shares one task
+                        for item in outstanding.pop(task_id):
+                            yield task_item(task, item)
+            if finished and not outstanding and answered.empty():
+                return
+            time.sleep(poll_interval)
+    finally:
+        stopped.set()
+
+
+class _Leases:
+    # Leases held by this node's workers, renewed by one heartbeat thread well before they expire
+    def __init__(self, work_queue, visibility_timeout):
+        self.work_queue = work_queue
+        self.visibility_timeout = visibility_timeout
+        self._lock = threading.Lock()
+        self._held = {}
+
+    def hold(self, task):
+        with self._lock:
+            self._held[task['id']] = task['lease_token']
+
+    def release(self, task):
+        with self._lock:
+            self._held.pop(task['id'], None)
+
+    def run(self, stop):
+        while not stop.wait(self.visibility_timeout / 3):
+            with self._lock:
+                held = list(self._held.items())
+            for task_id, token in held:
+                try:
+                    if not self.work_queue.extend(task_id, token, self.visibility_timeout):
+                        print(f"Lost the lease on task {task_id}", file=sys.stderr)
+                        self.release({'id': task_id})
+                except Exception as e:
+                    print(f"Error renewing lease on task {task_id}: {e}", file=sys.stderr)
+
+
+def run_worker(work_queue, worker_id, scraper, leases, snapshot_store, stop, drain=False, poll_interval=1.0):
+    # One worker thread: lease a URL, scrape it, write the result, until stopped (or, with drain, until
+    # nothing is queued or running any more)
+    processed = 0
+    while not stop.is_set():
+        task = work_queue.lease(worker_id, leases.visibility_timeout)
+        if task is None:
+            if drain:
+                stats = work_queue.stats()
+                if not stats['queued'] and not stats['leased']:
+                    return processed
+            stop.wait(poll_interval)
+            continue
+
+        leases.hold(task)
+        try:
+            data = scraper.extract_product_details(task['url'])
+        except Exception as e:
+            data = None
+            print(f"Error scraping {task['url']}: {e}", file=sys.stderr)
+        finally:
+            leases.release(task)
+        processed += 1
+
+        if data:
+            # Only the first result for a task is kept, and only that one is recorded in the snapshot history
+            if work_queue.complete(task['id'], task['lease_token'], data):
+                snapshot_store.append(data, url=task['url'])
+            print(f"{task['url']}: done (attempt {task['attempts']})", file=sys.stderr)
+        else:
+            error = f"Blocked by Amazon ({scraper.block_reason})" if scraper.block_reason else 'Failed to extract product details'
+            status = work_queue.fail(task['id'], task['lease_token'], error)
+            print(f"{task['url']}: {error}, {'retrying later' if status == 'queued' else status or 'lease lost'}", file=sys.stderr)
+    return processed
+
+
+def run_worker_cli(args):
+    work_queue = open_work_queue(args.queue)
+    if work_queue is None:
+        print("No work queue given (--queue or SCRAPER_WORK_QUEUE)", file=sys.stderr)
+        return 1
+    workers = args.workers or int(os.getenv('SCRAPER_QUEUE_WORKERS', '2'))
+    visibility_timeout = args.visibility_timeout or float(os.getenv('SCRAPER_QUEUE_VISIBILITY_TIMEOUT', '300'))
+    node = f"{socket.gethostname()}:{os.getpid()}"
+    poll_interval = float(os.getenv('SCRAPER_QUEUE_POLL_INTERVAL', '1'))
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    leases = _Leases(work_queue, visibility_timeout)
+    heartbeat_stop = threading.Event()
+    heartbeat = threading.Thread(target=leases.run, args=(heartbeat_stop,), name='lease-heartbeat', daemon=True)
+    heartbeat.start()
+    snapshot_store = SnapshotStore(args.db)
+    # Each worker thread keeps its own scraper (and browser); they share the process's rate controller
+    scrapers = [AmazonTVScraper(fetch_mode=args.fetch_mode, section_store=snapshot_store) for _ in range(workers)]
+    processed = [0] * workers
+
+    def work(index):
+        processed[index] = run_worker(work_queue, f"{node}/{index}", scrapers[index], leases, snapshot_store, stop,
+                                      drain=args.drain, poll_interval=poll_interval)
+
+    threads = [threading.Thread(target=work, args=(index,), name=f'queue-worker-{index}') for index in range(workers)]
+    print(f"Worker {node} pulling from {args.queue or os.getenv('SCRAPER_WORK_QUEUE')} with {workers} scrapers", file=sys.stderr)
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(1)
+    except KeyboardInterrupt:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        heartbeat_stop.set()
+        for scraper in scrapers:
+            scraper.close()
+        snapshot_store.close()
+        work_queue.close()
+    print(f"Worker {node} processed {sum(processed)} tasks", file=sys.stderr)
+    return 0
+
+
+def run_enqueue_cli(args):
+    work_queue = open_work_queue(args.queue)
+    if work_queue is None:
+        print("No work queue given (--queue or SCRAPER_WORK_QUEUE)", file=sys.stderr)
+        return 1
+    try:
+        if args.redrive:
+            print(f"Requeued {work_queue.redrive()} dead tasks", file=sys.stderr)
+        urls = list(args.urls)
+        if args.file:
+            with open(args.file, 'r', encoding='utf-8') as f:
+                urls.extend(read_urls(f))
+        for url in urls:
+            error = validate_url(url)
+            if error:
+                print(f"{url}: {error}", file=sys.stderr)
+                continue
+            task = work_queue.enqueue(url)
+            print(json.dumps({'task_id': task['id'], 'url': url, 'status': task['status']}))
+        print(json.dumps(work_queue.stats()), file=sys.stderr)
+    finally:
+        work_queue.close()
+    return 0
@@ -0,0 +1,65 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only be imported once a request actually needs them
+DEFERRED_MODULES = ('pandas', 'selenium.webdriver', 'webdriver_manager', 'requests', 'bs4', 'PIL')
+
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$')
+
+
+def measure(module, runs):
+    # Cumulative import time of module in microseconds for each fresh interpreter, plus
+    # every module the last run imported along the way
+    timings = []
+    imported = set()
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            cwd=ROOT, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+        imported = set()
+        for line in result.stderr.splitlines():
+            match = IMPORTTIME_RE.match(line)
+            if not match:
+                continue
+            imported.add(match.group(4))
+            if match.group(4) == module and len(match.group(3)) == 1:
+                timings.append(int(match.group(2)))
+    return timings, imported
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the cold start import time of the web app")
+    parser.add_argument('--module', default='app', help="Module to import (default: app)")
+    parser.add_argument('--budget', type=float, default=float(os.getenv('SCRAPER_IMPORT_BUDGET', '0.5')),
+                        help="Maximum median import time in seconds (default: 0.5 or SCRAPER_IMPORT_BUDGET)")
+    parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters to time (default: 5)")
+    args = parser.parse_args(argv)
+
+    timings, imported = measure(args.module, args.runs)
+    if not timings:
+        print(f"No import time reported for {args.module}")
+        return 1
+    median = sorted(timings)[len(timings) // 2] / 1e6
+    print(f"import {args.module}: median {median:.3f}s over {len(timings)} runs (budget {args.budget:.3f}s)")
+
+    failed = False
+    eager = sorted(name for name in DEFERRED_MODULES if name in imported)
+    if eager:
+        print(f"Imported at startup but should be deferred: {', '.join(eager)}")
+        failed = True
+    if median > args.budget:
+        print(f"Import time over budget by {median - args.budget:.3f}s")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
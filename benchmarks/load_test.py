@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from mock_amazon import mock_asin
+
+CHROME_PROCESS_NAMES = ('chrome', 'chromium', 'chromium-browser', 'headless_shell', 'chromedriver')
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def _chrome_pids():
+    pids = []
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/comm', 'r') as f:
+                comm = f.read().strip()
+        except OSError:
+            continue
+        if comm.lower().startswith(CHROME_PROCESS_NAMES):
+            pids.append(name)
+    return pids
+
+
+def sample_chrome():
+    # (total RSS in bytes, total CPU seconds) over every Chrome process on this machine; Linux only
+    rss = 0
+    cpu_ticks = 0
+    for pid in _chrome_pids():
+        try:
+            with open(f'/proc/{pid}/statm', 'r') as f:
+                rss += int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+            with open(f'/proc/{pid}/stat', 'r') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            # utime and stime are fields 14 and 15 of /proc/<pid>/stat
+            cpu_ticks += int(fields[11]) + int(fields[12])
+        except (OSError, IndexError, ValueError):
+            continue
+    return rss, cpu_ticks / os.sysconf('SC_CLK_TCK')
+
+
+class ChromeMonitor:
+    # Samples Chrome memory in the background while a concurrency level runs
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.available = os.path.isdir('/proc')
+        self._stop = threading.Event()
+        self._thread = None
+        self.rss_samples = []
+        self.cpu_start = self.cpu_end = 0.0
+
+    def __enter__(self):
+        if self.available:
+            self.cpu_start = sample_chrome()[1]
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.rss_samples.append(sample_chrome()[0])
+
+    def __exit__(self, *exc):
+        if self.available:
+            self._stop.set()
+            self._thread.join()
+            self.rss_samples.append(sample_chrome()[0])
+            self.cpu_end = sample_chrome()[1]
+        return False
+
+    @property
+    def cpu_seconds(self):
+        # Processes that exited during the run (recycled browsers) take their CPU time with them
+        return max(0.0, self.cpu_end - self.cpu_start)
+
+
+def scrape(session, target, url):
+    start = time.perf_counter()
+    try:
+        response = session.post(f'{target}/scrape?timings=1', json={'url': url}, timeout=300)
+        ok = response.status_code == 200
+        body = response.json() if ok else {}
+        status = response.status_code
+    except requests.RequestException as e:
+        ok, body, status = False, {}, type(e).__name__
+    return {'ok': ok, 'status': status, 'seconds': time.perf_counter() - start, 'timings': body.get('timings') or {}}
+
+
+def run_level(target, urls, concurrency):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+    session.mount('http://', adapter)
+
+    with ChromeMonitor() as monitor:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(lambda url: scrape(session, target, url), urls))
+        elapsed = time.perf_counter() - start
+
+    latencies = [result['seconds'] for result in results if result['ok']]
+    ok = len(latencies)
+    stages = {}
+    for result in results:
+        for stage, seconds in result['timings'].items():
+            stages.setdefault(stage, []).append(seconds)
+
+    report = {
+        'concurrency': concurrency,
+        'requests': len(results),
+        'ok': ok,
+        'errors': {},
+        'seconds': round(elapsed, 3),
+        'throughput_per_s': round(ok / elapsed, 3) if elapsed else None,
+        'p50_s': percentile(latencies, 0.50),
+        'p95_s': percentile(latencies, 0.95),
+        'p99_s': percentile(latencies, 0.99),
+        'stage_p50_s': {stage: round(percentile(values, 0.50), 4) for stage, values in sorted(stages.items())},
+    }
+    for result in results:
+        if not result['ok']:
+            report['errors'][str(result['status'])] = report['errors'].get(str(result['status']), 0) + 1
+    if monitor.available and max(monitor.rss_samples) > 0:
+        report['chrome_peak_rss_mb'] = round(max(monitor.rss_samples) / 1024 / 1024, 1)
+        report['chrome_mean_rss_mb'] = round(sum(monitor.rss_samples) / len(monitor.rss_samples) / 1024 / 1024, 1)
+        report['chrome_cpu_s_per_product'] = round(monitor.cpu_seconds / ok, 3) if ok else None
+    return report
+
+
+def _format(value, unit=''):
+    if value is None:
+        return '-'
+    return f'{value:.3f}{unit}' if isinstance(value, float) else f'{value}{unit}'
+
+
+def print_table(reports):
+    columns = [('concurrency', 'conc'), ('ok', 'ok'), ('requests', 'reqs'), ('throughput_per_s', 'req/s'),
+               ('p50_s', 'p50 s'), ('p95_s', 'p95 s'), ('p99_s', 'p99 s'),
+               ('chrome_peak_rss_mb', 'peak RSS MB'), ('chrome_cpu_s_per_product', 'CPU s/product')]
+    rows = [[label for _, label in columns]]
+    rows += [[_format(report.get(key)) for key, _ in columns] for report in reports]
+    widths = [max(len(row[index]) for row in rows) for index in range(len(columns))]
+    for row in rows:
+        print('  '.join(cell.rjust(width) for cell, width in zip(row, widths)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test POST /scrape against the local Amazon stand-in")
+    parser.add_argument('--target', default='http://127.0.0.1:5000', help="Base URL of the running web app")
+    parser.add_argument('--concurrency', default='1,2,4', help="Comma-separated concurrency levels (default: 1,2,4)")
+    parser.add_argument('--requests', type=int, default=20, help="Requests per concurrency level (default: 20)")
+    parser.add_argument('--product-base', default='http://www.amazon.in',
+                        help="Scheme and host of the product URLs; leave it unless the app reaches the stand-in some other way")
+    parser.add_argument('--repeat', action='store_true',
+                        help="Reuse the same ASINs on every level, so later levels measure cache hits")
+    parser.add_argument('--asin-offset', type=int, default=0,
+                        help="First mock ASIN number; change it (or restart the app) so a rerun isn't served from the result cache")
+    parser.add_argument('--json', help="Also write the reports here as JSON")
+    args = parser.parse_args(argv)
+
+    levels = [int(level) for level in args.concurrency.split(',')]
+    reports = []
+    offset = args.asin_offset
+    for concurrency in levels:
+        # Fresh ASINs per level keep the result cache from answering instead of the scraper
+        urls = [f'{args.product_base}/dp/{mock_asin(offset + index)}' for index in range(args.requests)]
+        if not args.repeat:
+            offset += args.requests
+        print(f"Running {len(urls)} requests at concurrency {concurrency}...", file=sys.stderr)
+        reports.append(run_level(args.target, urls, concurrency))
+
+    print_table(reports)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2)
+    return 0 if all(report['ok'] == report['requests'] for report in reports) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
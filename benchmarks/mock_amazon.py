@@ -0,0 +1,193 @@
+import argparse
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pages')
+
+ASIN_PATH_RE = re.compile(r'/(?:dp|gp/product)/([A-Z0-9]{10})(?:[/?]|$)', re.IGNORECASE)
+SIDESHEET_PATH_RE = re.compile(r'^/sidesheet/([A-Z0-9]{10})$', re.IGNORECASE)
+RESULTS_PER_PAGE = 16
+
+# Served instead of a product page when clients go over --max-concurrent, like Amazon's robot check
+CAPTCHA_PAGE = (
+    '<!doctype html><html><head><title dir="ltr">Amazon.in</title></head><body>'
+    '<h4>Type the characters you see in this image:</h4>'
+    '<form method="get" action="/errors/validateCaptcha"><input type="text" id="captchacharacters" name="field-keywords">'
+    '<button type="submit">Continue shopping</button></form></body></html>'
+)
+
+
+def load_pages(pages_dir=PAGES_DIR):
+    # {asin: (product page, side sheet fragment)} for every recorded page
+    pages = {}
+    for name in sorted(os.listdir(pages_dir)):
+        if not name.endswith('.html') or name.endswith('.sidesheet.html'):
+            continue
+        asin = name[:-len('.html')]
+        with open(os.path.join(pages_dir, name), 'r', encoding='utf-8') as f:
+            page = f.read()
+        sidesheet_path = os.path.join(pages_dir, f'{asin}.sidesheet.html')
+        sidesheet = ''
+        if os.path.exists(sidesheet_path):
+            with open(sidesheet_path, 'r', encoding='utf-8') as f:
+                sidesheet = f.read()
+        pages[asin] = (page, sidesheet)
+    return pages
+
+
+def mock_asin(index):
+    return f'B0M{index:07d}'
+
+
+class MockAmazon:
+    def __init__(self, pages, latency=0.0, jitter=0.0, sidesheet_latency=None, pad_kb=0, listing_pages=5, seed=None, max_concurrent=None):
+        self.pages = pages
+        self.recorded = sorted(pages)
+        self.latency = latency
+        self.jitter = jitter
+        self.sidesheet_latency = latency if sidesheet_latency is None else sidesheet_latency
+        # Real product pages are a couple of megabytes, mostly inline script
+        self.padding = f"<script>/*{'x' * (pad_kb * 1024)}*/</script>\n" if pad_kb else ''
+        self.listing_pages = listing_pages
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        # Product page requests beyond this many at once get the CAPTCHA page
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0
+        self.captchas = 0
+
+    def enter(self):
+        # False when this product page request is over the concurrency limit and should be refused
+        with self._lock:
+            self.in_flight += 1
+            if self.max_concurrent and self.in_flight > self.max_concurrent:
+                self.captchas += 1
+                return False
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def delay(self, base):
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0
+        time.sleep(max(0.0, base + jitter))
+
+    def _recorded_for(self, asin):
+        # Unknown ASINs (e.g. the B0M load-test range) are served one of the recorded pages
+        if asin in self.pages:
+            return asin
+        return self.recorded[sum(map(ord, asin)) % len(self.recorded)]
+
+    def product_page(self, asin):
+        recorded = self._recorded_for(asin)
+        page = self.pages[recorded][0].replace(recorded, asin)
+        return page.replace('</body>', self.padding + '</body>', 1)
+
+    def sidesheet(self, asin):
+        return self.pages[self._recorded_for(asin)][1]
+
+    def listing(self, page_number):
+        results = ''.join(
+            f'<div data-asin="{mock_asin(index)}" data-index="{index}" data-component-type="s-search-result">'
+            f'<h2><a href="/Mock-TV-{index}/dp/{mock_asin(index)}/ref=sr_1_{index}?keywords=tv">Mock TV {index}</a></h2></div>'
+            for index in range((page_number - 1) * RESULTS_PER_PAGE, page_number * RESULTS_PER_PAGE)
+        )
+        if page_number < self.listing_pages:
+            pagination = f'<a class="s-pagination-item s-pagination-next" href="/s?k=tv&page={page_number + 1}">Next</a>'
+        else:
+            pagination = '<span class="s-pagination-item s-pagination-next s-pagination-disabled">Next</span>'
+        return f'<!doctype html><html><body><div class="s-main-slot">{results}</div>{pagination}</body></html>'
+
+
+def make_handler(mock):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            # As a proxy the request line carries the absolute URL; as a server just the path
+            url = urlsplit(self.path)
+            path = url.path or '/'
+
+            match = SIDESHEET_PATH_RE.match(path)
+            if match:
+                mock.delay(mock.sidesheet_latency)
+                return self._send(200, mock.sidesheet(match.group(1).upper()))
+            match = ASIN_PATH_RE.search(path)
+            if match:
+                allowed = mock.enter()
+                try:
+                    mock.delay(mock.latency)
+                    if not allowed:
+                        return self._send(503, CAPTCHA_PAGE)
+                    return self._send(200, mock.product_page(match.group(1).upper()))
+                finally:
+                    mock.leave()
+            if path == '/s':
+                mock.delay(mock.latency)
+                page_number = int(parse_qs(url.query).get('page', ['1'])[0])
+                return self._send(200, mock.listing(page_number))
+            # Images, scripts and anything else a browser asks for: answered without leaving the machine
+            self._send(404, '', content_type='text/plain')
+
+        def do_CONNECT(self):
+            # HTTPS (e.g. the image CDN) can't be served locally, so refuse instead of tunnelling out
+            self._send(403, '', content_type='text/plain')
+
+        def _send(self, status, body, content_type='text/html; charset=utf-8'):
+            data = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(host='127.0.0.1', port=8800, **options):
+    mock = MockAmazon(load_pages(), **options)
+    server = ThreadingHTTPServer((host, port), make_handler(mock))
+    server.daemon_threads = True
+    return server, mock
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve recorded Amazon product pages locally, as a web server or HTTP proxy")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8800)
+    parser.add_argument('--latency', type=float, default=0.2, help="Seconds added to every page response (default: 0.2)")
+    parser.add_argument('--jitter', type=float, default=0.05, help="Uniform +/- seconds of jitter on the latency (default: 0.05)")
+    parser.add_argument('--sidesheet-latency', type=float, help="Seconds added to side sheet responses (default: --latency)")
+    parser.add_argument('--pad-kb', type=int, default=0, help="Inline script padding per product page, in KB, to mimic real page weight")
+    parser.add_argument('--listing-pages', type=int, default=5, help="Pages of mock search results (default: 5)")
+    parser.add_argument('--seed', type=int, help="Seed for the jitter, for repeatable runs")
+    parser.add_argument('--max-concurrent', type=int, help="Answer product page requests beyond this many at once with a CAPTCHA page")
+    args = parser.parse_args(argv)
+
+    server, mock = serve(args.host, args.port, latency=args.latency, jitter=args.jitter,
+                         sidesheet_latency=args.sidesheet_latency, pad_kb=args.pad_kb,
+                         listing_pages=args.listing_pages, seed=args.seed, max_concurrent=args.max_concurrent)
+    print(f"Serving {len(mock.pages)} recorded pages on http://{args.host}:{args.port} "
+          f"(set SCRAPER_PROXY=http://{args.host}:{args.port} and scrape http://www.amazon.in/dp/<ASIN>)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -20,7 +20,7 @@ document.addEventListener('DOMContentLoaded', function () {
         scrapeBtn.disabled = true;
 
         try {
-            const response = await fetch('/scrape', {
+            const response = await fetch('/jobs', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -28,27 +28,106 @@ document.addEventListener('DOMContentLoaded', function () {
                 body: JSON.stringify({ url: url })
             });
 
-            const data = await response.json();
+            const job = await response.json();
 
             if (!response.ok) {
-                throw new Error(data.error || 'Failed to scrape TV details');
+                throw new Error(job.error || 'Failed to scrape TV details');
             }
 
+            const data = await waitForJob(job);
             displayResults(data);
         } catch (error) {
             showError(error.message);
         } finally {
             loadingDiv.classList.add('d-none');
+            loadingText.textContent = stageMessages.queued;
             scrapeBtn.disabled = false;
         }
     });
 
+    const loadingText = loadingDiv.querySelector('p');
+    const stageMessages = {
+        queued: 'Scraping TV details...',
+        started: 'Opening the product page...',
+        page_loaded: 'Page loaded, reading product details...',
+        bank_offers_done: 'Bank offers collected...',
+        sections_extracted: 'Specifications extracted, writing summary...',
+        images_done: 'Preparing product images...',
+        cache_hit: 'Found recent product details...'
+    };
+
+    function showStage(stage) {
+        if (stageMessages[stage]) {
+            loadingText.textContent = stageMessages[stage];
+        }
+    }
+
+    // Follow the job over Server-Sent Events, falling back to polling if the stream breaks
+    function waitForJob(job) {
+        return new Promise((resolve, reject) => {
+            const finish = (state) => {
+                if (state.status === 'done') {
+                    resolve(state.result);
+                } else {
+                    reject(new Error(state.error || 'Failed to scrape TV details'));
+                }
+            };
+
+            if (!window.EventSource) {
+                pollJob(job.status_url).then(finish, reject);
+                return;
+            }
+
+            const source = new EventSource(job.events_url);
+            ['started', 'page_loaded', 'bank_offers_done', 'sections_extracted', 'images_done', 'cache_hit'].forEach(stage => {
+                source.addEventListener(stage, () => showStage(stage));
+            });
+            source.addEventListener('result', (event) => {
+                source.close();
+                finish(JSON.parse(event.data));
+            });
+            source.onerror = () => {
+                source.close();
+                pollJob(job.status_url).then(finish, reject);
+            };
+        });
+    }
+
+    async function pollJob(statusUrl) {
+        while (true) {
+            const response = await fetch(statusUrl);
+            const state = await response.json();
+            if (!response.ok) {
+                throw new Error(state.error || 'Failed to scrape TV details');
+            }
+            showStage(state.stage);
+            if (state.status === 'done' || state.status === 'failed') {
+                return state;
+            }
+            await new Promise(resolve => setTimeout(resolve, 2000));
+        }
+    }
+
     function showError(message) {
         errorDiv.textContent = message;
         errorDiv.classList.remove('d-none');
         resultsDiv.classList.add('d-none');
     }
 
+    // Cached WebP thumbnails when the server has them, Amazon's full-size image otherwise
+    function imageTag(data, image, alt) {
+        const cached = data.image_thumbnails && data.image_thumbnails[image];
+        if (!cached) {
+            return `<img src="${image}" class="d-block w-100" alt="${alt}">`;
+        }
+        const variants = Object.entries(cached.thumbnails).sort((a, b) => a[0] - b[0]);
+        const srcset = variants.map(([size, path]) => `${path} ${size}w`).join(', ');
+        const largest = variants[variants.length - 1][1];
+        // Thumbnails 404 when the pipeline couldn't download the image; fall back to Amazon's original
+        const fallback = "this.onerror=null; this.removeAttribute('srcset'); this.src=this.dataset.original;";
+        return `<img src="${largest}" srcset="${srcset}" sizes="(max-width: 768px) 100vw, 50vw" data-original="${image}" onerror="${fallback}" class="d-block w-100" alt="${alt}" loading="lazy">`;
+    }
+
     function displayResults(data) {
         // Show results container
         resultsDiv.classList.remove('d-none');
@@ -59,7 +138,7 @@ document.addEventListener('DOMContentLoaded', function () {
         data.product_images.forEach((image, index) => {
             const div = document.createElement('div');
             div.className = `carousel-item ${index === 0 ? 'active' : ''}`;
-            div.innerHTML = `<img src="${image}" class="d-block w-100" alt="Product Image ${index + 1}">`;
+            div.innerHTML = imageTag(data, image, `Product Image ${index + 1}`);
             carouselInner.appendChild(div);
         });
 
@@ -70,7 +149,7 @@ document.addEventListener('DOMContentLoaded', function () {
             data.manufacturer_images.forEach((image, index) => {
                 const div = document.createElement('div');
                 div.className = `carousel-item ${index === 0 ? 'active' : ''}`;
-                div.innerHTML = `<img src="${image}" class="d-block w-100" alt="Manufacturer Image ${index + 1}">`;
+                div.innerHTML = imageTag(data, image, `Manufacturer Image ${index + 1}`);
                 manufacturerCarousel.appendChild(div);
             });
             document.querySelector('#manufacturer-images').closest('.card').classList.remove('d-none');
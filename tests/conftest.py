@@ -0,0 +1,23 @@
+import json
+import os
+
+import pytest
+
+from backend.snapshot_store import SnapshotStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_PRODUCT = os.path.join(ROOT, 'tv_details_20250410_040412.json')
+
+
+@pytest.fixture
+def sample_product():
+    # A real scrape, with the U+200E marks Amazon puts in front of every product_information value
+    with open(SAMPLE_PRODUCT, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def snapshot_store(tmp_path):
+    store = SnapshotStore(str(tmp_path / 'snapshots.db'))
+    yield store
+    store.close()
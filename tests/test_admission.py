@@ -0,0 +1,131 @@
+import threading
+import time
+
+import pytest
+
+from backend.admission import AdmissionController, AdmissionRejected
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def start_waiter(controller, client, order, **kwargs):
+    def run():
+        weight = controller.acquire(client, **kwargs)
+        order.append(client)
+        controller.release(weight, background=not kwargs.get('bounded', True))
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_admits_up_to_limit_then_queues():
+    controller = AdmissionController(limit=2, queue_size=4, max_wait=5, per_client=2)
+    assert controller.acquire('a') == 1
+    assert controller.acquire('b') == 1
+    order = []
+    thread = start_waiter(controller, 'c', order)
+    wait_for(lambda: controller.stats()['waiting'] == 1)
+    assert order == []
+    controller.release()
+    thread.join(2)
+    assert order == ['c']
+    assert controller.stats()['running'] == 1
+
+
+def test_rejects_full_queue_and_busy_client():
+    controller = AdmissionController(limit=1, queue_size=2, max_wait=5, per_client=1)
+    weight = controller.acquire('a')
+    order = []
+    threads = [start_waiter(controller, 'a', order)]
+    wait_for(lambda: controller.stats()['waiting'] == 1)
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire('a')
+    assert rejected.value.status == 429
+    threads.append(start_waiter(controller, 'b', order))
+    wait_for(lambda: controller.stats()['waiting'] == 2)
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire('c')
+    assert rejected.value.status == 503 and rejected.value.retry_after >= 1
+    controller.release(weight)
+    for thread in threads:
+        thread.join(2)
+    assert sorted(order) == ['a', 'b']
+    stats = controller.stats()
+    assert stats['rejected_client'] == 1 and stats['rejected_full'] == 1
+
+
+def test_timed_out_waiter_leaves_the_queue():
+    controller = AdmissionController(limit=1, queue_size=4, max_wait=5, per_client=2)
+    weight = controller.acquire('a')
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire('b', max_wait=0.05)
+    assert rejected.value.status == 503
+    assert controller.stats()['waiting'] == 0 and controller.stats()['timed_out'] == 1
+    controller.release(weight)
+    assert controller.acquire('b', max_wait=0) == 1
+
+
+def test_round_robin_across_clients():
+    controller = AdmissionController(limit=1, queue_size=8, max_wait=5, per_client=4)
+    weight = controller.acquire('holder')
+    order = []
+    threads = []
+    for client in ('a', 'a', 'a', 'b'):
+        threads.append(start_waiter(controller, client, order))
+        wait_for(lambda: controller.stats()['waiting'] == len(threads))
+    controller.release(weight)
+    for thread in threads:
+        thread.join(2)
+    assert order == ['a', 'b', 'a', 'a']
+
+
+def test_weight_is_capped_at_limit_and_unbounded_waits():
+    controller = AdmissionController(limit=3, queue_size=0, max_wait=0, per_client=1)
+    assert controller.acquire('batch', weight=10) == 3
+    order = []
+    thread = start_waiter(controller, 'job', order, bounded=False)
+    wait_for(lambda: controller.stats()['background_waiting'] == 1)
+    controller.release(3)
+    thread.join(2)
+    assert order == ['job']
+
+
+def test_admit_releases_and_tracks_service_time():
+    controller = AdmissionController(limit=1, queue_size=4, max_wait=5, per_client=2)
+    with controller.admit('a'):
+        assert controller.stats()['running'] == 1
+    assert controller.stats()['running'] == 0
+    assert controller.retry_after() == 1
+
+
+def test_background_work_leaves_slots_for_interactive_requests():
+    controller = AdmissionController(limit=4, queue_size=1, max_wait=5, per_client=1, background_limit=2)
+    held = [controller.acquire('jobs', bounded=False) for _ in range(2)]
+    order = []
+    # More background work waits outside the bounded queue, so it can't fill it up
+    threads = [start_waiter(controller, 'jobs', order, bounded=False) for _ in range(3)]
+    wait_for(lambda: controller.stats()['background_waiting'] == 3)
+    assert controller.stats()['waiting'] == 0
+    # The slots beyond the background limit stay free for interactive requests
+    assert controller.acquire('a', max_wait=0) == 1
+    assert controller.acquire('b', max_wait=0) == 1
+    thread = start_waiter(controller, 'c', order)
+    wait_for(lambda: controller.stats()['waiting'] == 1)
+    controller.release()
+    thread.join(2)
+    assert order == ['c']
+    assert controller.stats()['background_waiting'] == 3
+    # Background work goes on as its own slots come back
+    for weight in held:
+        controller.release(weight, background=True)
+    for waiter in threads:
+        waiter.join(2)
+    assert order == ['c', 'jobs', 'jobs', 'jobs']
+    controller.release()
+    stats = controller.stats()
+    assert stats['running'] == 0 and stats['background_running'] == 0
@@ -0,0 +1,18 @@
+from backend.batch import batch_worker_count, scrape_batch
+
+
+def test_workers_are_capped_at_batch_browsers(monkeypatch):
+    monkeypatch.setenv('SCRAPER_BATCH_MAX_BROWSERS', '3')
+    monkeypatch.setenv('SCRAPER_BATCH_WORKERS', '2')
+    assert batch_worker_count() == 2
+    assert batch_worker_count(8) == 3
+    monkeypatch.setenv('SCRAPER_BATCH_WORKERS', '16')
+    assert batch_worker_count() == 3
+
+
+def test_invalid_and_cached_urls_skip_the_workers():
+    cached = {'product_name': 'Sony TV'}
+    items = list(scrape_batch(['https://example.com/dp/B0CZ6XNNJ3', 'https://www.amazon.in/dp/B0CZ6XNNJ3'],
+                              workers=1, lookup=lambda url: cached))
+    assert items[0]['ok'] is False and items[0]['error'] == 'Only Amazon India URLs are supported'
+    assert items[1]['ok'] is True and items[1]['cached'] is True and items[1]['data'] == cached
@@ -0,0 +1,30 @@
+from backend.catalog import Catalog
+from backend.normalize import clean_text, normalize_product, normalize_text
+
+SAMPLE_URL = 'https://www.amazon.in/dp/B0CZ6XNNJ3'
+
+
+def test_clean_text_strips_direction_marks():
+    assert clean_text('‎Sony') == 'Sony'
+    assert clean_text(' ‏4K ‎') == '4K'
+    assert clean_text('‎') is None
+    assert clean_text(None) is None
+
+
+def test_normalize_sample_product(sample_product):
+    assert normalize_text(sample_product)['brand'] == 'Sony'
+    record = normalize_product(sample_product)
+    assert record['screen_inches'] == 43
+    assert (record['resolution_width'], record['resolution_height']) == (3840, 2160)
+
+
+def test_filter_on_brand(snapshot_store, sample_product):
+    snapshot_store.append(sample_product, url=SAMPLE_URL)
+    other = dict(sample_product, product_information=dict(sample_product['product_information'], Brand='‎LG'))
+    snapshot_store.append(other, url='https://www.amazon.in/dp/B0AAAAAAAA')
+    catalog = Catalog(snapshot_store, refresh_interval=0)
+
+    result = catalog.query(filters=['brand=sony'], columns=['asin', 'brand'])
+    assert result['total'] == 1
+    assert result['products'] == [{'asin': 'B0CZ6XNNJ3', 'brand': 'Sony'}]
+    assert catalog.query(filters=['brand!=Sony'])['total'] == 1
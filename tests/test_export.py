@@ -0,0 +1,42 @@
+import csv
+import io
+import json
+
+import pytest
+
+from backend.amazon_scraper import main
+from backend.export import export_products
+
+SAMPLE_URL = 'https://www.amazon.in/dp/B0CZ6XNNJ3'
+
+
+def test_csv_and_jsonl_share_columns(snapshot_store, sample_product):
+    snapshot_store.append(sample_product, url=SAMPLE_URL)
+    rows = list(csv.DictReader(io.StringIO(b''.join(export_products(snapshot_store, 'csv')).decode('utf-8'))))
+    lines = b''.join(export_products(snapshot_store, 'jsonl')).decode('utf-8').splitlines()
+    assert len(rows) == len(lines) == 1
+    record = json.loads(lines[0])
+    assert list(rows[0]) == list(record)
+    assert record['asin'] == 'B0CZ6XNNJ3'
+    assert record['product_information.Brand'] == 'Sony'
+
+
+def test_abandoned_stream_closes_reader(snapshot_store, sample_product):
+    snapshot_store.append(sample_product, url=SAMPLE_URL)
+    chunks = export_products(snapshot_store, 'jsonl', chunk_rows=1)
+    next(chunks)
+    chunks.close()
+    assert list(chunks) == []
+
+
+def test_export_snapshots_matches_export(tmp_path, snapshot_store, sample_product):
+    pq = pytest.importorskip('pyarrow.parquet')
+    snapshot_store.append(sample_product, url=SAMPLE_URL)
+    snapshot_store.append(sample_product, url=SAMPLE_URL)
+    db = snapshot_store.path
+    assert main(['export-snapshots', '--db', db, '--output', str(tmp_path / 'snapshots.parquet')]) == 0
+    assert main(['export', '--all', '--db', db, '--output', str(tmp_path / 'products.parquet')]) == 0
+    snapshots = pq.read_table(tmp_path / 'snapshots.parquet')
+    products = pq.read_table(tmp_path / 'products.parquet')
+    assert snapshots.num_rows == 2
+    assert snapshots.schema.equals(products.schema)
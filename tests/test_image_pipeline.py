@@ -0,0 +1,62 @@
+import hashlib
+import io
+import threading
+
+import pytest
+
+from backend.image_pipeline import ImagePipeline
+
+IMAGE_URL = 'https://m.media-amazon.com/images/I/81abc._SL1500_.jpg'
+
+
+def png_bytes(color):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (1200, 900), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    pipeline = ImagePipeline(cache_dir=str(tmp_path), sizes=(100, 300), process_workers=1)
+    yield pipeline
+    pipeline.close()
+
+
+def slow_download(pipeline, release):
+    # Downloads block until release is set, standing in for Amazon's image CDN
+    def download(url):
+        release.wait(10)
+        data = png_bytes('red')
+        return data, hashlib.sha256(data).hexdigest()
+    pipeline._download = download
+
+
+def test_thumbnail_paths_are_returned_before_the_images_are_fetched(pipeline):
+    release = threading.Event()
+    slow_download(pipeline, release)
+
+    thumbnails = pipeline.thumbnail_paths([IMAGE_URL, IMAGE_URL])
+    key = hashlib.sha256(IMAGE_URL.encode('utf-8')).hexdigest()
+    assert thumbnails == {IMAGE_URL: {'key': key, 'thumbnails': {'100': f'/images/{key}/100.webp',
+                                                                  '300': f'/images/{key}/300.webp'}}}
+    assert pipeline.stats()['downloads'] == 0
+    release.set()
+
+
+def test_variant_requested_early_is_generated_on_request(pipeline):
+    release = threading.Event()
+    slow_download(pipeline, release)
+    key = pipeline.thumbnail_paths([IMAGE_URL])[IMAGE_URL]['key']
+    release.set()
+
+    path = pipeline.path_for(key, 300)
+    assert path is not None
+    from PIL import Image
+    with Image.open(path) as image:
+        assert max(image.size) == 300
+    # The background pass and the request share one download
+    assert pipeline.stats()['downloads'] == 1
+    assert pipeline.path_for(key, 123) is None
+    assert pipeline.path_for('0' * 64, 300) is None
@@ -0,0 +1,70 @@
+import os
+import sqlite3
+
+import pytest
+
+from backend.amazon_scraper import AmazonTVScraper
+
+PAGE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'pages', 'B0CZ6XNNJ3.html')
+URL = 'https://www.amazon.in/dp/B0CZ6XNNJ3'
+
+
+def read_page():
+    with open(PAGE_PATH, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def make_scraper(store, pages):
+    # An http-mode scraper that is served pages from the list instead of fetching them
+    scraper = AmazonTVScraper(fetch_mode='http', archive=False, rate_control=False, section_store=store)
+    scraper.fetch_page = lambda url, fetch_mode=None: (pages.pop(0), 'http')
+    return scraper
+
+
+def extracted_stages(scraper):
+    return sorted(stage for stage in scraper.timings.as_dict() if stage.startswith('extract_'))
+
+
+def test_unchanged_sections_are_reused(snapshot_store):
+    page = read_page()
+    scraper = make_scraper(snapshot_store, [page, page])
+
+    first = scraper.extract_product_details(URL)
+    assert first['selling_price'] and scraper.changes is None
+    assert 'extract_product_information' in extracted_stages(scraper)
+
+    second = scraper.extract_product_details(URL)
+    assert second == first
+    assert scraper.changes == {}
+    assert extracted_stages(scraper) == []
+
+
+def test_changed_price_is_extracted_again(snapshot_store):
+    page = read_page()
+    assert '38,990' in page
+    scraper = make_scraper(snapshot_store, [page, page.replace('38,990', '35,490')])
+
+    first = scraper.extract_product_details(URL)
+    second = scraper.extract_product_details(URL)
+    assert second['selling_price'] != first['selling_price']
+    assert set(scraper.changes) >= {'selling_price'}
+    assert 'extract_price_info' in extracted_stages(scraper)
+    assert 'extract_product_information' not in extracted_stages(scraper)
+
+
+def test_given_store_is_used_and_left_open(snapshot_store):
+    scraper = AmazonTVScraper(fetch_mode='http', archive=False, section_store=snapshot_store)
+    assert scraper.section_store is snapshot_store
+    scraper.close()
+    assert snapshot_store.latest_sections('B0CZ6XNNJ3') == {}
+
+
+def test_own_store_is_closed(tmp_path, monkeypatch):
+    monkeypatch.setenv('SCRAPER_SNAPSHOT_DB', str(tmp_path / 'own.db'))
+    scraper = AmazonTVScraper(fetch_mode='http', archive=False)
+    store = scraper.section_store
+    assert store.path == str(tmp_path / 'own.db')
+    scraper.close()
+    assert scraper.section_store is None
+    with pytest.raises(sqlite3.ProgrammingError):
+        store._conn.execute('SELECT 1')
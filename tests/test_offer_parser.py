@@ -0,0 +1,59 @@
+import pytest
+
+from backend import offer_parser
+from backend.offer_parser import cache_stats, find_bank, parse_main_page_offers, parse_offer, parse_offers
+
+OFFER = 'Flat INR 3000 Instant Discount on HDFC Bank Credit Card EMI Txn. Minimum purchase of INR 30,000 for 6 months'
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    offer_parser._parse_side_sheet_offer.cache_clear()
+    offer_parser._parse_main_page_offer.cache_clear()
+
+
+def test_parse_offer():
+    assert parse_offer(OFFER) == {
+        'offer_text': OFFER,
+        'bank_name': 'HDFC',
+        'discount_amount': 3000.0,
+        'min_purchase': 30000.0,
+        'emi_available': True,
+        'emi_duration': 6,
+    }
+
+
+def test_bank_priority():
+    assert find_bank('10% off with SBI or HDFC cards') == 'HDFC'
+    assert find_bank('Kotak and Axis Bank cards') == 'Axis'
+    assert find_bank('Cashback on Yes Bank cards') == 'Yes Bank'
+    assert find_bank('No bank named here') is None
+
+
+def test_repeated_text_is_parsed_once():
+    parse_offer(OFFER)
+    parse_offer('  ' + OFFER.replace(' ', '\n  '))
+    stats = cache_stats()
+    assert stats['side_sheet_misses'] == 1 and stats['side_sheet_hits'] == 1
+    assert stats['side_sheet_entries'] == 1
+
+
+def test_cached_results_are_independent():
+    first = parse_offer(OFFER)
+    first['bank_name'] = 'changed'
+    first['extra'] = True
+    second = parse_offer(OFFER)
+    assert second['bank_name'] == 'HDFC' and 'extra' not in second
+
+
+def test_offer_text_keeps_original_whitespace():
+    text = 'Get 5% Cashback on  ICICI Bank cards'
+    assert parse_offers([text, 'short', None])[0]['offer_text'] == text
+
+
+def test_main_page_offers():
+    offers = parse_main_page_offers(['Upto ₹1,500.00 discount on SBI Credit Cards', 'too short'])
+    assert offers == [{'offer_text': 'Upto ₹1,500.00 discount on SBI Credit Cards', 'source': 'main_page',
+                       'bank_name': 'SBI', 'discount_amount': 1500.0}]
+    parse_main_page_offers(['Upto ₹1,500.00 discount on SBI Credit Cards'])
+    assert cache_stats()['main_page_hits'] == 1
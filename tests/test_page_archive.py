@@ -0,0 +1,89 @@
+import gzip
+import json
+import os
+
+import pytest
+
+from backend import page_archive
+from backend.amazon_scraper import main
+from backend.page_archive import PageArchive
+
+PAGES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'pages')
+ASINS = ('B0CZ6XNNJ3', 'B0C1H26C46')
+
+
+def read_page(name):
+    with open(os.path.join(PAGES, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = PageArchive(str(tmp_path / 'archive'), compression='gzip')
+    yield archive
+    archive.close()
+
+
+def test_store_and_load_round_trip(archive):
+    page = read_page('B0CZ6XNNJ3.html')
+    side_sheet = read_page('B0CZ6XNNJ3.sidesheet.html')
+    sha = archive.store('https://www.amazon.in/dp/B0CZ6XNNJ3', page, fetch_mode='http', side_sheet_html=side_sheet)
+    [entry] = archive.entries()
+    assert entry['sha256'] == sha and entry['asin'] == 'B0CZ6XNNJ3' and entry['fetch_mode'] == 'http'
+    assert archive.read_blob(sha) == page
+    assert archive.read_blob(entry['side_sheet_sha256']) == side_sheet
+    with open(archive._blob_path(sha, 'gzip'), 'rb') as f:
+        assert gzip.decompress(f.read()).decode('utf-8') == page
+
+
+def test_identical_pages_are_stored_once(archive):
+    page = read_page('B0CZ6XNNJ3.html')
+    first = archive.store('https://www.amazon.in/dp/B0CZ6XNNJ3', page)
+    second = archive.store('https://www.amazon.in/dp/B0CZ6XNNJ3?ref=x', page)
+    assert first == second
+    blobs = [name for _, _, names in os.walk(os.path.join(archive.archive_dir, 'pages')) for name in names]
+    assert blobs == [first + '.html.gz']
+    assert len(archive.entries()) == 2
+    assert len(archive.entries(latest=True)) == 1
+
+
+def test_zstd_round_trip(tmp_path):
+    pytest.importorskip('zstandard')
+    archive = PageArchive(str(tmp_path / 'archive'), compression='zstd')
+    try:
+        page = read_page('B0C1H26C46.html')
+        sha = archive.put_blob(page)
+        assert os.path.exists(archive._blob_path(sha, 'zstd'))
+        assert archive.read_blob(sha) == page
+    finally:
+        archive.close()
+
+
+def test_zstd_without_zstandard(tmp_path, monkeypatch):
+    monkeypatch.setattr(page_archive, '_zstd', lambda: None)
+    archive = PageArchive(str(tmp_path / 'archive'), compression='zstd')
+    try:
+        # Falls back to gzip for writing, and says so when asked to read a .zst entry
+        assert archive.compression == 'gzip'
+        path = archive._blob_path('ab' * 32, 'zstd')
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(b'not read')
+        with pytest.raises(RuntimeError):
+            archive.read_blob('ab' * 32)
+    finally:
+        archive.close()
+
+
+def test_reextract_writes_ndjson(archive, tmp_path):
+    for asin in ASINS:
+        archive.store(f'https://www.amazon.in/dp/{asin}', read_page(f'{asin}.html'), fetch_mode='http',
+                      side_sheet_html=read_page(f'{asin}.sidesheet.html'))
+    output = tmp_path / 'products.ndjson'
+    assert main(['reextract', '--archive', archive.archive_dir, '--workers', '1', '--output', str(output)]) == 0
+    items = [json.loads(line) for line in output.read_text(encoding='utf-8').splitlines()]
+    assert sorted(item['asin'] for item in items) == sorted(ASINS)
+    by_asin = {item['asin']: item for item in items}
+    assert all(item['ok'] for item in items)
+    assert by_asin['B0CZ6XNNJ3']['data']['selling_price'] == 38990.0
+    assert by_asin['B0CZ6XNNJ3']['data']['bank_offers']
@@ -0,0 +1,93 @@
+import time
+
+import pytest
+
+from backend.price_watch import PRIOR_HOURS, PriceWatch, TokenBucket, change_rate, price_changes
+
+URL = 'https://www.amazon.in/dp/B0CZ6XNNJ3'
+ASIN = 'B0CZ6XNNJ3'
+OFFER = {'offer_text': '10% Instant Discount on HDFC Bank Credit Cards'}
+
+
+def product(price, offers=()):
+    return {'product_name': 'Sony TV', 'selling_price': price, 'mrp': 59900.0, 'discount_percentage': 35.0,
+            'bank_offers': list(offers)}
+
+
+def make_watch(store, scrape, urls=(URL,), **options):
+    options.setdefault('budget', 3600)
+    options.setdefault('min_interval', 900)
+    options.setdefault('max_interval', 86400)
+    events = []
+    watch = PriceWatch(list(urls), scrape, store, emit=events.append, **options)
+    return watch, events
+
+
+def test_price_changes():
+    assert price_changes(product(38990.0), product(38990.0)) == {}
+    changes = price_changes(product(38990.0), product(36990.0, [OFFER]))
+    assert changes == {'selling_price': {'old': 38990.0, 'new': 36990.0},
+                       'bank_offers': {'old': [], 'new': [OFFER['offer_text']]}}
+
+
+def test_change_rate():
+    assert change_rate([]) == 1 / PRIOR_HOURS
+    snapshots = [dict(product(price), scraped_at=hour * 3600) for hour, price in enumerate((1.0, 2.0, 2.0, 3.0))]
+    # Two changes over three hours, smoothed by the prior
+    assert change_rate(snapshots) == pytest.approx(3 / (3 + PRIOR_HOURS))
+
+
+def test_token_bucket():
+    bucket = TokenBucket(per_hour=3600, capacity=2)
+    bucket.take()
+    bucket.take()
+    assert 0 < bucket.wait_time() <= 1
+
+
+def test_watch_one_records_and_emits_changes(snapshot_store):
+    pages = [product(38990.0), product(38990.0), product(36990.0, [OFFER])]
+    watch, events = make_watch(snapshot_store, lambda url: pages.pop(0))
+    assert watch.products[ASIN]['due'] <= time.time()
+    assert watch.watch_one(ASIN) is None
+    assert watch.watch_one(ASIN) is None
+    event = watch.watch_one(ASIN)
+    assert events == [event]
+    assert event['event'] == 'price_change' and event['asin'] == ASIN and event['url'] == URL
+    assert set(event['changes']) == {'selling_price', 'bank_offers'}
+    assert len(snapshot_store.recent(ASIN)) == 3
+    assert watch.products[ASIN]['due'] > time.time()
+
+
+def test_intervals_stretch_over_budget(snapshot_store):
+    urls = [f'https://www.amazon.in/dp/B0AAAAAAA{i}' for i in range(3)]
+    relaxed, _ = make_watch(snapshot_store, lambda url: None, urls=urls, budget=10)
+    base = relaxed.interval('B0AAAAAAA0')
+    # With no history each product expects a change a day and is sampled twice per change
+    assert base == pytest.approx(3600 / (2 / PRIOR_HOURS))
+    # Three products at two scrapes a day each want 0.25 scrapes an hour
+    tight, _ = make_watch(snapshot_store, lambda url: None, urls=urls, budget=0.1)
+    assert tight.interval('B0AAAAAAA0') == pytest.approx(base * 2.5)
+
+
+def test_failed_scrape_backs_off(snapshot_store):
+    def scrape(url):
+        raise RuntimeError('browser crashed')
+
+    watch, events = make_watch(snapshot_store, scrape, min_interval=60, max_interval=200)
+    for retry in (60, 120, 200):
+        start = time.time()
+        assert watch.watch_one(ASIN) is None
+        assert watch.products[ASIN]['due'] - start == pytest.approx(retry, abs=1)
+    assert watch.products[ASIN]['failures'] == 3 and events == []
+    assert snapshot_store.recent(ASIN) == []
+
+
+def test_product_scraped_meanwhile_is_not_scraped_again(snapshot_store):
+    snapshot_store.append(product(38990.0), url=URL, scraped_at=time.time() - 600)
+    scrapes = []
+    watch, _ = make_watch(snapshot_store, lambda url: scrapes.append(url) or product(38990.0))
+    snapshot_store.append(product(38990.0), url=URL, scraped_at=time.time())
+    assert watch.watch_one(ASIN) is None
+    assert scrapes == []
+    assert watch.products[ASIN]['last_scraped'] == snapshot_store.recent(ASIN, 1)[0]['scraped_at']
+    assert watch.products[ASIN]['due'] > time.time()
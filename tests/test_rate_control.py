@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+from backend.rate_control import FAILED, OK, RateController, RateLimited, classify_block
+
+URL = 'https://www.amazon.in/dp/B0CZ6XNNJ3'
+HOST = 'www.amazon.in'
+
+
+def test_classify_block():
+    assert classify_block('<form action="/errors/validateCaptcha">') == 'captcha'
+    assert classify_block('<title>Robot Check</title>') == 'robot_check'
+    assert classify_block('Request was throttled', status=200) == 'throttled'
+    assert classify_block(status=429) == 'throttled'
+    assert classify_block('<html>Page not found</html>', status=503) == 'throttled'
+    assert classify_block('<html>Page not found</html>', status=404) is None
+    assert classify_block(None) is None
+
+
+def test_limit_grows_by_one_per_round_of_successes():
+    controller = RateController(max_concurrency=8, initial=2, backoff=1, max_backoff=1, retries=0, max_wait=0)
+    for _ in range(4):
+        controller.release(controller.try_acquire(URL), OK)
+    assert controller.stats()[HOST]['limit'] == 3
+    for _ in range(100):
+        controller.release(controller.try_acquire(URL), OK)
+    assert controller.stats()[HOST]['limit'] == 8
+
+
+def test_slots_are_limited_per_host():
+    controller = RateController(max_concurrency=2, backoff=1, max_backoff=1, retries=0, max_wait=0)
+    tickets = [controller.try_acquire(URL), controller.try_acquire(URL)]
+    assert controller.try_acquire(URL) is None
+    assert controller.wait_time(URL) is None
+    assert controller.try_acquire('https://www.amazon.com/dp/B0CZ6XNNJ3') is not None
+    controller.release(tickets[0], FAILED)
+    assert controller.wait_time(URL) == 0
+    assert controller.stats()[HOST]['failed'] == 1
+
+
+def test_block_halves_limit_once_per_episode_and_backs_off():
+    controller = RateController(max_concurrency=8, backoff=10, max_backoff=60, retries=0, max_wait=0)
+    tickets = [controller.try_acquire(URL) for _ in range(4)]
+    for ticket in tickets:
+        controller.release(ticket, 'captcha')
+    stats = controller.stats()[HOST]
+    # Fetches started before the first block are the same episode
+    assert stats['limit'] == 4 and stats['decreases'] == 1 and stats['blocked'] == 4
+    assert 5 <= stats['backoff_seconds'] <= 10
+    assert controller.try_acquire(URL) is None
+    with pytest.raises(RateLimited) as limited:
+        controller.acquire(URL, timeout=0.1)
+    assert limited.value.host == HOST and limited.value.retry_after > 0
+
+
+def test_consecutive_episodes_double_the_backoff(monkeypatch):
+    # No jitter, so the backoff is the full delay
+    monkeypatch.setattr('backend.rate_control.random.uniform', lambda low, high: high)
+    controller = RateController(max_concurrency=8, backoff=0.05, max_backoff=1, retries=0, max_wait=1)
+    controller.release(controller.acquire(URL), 'throttled')
+    assert 0.04 < controller.wait_time(URL) <= 0.05
+    controller.release(controller.acquire(URL), 'throttled')
+    assert 0.09 < controller.wait_time(URL) <= 0.1
+    stats = controller.stats()[HOST]
+    assert stats['limit'] == 2 and stats['decreases'] == 2
+    controller.release(controller.acquire(URL), OK)
+    assert controller.stats()[HOST]['ok'] == 1
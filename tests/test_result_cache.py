@@ -0,0 +1,119 @@
+import threading
+import time
+
+from backend.result_cache import ResultCache
+
+URL = 'https://www.amazon.in/Sony-Bravia/dp/B0CZ6XNNJ3?ref=sr_1_1'
+PRODUCT = {'product_name': 'Sony TV', 'product_information': {'Brand': 'Sony'}, 'selling_price': '₹57,990',
+           'bank_offers': [], 'ai_review_summary': 'Good'}
+
+
+def make_cache(**options):
+    return ResultCache(max_entries=10, cache_dir=None, **options)
+
+
+def test_fresh_entry_is_served_from_cache():
+    cache = make_cache()
+    scrapes = []
+    cache.get_or_scrape(URL, lambda url: scrapes.append(url) or dict(PRODUCT))
+    data, source = cache.get_or_scrape(URL, lambda url: scrapes.append(url) or dict(PRODUCT))
+    assert source == 'cache' and data == PRODUCT
+    assert scrapes == ['https://www.amazon.in/dp/B0CZ6XNNJ3']
+
+
+def test_stale_volatile_fields_are_refreshed_on_their_own():
+    cache = make_cache(volatile_ttl=0.05, static_ttl=60)
+    cache.get_or_scrape(URL, lambda url: dict(PRODUCT))
+    time.sleep(0.1)
+    refreshed = []
+
+    def refresh(url, cached):
+        refreshed.append(cached['product_name'])
+        return {'selling_price': '₹54,990', 'mrp': None, 'discount_percentage': None, 'bank_offers': [], 'ai_review_summary': 'Cheaper'}
+
+    def scrape(url):
+        raise AssertionError('static fields are still fresh')
+
+    data, source = cache.get_or_scrape(URL, scrape, refresh=refresh)
+    assert source == 'refresh' and refreshed == ['Sony TV']
+    assert data['selling_price'] == '₹54,990' and data['product_information'] == {'Brand': 'Sony'}
+    # The refreshed fields are fresh again, so the next request is a plain hit
+    data, source = cache.get_or_scrape(URL, scrape, refresh=refresh)
+    assert source == 'cache' and data['ai_review_summary'] == 'Cheaper'
+    assert cache.stats()['refreshes'] == 1
+
+
+def test_failed_refresh_falls_back_to_a_full_scrape():
+    cache = make_cache(volatile_ttl=0.05, static_ttl=60)
+    cache.get_or_scrape(URL, lambda url: dict(PRODUCT))
+    time.sleep(0.1)
+    data, source = cache.get_or_scrape(URL, lambda url: dict(PRODUCT, selling_price='₹1'), refresh=lambda url, cached: None)
+    assert source == 'scrape' and data['selling_price'] == '₹1'
+
+
+def test_stale_static_fields_need_a_full_scrape():
+    cache = make_cache(volatile_ttl=0.05, static_ttl=0.05)
+    cache.get_or_scrape(URL, lambda url: dict(PRODUCT))
+    time.sleep(0.1)
+
+    def refresh(url, cached):
+        raise AssertionError('specs and images are stale too')
+
+    _, source = cache.get_or_scrape(URL, lambda url: dict(PRODUCT), refresh=refresh)
+    assert source == 'scrape'
+
+
+def test_concurrent_requests_share_one_scrape():
+    cache = make_cache()
+    started = threading.Event()
+    release = threading.Event()
+    scrapes = []
+
+    def scrape(url):
+        scrapes.append(url)
+        started.set()
+        release.wait(2)
+        return dict(PRODUCT)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_scrape(URL, scrape, timeout=5)))]
+    threads[0].start()
+    started.wait(2)
+    for _ in range(4):
+        threads.append(threading.Thread(target=lambda: results.append(cache.get_or_scrape(URL, scrape, timeout=5))))
+        threads[-1].start()
+    deadline = time.monotonic() + 2
+    while cache.stats()['coalesced'] < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(scrapes) == 1
+    assert sorted(source for _, source in results) == ['coalesced'] * 4 + ['scrape']
+    # Every caller gets its own copy, so adding timings to one touches neither the others nor the cache
+    for data, _ in results:
+        data['timings'] = {}
+    assert len({id(data) for data, _ in results}) == 5
+    assert 'timings' not in cache.get('B0CZ6XNNJ3')
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResultCache(max_entries=2, cache_dir=None)
+    for asin in ('B0AAAAAAA1', 'B0AAAAAAA2'):
+        cache.put(asin, dict(PRODUCT))
+    assert cache.get('B0AAAAAAA1') is not None
+    cache.put('B0AAAAAAA3', dict(PRODUCT))
+    assert cache.get('B0AAAAAAA2') is None
+    assert cache.get('B0AAAAAAA1') is not None and cache.get('B0AAAAAAA3') is not None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    cache = ResultCache(max_entries=10, cache_dir=str(tmp_path))
+    cache.get_or_scrape(URL, lambda url: dict(PRODUCT))
+    reloaded = ResultCache(max_entries=10, cache_dir=str(tmp_path))
+    data, source = reloaded.get_or_scrape(URL, lambda url: None)
+    assert source == 'cache' and data == PRODUCT
+    assert reloaded.stats()['disk_hits'] == 1
+    assert reloaded.get('B0CZ6XNNJ3') == PRODUCT
+    assert reloaded.stats()['hits'] == 1
@@ -0,0 +1,132 @@
+import threading
+import time
+
+import pytest
+
+from backend.work_queue import MemoryWorkQueue, SQLiteWorkQueue, RedisWorkQueue
+
+URL = 'https://www.amazon.in/dp/B0AAAAAAA{}'
+
+
+@pytest.fixture(params=['sqlite', 'memory', 'redis'])
+def work_queue(request, tmp_path):
+    if request.param == 'sqlite':
+        queue = SQLiteWorkQueue(str(tmp_path / 'queue.db'), retry_delay=0)
+    elif request.param == 'memory':
+        queue = MemoryWorkQueue(retry_delay=0)
+    else:
+        fakeredis = pytest.importorskip('fakeredis')
+        queue = RedisWorkQueue(client=fakeredis.FakeRedis(), retry_delay=0)
+    yield queue
+    queue.close()
+
+
+def drain(work_queue):
+    # Leasing until the queue is empty also lets backends that expire leases lazily notice them
+    while work_queue.lease('drain', 30) is not None:
+        pass
+
+
+def test_enqueue_dedupes_pending_url(work_queue):
+    task = work_queue.enqueue(URL.format(1))
+    assert work_queue.enqueue(URL.format(1) + '?ref=x')['id'] == task['id']
+    assert work_queue.stats()['queued'] == 1
+
+
+def test_expired_lease_is_reclaimed(work_queue):
+    task = work_queue.enqueue(URL.format(1))
+    first = work_queue.lease('w1', 0.2)
+    assert first['id'] == task['id'] and first['attempts'] == 1
+    assert work_queue.lease('w2', 5) is None
+    time.sleep(0.3)
+    second = work_queue.lease('w2', 5)
+    assert second['id'] == task['id'] and second['attempts'] == 2
+    assert not work_queue.extend(task['id'], first['lease_token'], 5)
+
+
+def test_failed_task_retries_then_dead_letters(work_queue):
+    task = work_queue.enqueue(URL.format(1), max_attempts=2)
+    lease = work_queue.lease('w1', 5)
+    assert work_queue.fail(task['id'], lease['lease_token'], 'timeout') == 'queued'
+    lease = work_queue.lease('w1', 5)
+    assert lease['attempts'] == 2
+    assert work_queue.fail(task['id'], lease['lease_token'], 'blocked') == 'dead'
+    assert work_queue.lease('w1', 5) is None
+    dead = work_queue.get(task['id'])
+    assert dead['status'] == 'dead' and dead['error'] == 'blocked'
+
+
+def test_expired_last_attempt_dead_letters(work_queue):
+    task = work_queue.enqueue(URL.format(1), max_attempts=1)
+    work_queue.lease('w1', 0.2)
+    time.sleep(0.3)
+    drain(work_queue)
+    assert work_queue.get(task['id'])['status'] == 'dead'
+
+
+def test_redrive_requeues_dead_tasks(work_queue):
+    task = work_queue.enqueue(URL.format(1), max_attempts=1)
+    lease = work_queue.lease('w1', 5)
+    assert work_queue.fail(task['id'], lease['lease_token'], 'blocked') == 'dead'
+    assert work_queue.redrive() == 1
+    assert work_queue.get(task['id'])['status'] == 'queued'
+    assert work_queue.lease('w2', 5)['id'] == task['id']
+    assert work_queue.redrive() == 0
+
+
+def test_redrive_keeps_newest_of_repeated_deaths(work_queue):
+    dead = []
+    for _ in range(2):
+        task = work_queue.enqueue(URL.format(1), max_attempts=1)
+        lease = work_queue.lease('w1', 5)
+        assert work_queue.fail(task['id'], lease['lease_token'], 'blocked') == 'dead'
+        dead.append(task['id'])
+        time.sleep(0.01)
+    assert dead[0] != dead[1]
+    assert work_queue.redrive() == 1
+    assert work_queue.get(dead[1])['status'] == 'queued'
+    assert work_queue.get(dead[0]) is None
+    stats = work_queue.stats()
+    assert stats['queued'] == 1 and stats['dead'] == 0
+    assert work_queue.lease('w2', 5)['id'] == dead[1]
+    assert work_queue.lease('w2', 5) is None
+
+
+def test_complete_after_lost_lease_is_idempotent(work_queue):
+    task = work_queue.enqueue(URL.format(1))
+    stale = work_queue.lease('w1', 0.2)
+    time.sleep(0.3)
+    current = work_queue.lease('w2', 5)
+    assert work_queue.fail(task['id'], stale['lease_token'], 'late') is None
+    # The first result wins even from a lease that ran out; the second scrape of the product is dropped
+    assert work_queue.complete(task['id'], stale['lease_token'], {'price': 1})
+    assert not work_queue.complete(task['id'], current['lease_token'], {'price': 2})
+    assert work_queue.fail(task['id'], current['lease_token'], 'late') is None
+    done = work_queue.get(task['id'])
+    assert done['status'] == 'done' and done['result'] == {'price': 1}
+    assert work_queue.stats()['done'] == 1
+    assert work_queue.enqueue(URL.format(1))['id'] != task['id']
+
+
+def test_concurrent_workers_never_share_a_task(work_queue):
+    for i in range(100):
+        work_queue.enqueue(URL.format(100 + i))
+    leased = []
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            task = work_queue.lease('w', 30)
+            if task is None:
+                return
+            with lock:
+                leased.append(task['id'])
+            work_queue.complete(task['id'], task['lease_token'], {})
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(leased) == len(set(leased)) == 100
+    assert work_queue.stats()['done'] == 100